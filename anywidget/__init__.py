@@ -2,10 +2,19 @@
 
 from __future__ import annotations
 
+from ._metrics import enable_stats, stats
+from ._tracing import current_span, set_span_callback
 from ._version import __version__
 from .widget import AnyWidget
 
-__all__ = ["AnyWidget", "__version__"]
+__all__ = [
+    "AnyWidget",
+    "__version__",
+    "current_span",
+    "enable_stats",
+    "set_span_callback",
+    "stats",
+]
 
 
 def _jupyter_labextension_paths() -> list[dict]:
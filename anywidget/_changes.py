@@ -0,0 +1,135 @@
+"""Awaitable changes to a widget's state made by the front end.
+
+Both `AnyWidget` and `MimeBundleDescriptor`-based views (the object's
+`_repr_mimebundle_`) have
+
+    change = await widget.changed("selection")
+    async for change in widget.changes("x", "y"):
+        ...
+
+fed from the updates the front end sends. Each consumer has its own queue, which
+holds (at most) the latest change of each name: a change replaces a pending one
+of the same name, so a slow consumer skips intermediate values rather than
+growing memory.
+
+Note that the kernel handles messages from the front end in between cells, so
+awaiting a change at the top level of a cell would wait forever. Await them in a
+task (e.g., `asyncio.create_task(...)`) instead.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import typing
+import weakref
+
+from ._commands import _running_loop
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import AsyncIterator, Iterable
+
+
+class Change(typing.NamedTuple):
+    """A change to a widget's state, made by the front end."""
+
+    name: str
+    value: typing.Any
+
+
+class _Consumer:
+    """The pending changes of one `changed()` or `changes()` call."""
+
+    def __init__(self, names: tuple[str, ...]) -> None:
+        self._names = frozenset(names)
+        self._loop = asyncio.get_running_loop()
+        # the latest change of each name, in the order they (last) changed
+        self._pending: dict[str, Change] = {}
+        self._waiter: asyncio.Future | None = None
+
+    def push(self, change: Change) -> None:
+        if self._names:
+            if change.name not in self._names:
+                return
+        elif change.name.startswith("_"):
+            return  # (private state, such as `_view_count`)
+        if _running_loop() is not self._loop:
+            self._loop.call_soon_threadsafe(self._push, change)
+        else:
+            self._push(change)
+
+    def _push(self, change: Change) -> None:
+        self._pending.pop(change.name, None)
+        self._pending[change.name] = change
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def get(self) -> Change:
+        while not self._pending:
+            self._waiter = self._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        name = next(iter(self._pending))
+        return self._pending.pop(name)
+
+
+class ChangeFeed:
+    """Publishes the front end's changes to a widget's state to its consumers."""
+
+    def __init__(self) -> None:
+        self._consumers: weakref.WeakSet[_Consumer] = weakref.WeakSet()
+
+    def __bool__(self) -> bool:
+        return bool(self._consumers)
+
+    def publish(self, changes: Iterable[Change]) -> None:
+        """Queue `changes` for every consumer interested in them."""
+        consumers = list(self._consumers)
+        for change in changes:
+            for consumer in consumers:
+                consumer.push(change)
+
+    async def changed(self, *names: str) -> Change:
+        """Wait for the front end to change one of `names` (or any public state).
+
+        Parameters
+        ----------
+        *names : str
+            The names of the state to wait for. All public state if none are given.
+
+        Returns
+        -------
+        Change
+            The name and new value of the changed state.
+        """
+        consumer = _Consumer(names)
+        self._consumers.add(consumer)
+        try:
+            return await consumer.get()
+        finally:
+            self._consumers.discard(consumer)
+
+    async def changes(self, *names: str) -> AsyncIterator[Change]:
+        """Iterate over the front end's changes to `names` (or any public state).
+
+        Changes made while the consumer is busy are queued, keeping only the
+        latest of each name.
+
+        Parameters
+        ----------
+        *names : str
+            The names of the state to follow. All public state if none are given.
+
+        Yields
+        ------
+        Change
+            The name and new value of the changed state.
+        """
+        consumer = _Consumer(names)
+        self._consumers.add(consumer)
+        try:
+            while True:
+                yield await consumer.get()
+        finally:
+            self._consumers.discard(consumer)
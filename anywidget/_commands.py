@@ -0,0 +1,1010 @@
+"""Commands: request/response calls from the front end to Python methods."""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import dataclasses
+import functools
+import hashlib
+import inspect
+import itertools
+import json
+import logging
+import multiprocessing
+import threading
+import time
+import typing
+import weakref
+from collections import OrderedDict, deque
+
+from . import _metrics, _tracing
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    import multiprocessing.managers
+
+    from ._protocols import WidgetBase
+
+__all__ = ["LRU", "CacheInfo", "command", "command_cancelled"]
+
+T = typing.TypeVar("T")
+
+_logger = logging.getLogger(__name__)
+
+
+_ANYWIDGET_COMMAND = "_anywidget_command"
+_ANYWIDGET_COMMANDS = "_anywidget_commands"
+
+_CommandResult = typing.Tuple[object, typing.List[bytes]]
+_AnyWidgetCommand = typing.Callable[
+    ...,
+    typing.Union[
+        _CommandResult,
+        typing.Awaitable[_CommandResult],
+        typing.Iterator[_CommandResult],
+        typing.AsyncIterator[_CommandResult],
+    ],
+]
+_Executor = typing.Literal["thread", "process"]
+
+# strong references to in-flight async commands, so they aren't garbage collected
+_BACKGROUND_TASKS: set[asyncio.Future] = set()
+
+# lazily created pools shared by all commands, keyed by executor kind
+_EXECUTORS: dict[str, concurrent.futures.Executor] = {}
+
+# lazily started on the first process command, to share cancellation flags with
+# the process pool's workers
+_MANAGER: multiprocessing.managers.SyncManager | None = None
+
+_CURRENT_INVOCATION: contextvars.ContextVar[_Invocation | None] = (
+    contextvars.ContextVar("anywidget_current_invocation", default=None)
+)
+
+# the (shared) cancellation flag of the process command running in this worker
+_PROCESS_CANCELLED: contextvars.ContextVar[threading.Event | None] = (
+    contextvars.ContextVar("anywidget_process_cancelled", default=None)
+)
+
+
+class _Limiter:
+    """Bounds the number of concurrently running invocations of a command.
+
+    Work that can't start immediately is queued (FIFO) until a slot frees up.
+    """
+
+    def __init__(self, max_concurrency: int | None) -> None:
+        self._max_concurrency = max_concurrency
+        self._running = 0
+        self._queue: deque[typing.Callable[[typing.Callable[[], None]], None]] = deque()
+        self._lock = threading.Lock()
+
+    def run(
+        self,
+        start: typing.Callable[[typing.Callable[[], None]], None],
+    ) -> typing.Callable[[], bool]:
+        """Call `start(release)` now or once a slot is available.
+
+        Returns
+        -------
+        drop : Callable[[], bool]
+            Removes `start` from the queue if it hasn't been started yet, returning
+            whether it was removed.
+        """
+        with self._lock:
+            start_now = (
+                self._max_concurrency is None or self._running < self._max_concurrency
+            )
+            if start_now:
+                self._running += 1
+            else:
+                self._queue.append(start)
+        if start_now:
+            start(self._release)
+
+        def _drop() -> bool:
+            with self._lock:
+                try:
+                    self._queue.remove(start)
+                except ValueError:
+                    return False
+            return True
+
+        return _drop
+
+    def _release(self) -> None:
+        with self._lock:
+            if not self._queue:
+                self._running -= 1
+                return
+            start = self._queue.popleft()
+        start(self._release)
+
+
+class CacheInfo(typing.NamedTuple):
+    """Statistics for a command cache (see `LRU.cache_info`)."""
+
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class LRU:
+    """A bounded least-recently-used cache for command responses.
+
+    Pass to `@command(cache=LRU(...))` to memoize a command's `(response, buffers)`
+    by the command name, a canonical hash of `msg`, and a digest of the incoming
+    buffers. Entries are kept per widget instance, and dropped when that widget's
+    state changes.
+
+    A single `LRU` may be shared between several commands (the bound is shared).
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        The maximum number of cached responses (default: 128).
+    ttl : float, optional
+        If provided, the number of seconds after which an entry expires.
+    invalidate_on : Iterable[str], optional
+        The names of the (synced) state fields that invalidate a widget's entries
+        when changed. By default any synced state change invalidates them. Pass an
+        empty tuple to never invalidate automatically.
+
+    Examples
+    --------
+    >>> tiles = LRU(maxsize=256, ttl=60)
+    >>> class Map(anywidget.AnyWidget):
+    ...     @command(cache=tiles)
+    ...     def _tile(self, msg, buffers): ...
+    >>> tiles.cache_info()
+    CacheInfo(hits=0, misses=0, evictions=0, maxsize=256, currsize=0)
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 128,
+        ttl: float | None = None,
+        invalidate_on: typing.Iterable[str] | None = None,
+    ) -> None:
+        if maxsize < 1:
+            msg = f"maxsize must be positive, not {maxsize}"
+            raise ValueError(msg)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.invalidate_on = None if invalidate_on is None else tuple(invalidate_on)
+        # (owner, key) -> (expires_at, result)
+        self._entries: OrderedDict[tuple, tuple[float | None, _CommandResult]] = (
+            OrderedDict()
+        )
+        self._hits = self._misses = self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, owner: int, key: tuple) -> _CommandResult | None:
+        """Look up a (non-expired) entry, recording a hit or miss."""
+        with self._lock:
+            entry = self._entries.get((owner, key))
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end((owner, key))
+                self._hits += 1
+                return entry[1]
+            if entry is not None:  # expired
+                del self._entries[(owner, key)]
+            self._misses += 1
+            return None
+
+    def put(self, owner: int, key: tuple, result: _CommandResult) -> None:
+        """Insert an entry, evicting the least recently used ones if full."""
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[(owner, key)] = (expires_at, result)
+            self._entries.move_to_end((owner, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, owner: int) -> None:
+        """Drop all entries for a single widget instance."""
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == owner]:
+                del self._entries[entry_key]
+
+    def cache_info(self) -> CacheInfo:
+        """Report cache statistics."""
+        with self._lock:
+            return CacheInfo(
+                self._hits,
+                self._misses,
+                self._evictions,
+                self.maxsize,
+                len(self._entries),
+            )
+
+    def cache_clear(self) -> None:
+        """Clear the cache and statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = self._evictions = 0
+
+
+# unique (never reused) ids for widgets with cached commands
+_CACHE_OWNERS = itertools.count()
+
+
+def _cache_key(name: str, msg: object, buffers: list[bytes]) -> tuple:
+    msg_hash = hashlib.blake2b(
+        json.dumps(msg, sort_keys=True, separators=(",", ":")).encode(),
+        digest_size=16,
+    ).digest()
+    buffers_hash = hashlib.blake2b(digest_size=16)
+    for buffer in buffers:
+        buffers_hash.update(len(buffer).to_bytes(8, "little"))
+        buffers_hash.update(buffer)
+    return (name, msg_hash, buffers_hash.digest())
+
+
+@dataclasses.dataclass(frozen=True)
+class _CommandOptions:
+    executor: _Executor | None = None
+    max_concurrency: int | None = None
+    cache: LRU | None = None
+    # whether the command is called with the widget as its first argument
+    bound: bool = True
+    limiter: _Limiter = dataclasses.field(
+        default_factory=lambda: _Limiter(None), compare=False
+    )
+
+
+class _Command(typing.NamedTuple):
+    func: _AnyWidgetCommand
+    options: _CommandOptions
+
+
+class _Invocation:
+    """A single (possibly in-flight) invocation of a command from the front end."""
+
+    def __init__(
+        self,
+        msg_id: str,
+        send: typing.Callable[[dict, list[bytes]], None],
+        window: int | None = None,
+    ) -> None:
+        self.id = msg_id
+        self.cancelled = threading.Event()
+        self.on_cancel: typing.Callable[[], object] | None = None
+        # for streaming commands, the max number of unacknowledged chunks
+        self.window = window
+        self.acked = 0
+        self.acked_changed: asyncio.Event | None = None
+        # called with the result (e.g., to cache it) before it's sent
+        self.on_result: typing.Callable[[_CommandResult], None] | None = None
+        # called (once) when the command completes, with the error it raised
+        self.on_done: typing.Callable[[BaseException | None], None] | None = None
+        self.error: BaseException | None = None
+        self._send = send
+
+    def respond(self, result: _CommandResult) -> None:
+        if self.on_result is not None:
+            self.on_result(result)
+        if self.cancelled.is_set():
+            return  # the front end has stopped listening
+        self._send_response(result)
+
+    def finish(self) -> None:
+        """Signal the end of a stream of chunks."""
+        if not self.cancelled.is_set():
+            self._send_response((None, []))
+
+    def done(self) -> None:
+        """The command has completed (or was cancelled)."""
+        on_done, self.on_done = self.on_done, None
+        if on_done is not None:
+            on_done(self.error)
+
+    def fail(self, error: BaseException) -> None:
+        """Respond with the error the command raised (logging it)."""
+        self.error = error
+        _logger.error(
+            "anywidget: unhandled exception in command",
+            exc_info=(type(error), error, error.__traceback__),
+        )
+        if self.cancelled.is_set():
+            return
+        self._send(
+            {
+                "id": self.id,
+                "kind": "anywidget-command-response",
+                "response": None,
+                "error": {"name": type(error).__name__, "message": str(error)},
+            },
+            [],
+        )
+
+    def _send_response(self, result: _CommandResult) -> None:
+        response, buffers = result
+        self._send(
+            {"id": self.id, "kind": "anywidget-command-response", "response": response},
+            buffers,
+        )
+
+    def send_chunk(self, seq: int, result: _CommandResult) -> None:
+        response, buffers = result
+        self._send(
+            {
+                "id": self.id,
+                "kind": "anywidget-command-chunk",
+                "seq": seq,
+                "response": response,
+            },
+            buffers,
+        )
+
+    def ack(self, seq: int) -> None:
+        """The front end has consumed chunks up to (and including) `seq`."""
+        self.acked = max(self.acked, seq + 1)
+        if self.acked_changed is not None:
+            self.acked_changed.set()
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        if self.on_cancel is not None:
+            self.on_cancel()
+
+
+@typing.overload
+def command(cmd: T) -> T: ...
+
+
+@typing.overload
+def command(
+    *,
+    executor: _Executor | None = None,
+    max_concurrency: int | None = None,
+    cache: LRU | None = None,
+) -> typing.Callable[[T], T]: ...
+
+
+def command(
+    cmd: T | None = None,
+    *,
+    executor: _Executor | None = None,
+    max_concurrency: int | None = None,
+    cache: LRU | None = None,
+) -> T | typing.Callable[[T], T]:
+    """Mark a function as a command for anywidget.
+
+    Commands may be defined with `async def`, in which case they are scheduled on
+    the kernel's running event loop and the response is sent once they complete.
+    Concurrent invocations from the front end run concurrently.
+
+    Invocations made by the front end within the same microtask are sent (and
+    answered) in a single batch message.
+
+    If a command raises, the exception is logged and the front end's `invoke`
+    promise is rejected with an `Error` of the same name and message.
+
+    Generator (or async generator) commands stream their results: each yielded
+    `(response, buffers)` is sent as a separate chunk, which the front end can
+    consume with `invoke(name, msg, { stream: true })`. At most `window` chunks
+    (chosen by the front end) are sent ahead of what it has consumed.
+
+    CPU-bound commands can instead be dispatched to a shared pool with
+    `@command(executor="thread")` or `@command(executor="process")`. Since the
+    widget can't be sent to another process, process commands must be
+    `staticmethod`s that take only `(msg, buffers)` and be importable (picklable).
+
+    If the front end aborts an invocation (e.g., via an `AbortSignal`), queued work
+    is dropped and running work can observe the cancellation with
+    `command_cancelled()`.
+
+    Parameters
+    ----------
+    cmd : Callable
+        The function to mark as a command.
+    executor : {"thread", "process"}, optional
+        Run the command in a managed thread or process pool rather than inline in
+        the comm message handler.
+    max_concurrency : int, optional
+        The maximum number of invocations of this command that may run at once
+        (across all widget instances). Additional invocations are queued. Only
+        supported together with `executor`.
+    cache : LRU, optional
+        Memoize responses, so repeated invocations with the same `msg` and
+        buffers don't recompute on the kernel. Not supported for generator
+        (streaming) commands.
+
+    Returns
+    -------
+    Callable
+        The decorated function annotated as a command.
+
+    Raises
+    ------
+    ValueError
+        If the options are invalid.
+    TypeError
+        If a process command is not a staticmethod, or a generator command is
+        given a `cache`.
+    """
+    if executor not in (None, "thread", "process"):
+        msg = f"executor must be 'thread' or 'process', not {executor!r}"
+        raise ValueError(msg)
+    if max_concurrency is not None:
+        if executor is None:
+            msg = "max_concurrency requires an executor"
+            raise ValueError(msg)
+        if max_concurrency < 1:
+            msg = f"max_concurrency must be positive, not {max_concurrency}"
+            raise ValueError(msg)
+
+    def _decorator(cmd: T) -> T:
+        is_static = isinstance(cmd, staticmethod)
+        if executor == "process" and not is_static:
+            msg = "process commands must be staticmethods taking (msg, buffers)"
+            raise TypeError(msg)
+        func = cmd.__func__ if isinstance(cmd, staticmethod) else cmd
+        if cache is not None and (
+            inspect.isgeneratorfunction(func) or inspect.isasyncgenfunction(func)
+        ):
+            msg = "streamed (generator) command responses can't be cached"
+            raise TypeError(msg)
+        options = _CommandOptions(
+            executor=executor,
+            max_concurrency=max_concurrency,
+            cache=cache,
+            bound=not is_static,
+            limiter=_Limiter(max_concurrency),
+        )
+        setattr(func, _ANYWIDGET_COMMAND, options)
+        return cmd
+
+    return _decorator(cmd) if cmd is not None else _decorator
+
+
+def command_cancelled() -> bool:
+    """Whether the command currently being run has been cancelled by the front end.
+
+    Long-running commands (e.g., with `executor="thread"`) can poll this to stop
+    early. Process commands share the flag with the kernel through a
+    `multiprocessing` manager, started with the first process command. Always
+    `False` outside of a command.
+    """
+    invocation = _CURRENT_INVOCATION.get()
+    if invocation is not None:
+        return invocation.cancelled.is_set()
+    cancelled = _PROCESS_CANCELLED.get()
+    return cancelled is not None and cancelled.is_set()
+
+
+def _find_anywidget_commands(cls: type) -> dict[str, _Command]:
+    cmds: dict[str, _Command] = {}
+    for base in cls.__mro__:
+        if not hasattr(base, "__dict__"):
+            continue
+        for name, attr in base.__dict__.items():
+            func = attr.__func__ if isinstance(attr, staticmethod) else attr
+            options = getattr(func, _ANYWIDGET_COMMAND, None)
+            if callable(func) and isinstance(options, _CommandOptions):
+                cmds[name] = _Command(func, options)
+    return cmds
+
+
+def _collect_anywidget_commands(widget_cls: type) -> None:
+    setattr(widget_cls, _ANYWIDGET_COMMANDS, _find_anywidget_commands(widget_cls))
+
+
+# commands of classes that aren't `AnyWidget` subclasses (i.e., those using a
+# `MimeBundleDescriptor`), which we'd rather not set attributes on.
+_DESCRIPTOR_COMMANDS: weakref.WeakKeyDictionary[type, dict[str, _Command]] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_anywidget_commands(cls: type) -> dict[str, _Command]:
+    """Get the commands defined on a class, collecting them on first use."""
+    if _ANYWIDGET_COMMANDS in cls.__dict__:
+        return typing.cast("dict[str, _Command]", cls.__dict__[_ANYWIDGET_COMMANDS])
+    try:
+        return _DESCRIPTOR_COMMANDS[cls]
+    except KeyError:
+        cmds = _DESCRIPTOR_COMMANDS[cls] = _find_anywidget_commands(cls)
+        return cmds
+
+
+class _CommandDispatcher:
+    """Dispatches command messages from the front end to the commands of `obj`.
+
+    Shared by `AnyWidget` and `ReprMimeBundle`, which differ only in how custom
+    messages are received and sent, and in how state changes are observed.
+
+    The object itself is passed to `handle` rather than held, so that descriptor
+    widgets (which only keep a weak reference to their object) can still be collected.
+
+    Parameters
+    ----------
+    cmds : dict[str, _Command]
+        The commands of the object, keyed by name.
+    """
+
+    def __init__(self, cmds: dict[str, _Command]) -> None:
+        self._cmds = cmds
+        # invocations that may still be cancelled, keyed by message id
+        self._in_flight: dict[str, _Invocation] = {}
+        self._owner = next(_CACHE_OWNERS)
+        self._caches = {cmd.options.cache for cmd in cmds.values() if cmd.options.cache}
+
+    @property
+    def has_caches(self) -> bool:
+        """Whether any of the commands cache their responses."""
+        return bool(self._caches)
+
+    def handle(
+        self,
+        obj: object,
+        content: object,
+        buffers: list[bytes],
+        send: typing.Callable[[dict, list[bytes]], None],
+    ) -> None:
+        """Handle a custom message from the front end to `obj`, replying with `send`."""
+        if not isinstance(content, dict):
+            return
+        if content.get("kind") == "anywidget-command":
+            self._invoke(obj, content, buffers, send)
+        elif content.get("kind") == "anywidget-command-batch":
+            _dispatch_batch(
+                send, content["calls"], buffers, functools.partial(self._invoke, obj)
+            )
+        else:
+            _handle_invocation_update(content, self._in_flight)
+
+    def state_changed(self, names: typing.Iterable[str]) -> None:
+        """Drop cached responses that depend on any of the changed state `names`."""
+        names = set(names)
+        for cache in self._caches:
+            if cache.invalidate_on is None or names.intersection(cache.invalidate_on):
+                cache.invalidate(self._owner)
+
+    def _invoke(
+        self,
+        obj: object,
+        msg: dict,
+        buffers: list[bytes],
+        send: typing.Callable[[dict, list[bytes]], None],
+    ) -> None:
+        invocation = _Invocation(
+            msg["id"], send, window=(msg.get("stream") or {}).get("window")
+        )
+        cmd = self._cmds.get(msg["name"])
+        if cmd is None:
+            invocation.fail(KeyError(f"no command named {msg['name']!r}"))
+            return
+        if cmd.options.cache is not None and _respond_from_cache(
+            cmd.options.cache, self._owner, msg, buffers, invocation
+        ):
+            return
+        timing = _CommandTiming(type(obj), msg["name"])
+        invocation.on_done = timing.close
+        try:
+            timing.run(
+                _dispatch_command,
+                cmd,
+                obj,
+                msg["msg"],
+                buffers,
+                invocation,
+                self._in_flight,
+            )
+        except Exception as e:  # noqa: BLE001
+            invocation.fail(e)
+            invocation.done()
+
+
+class _CommandTiming:
+    """The timing (and tracing span) of a command, from dispatch to completion.
+
+    The command is dispatched in its own context, in which its timing and span
+    stay open (and its span current) until it completes, so tasks and pool work
+    it starts inherit the span.
+    """
+
+    def __init__(self, cls: type, name: str) -> None:
+        self._ctx = contextvars.copy_context()
+        self._stack = contextlib.ExitStack()
+        self._lock = threading.Lock()
+        self._running = False
+        # the outcome of a command completing while `run` is still in its context
+        self._exc_info: tuple | None = None
+        if _metrics.ENABLED or _tracing.CALLBACK:
+            key = f"{cls.__module__}.{cls.__name__}"
+            self._ctx.run(self._stack.enter_context, _metrics.timed(key, "command"))
+            if _tracing.CALLBACK:
+                self._ctx.run(
+                    self._stack.enter_context,
+                    _tracing.span("command", widget=key, command=name),
+                )
+
+    def run(self, func: typing.Callable[..., T], *args: object) -> T:
+        """Call `func(*args)` in the command's context."""
+        with self._lock:
+            self._running = True
+        try:
+            return self._ctx.run(func, *args)
+        finally:
+            with self._lock:
+                self._running = False
+                exc_info, self._exc_info = self._exc_info, None
+            if exc_info is not None:
+                self._ctx.run(self._stack.__exit__, *exc_info)
+
+    def close(self, error: BaseException | None) -> None:
+        """Stop timing the command, recording the error it raised (if any)."""
+        exc_info: tuple = (None, None, None)
+        if error is not None:
+            exc_info = (type(error), error, error.__traceback__)
+        with self._lock:
+            if self._running:
+                # (completed synchronously, the context can't be entered twice)
+                self._exc_info = exc_info
+                return
+        self._ctx.run(self._stack.__exit__, *exc_info)
+
+
+def _register_anywidget_commands(widget: WidgetBase) -> None:
+    """Register a custom message reducer for a widget if it implements the protocol."""
+    # Only add the callback if the widget has any commands.
+    cmds = typing.cast(
+        "dict[str, _Command]",
+        getattr(type(widget), _ANYWIDGET_COMMANDS, {}),
+    )
+    if not cmds:
+        return
+
+    dispatcher = _CommandDispatcher(cmds)
+    if dispatcher.has_caches:
+        has_traits = typing.cast("typing.Any", widget)
+        has_traits.observe(
+            lambda change: dispatcher.state_changed([change["name"]]),
+            names=list(has_traits.traits(sync=True)),
+        )
+
+    def handle_anywidget_command(
+        self: WidgetBase,
+        msg: str | list | dict,
+        buffers: list[bytes],
+    ) -> None:
+        dispatcher.handle(self, msg, buffers, self.send)
+
+    widget.on_msg(handle_anywidget_command)
+
+
+def _dispatch_batch(
+    send: typing.Callable[[dict, list[bytes]], None],
+    calls: list[dict],
+    buffers: list[bytes],
+    invoke: typing.Callable[
+        [dict, list[bytes], typing.Callable[[dict, list[bytes]], None]], None
+    ],
+) -> None:
+    """Dispatch a batch of invocations sent by the front end in one message.
+
+    Every message produced while dispatching (i.e., responses from synchronous or
+    cached commands) is sent back in a single combined message, with all buffers
+    concatenated and each message recording its `buffer_offset` and
+    `buffer_count`. Commands that complete later respond individually.
+    """
+    messages: list[dict] = []
+    message_buffers: list[bytes] = []
+    collecting = True
+
+    def collect(content: dict, buffers: list[bytes]) -> None:
+        if not collecting:
+            send(content, buffers)
+            return
+        messages.append(
+            {
+                **content,
+                "buffer_offset": len(message_buffers),
+                "buffer_count": len(buffers),
+            }
+        )
+        message_buffers.extend(buffers)
+
+    offset = 0
+    for call in calls:
+        count = call.get("buffer_count", 0)
+        invoke(call, buffers[offset : offset + count], collect)
+        offset += count
+    collecting = False
+
+    if messages:
+        send(
+            {"kind": "anywidget-command-batch-response", "messages": messages},
+            message_buffers,
+        )
+
+
+def _handle_invocation_update(msg: dict, in_flight: dict[str, _Invocation]) -> None:
+    """Handle a cancel or ack message from the front end for an in-flight command."""
+    if msg.get("kind") == "anywidget-command-cancel":
+        invocation = in_flight.pop(msg["id"], None)
+        if invocation is not None:
+            invocation.cancel()
+    elif msg.get("kind") == "anywidget-command-ack":
+        invocation = in_flight.get(msg["id"])
+        if invocation is not None:
+            invocation.ack(msg["seq"])
+
+
+def _respond_from_cache(
+    cache: LRU,
+    owner: int,
+    msg: dict,
+    buffers: list[bytes],
+    invocation: _Invocation,
+) -> bool:
+    """Respond with a cached result if possible, otherwise cache the eventual one."""
+    key = _cache_key(msg["name"], msg["msg"], buffers)
+    cached = cache.get(owner, key)
+    if cached is not None:
+        invocation.respond(cached)
+        return True
+    invocation.on_result = lambda result: cache.put(owner, key, result)
+    return False
+
+
+def _dispatch_command(  # noqa: PLR0913, PLR0917
+    cmd: _Command,
+    widget: object,
+    msg: object,
+    buffers: list[bytes],
+    invocation: _Invocation,
+    in_flight: dict[str, _Invocation],
+) -> None:
+    """Run a command, responding inline, from a task, or from a pool."""
+
+    def _done() -> None:
+        in_flight.pop(invocation.id, None)
+        invocation.done()
+
+    args = (widget, msg, buffers) if cmd.options.bound else (msg, buffers)
+    if cmd.options.executor is not None:
+        in_flight[invocation.id] = invocation
+        _run_in_executor(cmd, args, invocation, _done)
+        return
+
+    token = _CURRENT_INVOCATION.set(invocation)
+    try:
+        result = cmd.func(*args)
+    finally:
+        _CURRENT_INVOCATION.reset(token)
+    if isinstance(result, (typing.Iterator, typing.AsyncIterator)):
+        in_flight[invocation.id] = invocation
+        if _running_loop() is None:
+            # we'll run to completion from within the comm handler, so acks can't
+            # be received until we're done. Don't wait for them.
+            invocation.window = None
+        task = _spawn(_stream_responses(invocation, result), _done)
+    elif inspect.isawaitable(result):
+        in_flight[invocation.id] = invocation
+        task = _spawn(_respond_when_done(invocation, result), _done)
+    else:
+        invocation.respond(result)
+        invocation.done()
+        return
+    if task is not None:
+        invocation.on_cancel = task.cancel
+
+
+async def _respond_when_done(
+    invocation: _Invocation,
+    result: typing.Awaitable[_CommandResult],
+) -> None:
+    _CURRENT_INVOCATION.set(invocation)
+    try:
+        response = await result
+    except Exception as e:  # noqa: BLE001
+        invocation.fail(e)
+        return
+    invocation.respond(response)
+
+
+async def _stream_responses(
+    invocation: _Invocation,
+    items: typing.Iterator[_CommandResult] | typing.AsyncIterator[_CommandResult],
+) -> None:
+    """Send each item of a generator command as a sequenced chunk.
+
+    Waits for the front end to acknowledge chunks so that no more than
+    `invocation.window` are in flight at once.
+    """
+    _CURRENT_INVOCATION.set(invocation)
+    invocation.acked_changed = asyncio.Event()
+    seq = 0
+    try:
+        async for item in _aiter(items):
+            while (
+                invocation.window is not None
+                and seq - invocation.acked >= invocation.window
+            ):
+                await invocation.acked_changed.wait()
+                invocation.acked_changed.clear()
+            invocation.send_chunk(seq, item)
+            seq += 1
+        invocation.finish()
+    except Exception as e:  # noqa: BLE001
+        invocation.fail(e)
+    finally:
+        # stop the generator early if we were cancelled
+        if inspect.isasyncgen(items):
+            await items.aclose()
+        elif inspect.isgenerator(items):
+            items.close()
+
+
+async def _aiter(
+    items: typing.Iterator[T] | typing.AsyncIterator[T],
+) -> typing.AsyncIterator[T]:
+    if isinstance(items, typing.AsyncIterator):
+        async for item in items:
+            yield item
+        return
+    for item in items:
+        yield item
+        # let the loop handle other messages (e.g., acks) between chunks
+        await asyncio.sleep(0)
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _spawn(
+    coro: typing.Coroutine[typing.Any, typing.Any, None],
+    done: typing.Callable[[], None],
+) -> asyncio.Future | None:
+    """Run a coroutine in the background on the kernel's event loop.
+
+    Comm messages are handled from within the kernel's (running) asyncio loop. If
+    there isn't one (e.g., outside of a kernel) we just run the coroutine to
+    completion.
+    """
+    loop = _running_loop()
+    if loop is None:
+        try:
+            asyncio.run(coro)
+        except Exception:
+            _logger.exception("anywidget: unhandled exception in async command")
+        finally:
+            done()
+        return None
+
+    task = loop.create_task(coro)
+    _BACKGROUND_TASKS.add(task)
+
+    def _on_done(task: asyncio.Future) -> None:
+        _BACKGROUND_TASKS.discard(task)
+        done()
+        if not task.cancelled() and task.exception() is not None:
+            _logger.error(
+                "anywidget: unhandled exception in async command",
+                exc_info=task.exception(),
+            )
+
+    task.add_done_callback(_on_done)
+    return task
+
+
+def _get_executor(kind: _Executor) -> concurrent.futures.Executor:
+    if kind not in _EXECUTORS:
+        _EXECUTORS[kind] = (
+            concurrent.futures.ThreadPoolExecutor(thread_name_prefix="anywidget")
+            if kind == "thread"
+            else concurrent.futures.ProcessPoolExecutor()
+        )
+    return _EXECUTORS[kind]
+
+
+def _get_manager() -> multiprocessing.managers.SyncManager:
+    global _MANAGER  # noqa: PLW0603
+    if _MANAGER is None:
+        _MANAGER = multiprocessing.Manager()
+    return _MANAGER
+
+
+def _run_in_process(
+    func: typing.Callable[..., T],
+    cancelled: threading.Event,
+    *args: object,
+) -> T:
+    """Run a process command in a pool worker, exposing its cancellation flag."""
+    token = _PROCESS_CANCELLED.set(cancelled)
+    try:
+        return func(*args)
+    finally:
+        _PROCESS_CANCELLED.reset(token)
+
+
+def _call_on_loop(
+    loop: asyncio.AbstractEventLoop | None,
+    func: typing.Callable[..., object],
+) -> typing.Callable[..., object]:
+    """Wrap `func` to be called on `loop` (if any), from any thread."""
+    if loop is None:
+        return func
+    return lambda *args: loop.call_soon_threadsafe(func, *args)
+
+
+def _respond_with_result(
+    invocation: _Invocation,
+    future: concurrent.futures.Future,
+) -> None:
+    try:
+        result = future.result()
+    except Exception as e:  # noqa: BLE001
+        invocation.fail(e)
+        return
+    invocation.respond(result)
+
+
+def _run_in_executor(
+    cmd: _Command,
+    args: tuple,
+    invocation: _Invocation,
+    done: typing.Callable[[], None],
+) -> None:
+    """Run `cmd` in its pool, responding from the kernel's event loop when done."""
+    assert cmd.options.executor is not None  # noqa: S101
+    loop = _running_loop()
+    executor = _get_executor(cmd.options.executor)
+    # (copied at dispatch, so the command's span is current in the pool)
+    ctx = contextvars.copy_context()
+    ctx.run(_CURRENT_INVOCATION.set, invocation)
+
+    def _start(release: typing.Callable[[], None]) -> None:
+        if invocation.cancelled.is_set():
+            release()
+            done()
+            return
+
+        cancelled: threading.Event | None = None
+        if cmd.options.executor == "thread":
+            future = executor.submit(ctx.run, cmd.func, *args)
+        else:
+            cancelled = _get_manager().Event()
+            future = executor.submit(_run_in_process, cmd.func, cancelled, *args)
+
+        def _cancel() -> None:
+            # only succeeds if the pool hasn't started it yet. running commands
+            # can check `command_cancelled()`.
+            future.cancel()
+            if cancelled is not None:
+                cancelled.set()
+
+        invocation.on_cancel = _cancel
+
+        def _on_done(future: concurrent.futures.Future) -> None:
+            release()
+            try:
+                if not future.cancelled():
+                    _respond_with_result(invocation, future)
+            finally:
+                done()
+
+        # results (and buffers) are sent from the kernel's event loop
+        future.add_done_callback(_call_on_loop(loop, _on_done))
+
+    drop = cmd.options.limiter.run(_start)
+    if invocation.on_cancel is None:
+        # still queued, so cancelling just removes it from the queue
+
+        def _drop() -> None:
+            if drop():
+                done()
+
+        invocation.on_cancel = _drop
@@ -18,22 +18,40 @@
 from __future__ import annotations
 
 import contextlib
+import copy
 import json
 import sys
 import warnings
 import weakref
-from dataclasses import asdict, is_dataclass
+from dataclasses import asdict, fields, is_dataclass
 from typing import (
     TYPE_CHECKING,
     Any,
     Callable,
     Iterable,
+    Mapping,
     Sequence,
     cast,
     overload,
 )
 
+from . import (
+    _mapped,
+    _metrics,
+    _outbox,
+    _packing,
+    _paging,
+    _payloads,
+    _recording,
+    _tracing,
+    _versions,
+)
+from ._changes import Change, ChangeFeed
+from ._commands import _CommandDispatcher, _get_anywidget_commands
 from ._file_contents import FileContents, VirtualFileContents
+from ._mapped import MappedBuffers
+from ._registry import comm_registry
+from ._streams import AppendTracker, is_stream
 from ._util import (
     _ANYWIDGET_ID_KEY,
     _DEFAULT_ESM,
@@ -42,11 +60,13 @@ from ._util import (
     put_buffers,
     remove_buffers,
     repr_mimebundle,
-    try_file_contents,
+    try_file_contents_many,
 )
 from ._version import _ANYWIDGET_SEMVER_VERSION
 
 if TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import AsyncIterator
+
     import comm
     import msgspec
     import psygnal
@@ -54,7 +74,8 @@ if TYPE_CHECKING:  # pragma: no cover
     import traitlets
     from typing_extensions import Protocol, TypeAlias, TypeGuard
 
-    from ._protocols import CommMessage
+    from ._packing import Quantize
+    from ._protocols import CommMessage, UpdateData
 
     class _GetState(Protocol):
         def __call__(self, obj: Any, include: set[str] | None) -> dict: ...  # noqa: ANN401
@@ -75,55 +96,67 @@ def open_comm(
 ) -> comm.base_comm.BaseComm:
     import comm
 
-    state, buffer_paths, buffers = remove_buffers(initial_state)
-
-    return comm.create_comm(
-        target_name="jupyter.widget",
-        metadata={"version": version},
-        data={
-            "state": {
-                "_model_module": "anywidget",
-                "_model_name": "AnyModel",
-                "_model_module_version": _ANYWIDGET_SEMVER_VERSION,
-                "_view_module": "anywidget",
-                "_view_name": "AnyView",
-                "_view_module_version": _ANYWIDGET_SEMVER_VERSION,
-                "_view_count": None,
-                **state,
-            },
-            "buffer_paths": buffer_paths,
+    key = str(initial_state.get(_ANYWIDGET_ID_KEY))
+    if _packing.CONFIG is not None:
+        initial_state = _packing.pack(initial_state)
+    with _metrics.timed(key, "remove_buffers"):
+        state, buffer_paths, buffers = remove_buffers(initial_state)
+
+    data = {
+        "state": {
+            "_model_module": "anywidget",
+            "_model_name": "AnyModel",
+            "_model_module_version": _ANYWIDGET_SEMVER_VERSION,
+            "_view_module": "anywidget",
+            "_view_name": "AnyView",
+            "_view_module_version": _ANYWIDGET_SEMVER_VERSION,
+            "_view_count": None,
+            **state,
         },
-        buffers=buffers,
-    )
-
-
-# cache of comms: map of id(obj) -> Comm.
-# we use id(obj) rather than WeakKeyDictionary because we can't assume that the
-# object has a __hash__ method
-_COMMS: dict[int, comm.base_comm.BaseComm] = {}
+        "buffer_paths": buffer_paths,
+    }
+    if _payloads.LIMITS is not None:
+        _payloads.check(key, data, buffers)
+    with (
+        _tracing.span("comm_open", widget=key, buffers=len(buffers))
+        if _tracing.CALLBACK
+        else _tracing.NO_SPAN
+    ):
+        comm_ = comm.create_comm(
+            target_name="jupyter.widget",
+            metadata={"version": version},
+            data=data,
+            buffers=buffers,
+        )
+    if _metrics.ENABLED:
+        _metrics.record_sent(key, data, buffers)
+        if getattr(comm_, "kernel", None):
+            # sent on the comm directly, so it isn't counted as widget traffic
+            request = {"method": "custom", "content": _metrics.FRONTEND_TIMINGS_REQUEST}
+            comm_.send(data=request)
+    if _recording.RECORDER is not None:
+        _recording.RECORDER.record("out", "open", comm_.comm_id, key, data, buffers)
+    return comm_
+
+
+# the open comms, one per object (see `anywidget.experimental.comm_registry`)
+_COMMS = comm_registry
 
 
 def _get_or_create_comm(
-    obj: object, get_state: Callable[[], dict]
+    obj: object,
+    get_state: Callable[[], dict],
+    on_close: Callable[[], object] | None = None,
 ) -> comm.base_comm.BaseComm:
     """Get or create a communication channel for a given object.
 
-    Comms are cached by object id, so that if the same object is used in multiple
+    Comms are cached per object, so that if the same object is used in multiple
     places, the same comm will be used. Comms are deleted when the object is garbage
-    collected.
+    collected (or closed with `_COMMS.close_all()`, which then calls `on_close`).
     """
-    # NOTE: this is not a totally safe way to create an id for an object
-    # since it's possible that the id could be reused.  However, that will only happen
-    # after object deletion, so the "risk" seems rather minimal.
-    obj_id = id(obj)
-    if obj_id not in _COMMS:
-        _COMMS[obj_id] = open_comm(initial_state=get_state())
-        # when the object is garbage collected, remove the comm from the cache
-        with contextlib.suppress(TypeError):
-            # if the object is not weakrefable, we can't do anything
-            # they'll receive a warning from the init of ReprMimeBundle
-            weakref.finalize(obj, _COMMS.pop, obj_id)
-    return _COMMS[obj_id]
+    return _COMMS.get_or_open(
+        obj, lambda: open_comm(initial_state=get_state()), on_close=on_close
+    )
 
 
 class MimeBundleDescriptor:
@@ -152,6 +185,10 @@ class MimeBundleDescriptor:
         useful for cases where you want to use the comm channel to send state updates
         to the front end, but don't want to display anything in the notebook
         (i.e., A DOM-less widget).  Defaults to `False`.
+    quantize : Mapping[str, Quantize] | None, optional
+        Lossy encodings for numeric fields, by name, to make their updates smaller
+        (see `anywidget.experimental.Quantize`). Policies can also be set in the
+        `metadata` of dataclass fields (e.g., `field(metadata={"quantize": ...})`).
     **extra_state : Any, optional
         Any extra state that should be sent to the javascript view (for example,
         for the `_esm` anywidget field.)  By default, `{'_esm': _DEFAULT_ESM}` is added
@@ -180,6 +217,7 @@ class MimeBundleDescriptor:
         follow_changes: bool = True,
         autodetect_observer: bool = True,
         no_view: bool = False,
+        quantize: Mapping[str, Quantize] | None = None,
         **extra_state: object,
     ) -> None:
         extra_state.setdefault(_ESM_KEY, _DEFAULT_ESM)
@@ -188,13 +226,9 @@ class MimeBundleDescriptor:
         self._follow_changes = follow_changes
         self._autodetect_observer = autodetect_observer
         self._no_view = no_view
+        self._quantize = dict(quantize or {})
 
-        for k, v in self._extra_state.items():
-            # TODO(manzt): use := when we drop python 3.7
-            # https://github.com/manzt/anywidget/pull/167
-            file_contents = try_file_contents(v)
-            if file_contents is not None:
-                self._extra_state[k] = file_contents
+        self._extra_state.update(try_file_contents_many(self._extra_state))
 
     def __set_name__(self, owner: type, name: str) -> None:
         """Called when this descriptor is assigned to an attribute on a class.
@@ -239,6 +273,7 @@ class MimeBundleDescriptor:
                 autodetect_observer=self._autodetect_observer,
                 extra_state=self._extra_state,
                 no_view=self._no_view,
+                quantize=self._quantize,
             )
             if self._follow_changes:
                 # set up two way data binding
@@ -289,6 +324,9 @@ class ReprMimeBundle:
         useful for cases where you want to use the comm channel to send state updates
         to the front end, but don't want to display anything in the notebook
         (i.e., A DOM-less widget).  Defaults to `False`.
+    quantize : Mapping[str, Quantize] | None, optional
+        Lossy encodings for numeric fields, by name, in addition to any in the
+        `metadata` of the object's dataclass fields.
     extra_state : dict, optional
         Any extra state that should be sent to the javascript view (for example,
         for the `_esm` anywidget field.)  By default, `{'_esm': DEFAULT_ESM}` is added
@@ -301,10 +339,12 @@ class ReprMimeBundle:
         autodetect_observer: bool = True,
         extra_state: dict[str, object] | None = None,
         no_view: bool = False,
+        quantize: Mapping[str, Quantize] | None = None,
     ) -> None:
         self._autodetect_observer = autodetect_observer
         self._extra_state = (extra_state or {}).copy()
         self._extra_state.setdefault(_ANYWIDGET_ID_KEY, _anywidget_id(obj))
+        self._anywidget_id = str(self._extra_state[_ANYWIDGET_ID_KEY])
         self._no_view = no_view
 
         try:
@@ -326,6 +366,26 @@ class ReprMimeBundle:
         # figure out what type of object we're working with, and how it "get state".
         self._get_state = determine_state_getter(obj)
         self._set_state = determine_state_setter(obj)
+        self._quantize = {**_packing.field_policies(obj), **(quantize or {})}
+        # sends from other threads on the kernel's event loop, in order
+        self._outbox = _outbox.Outbox(self.send_state, self._send_custom)
+        # the front end's changes, for `changed()` and `changes()`
+        self._changes = ChangeFeed()
+        # the latest version of each field, to drop stale updates from the front end
+        self._versions = _versions.Versions()
+        # sends only the new items of append-only lists in the state
+        self._appends = AppendTracker(self.send_state)
+        # the fields holding a `PagedData` (or `PyramidData`), sent as descriptions
+        self._lazy_keys: set[str] = set()
+        # sends large memory-mapped buffers in windows, after the state
+        self._mapped = MappedBuffers(self._send_chunk)
+
+        # dispatches `@command` calls from the front end, including the built-in
+        # ones serving any `PagedData` (and `PyramidData`) in the state, which are
+        # looked up when requested (so those assigned later are served too)
+        self._commands = _CommandDispatcher(
+            {**_get_anywidget_commands(type(obj)), **_paging.COMMANDS}
+        )
 
         for key, value in self._extra_state.items():
             if isinstance(value, (VirtualFileContents, FileContents)):
@@ -340,17 +400,54 @@ class ReprMimeBundle:
                 obj=obj,
                 # When creating the comm, we need to send the current state
                 # immediately to prevent race conditions.
-                get_state=lambda: {
-                    **self._get_state(obj, include=None),
-                    **self._extra_state,
-                },
+                get_state=lambda: self._full_state(obj),
+                on_close=self._close,
             )
+            if getattr(self._comm, "kernel", None):
+                self._appends.commit()
+                self._mapped.commit()
+            else:
+                self._appends.discard()
+                self._mapped.discard()
+
+    def _full_state(self, obj: object) -> dict:
+        """The whole state, encoded for sending when the comm opens."""
+        state = {**self._get_state(obj, include=None), **self._extra_state}
+        self._find_fields(state)
+        if self._lazy_keys:
+            state = _paging.describe(state, self._lazy_keys)
+        state = self._appends.encode(state, full=True)
+        return self._mapped.encode(_packing.quantize(state, self._quantize))
+
+    def _find_fields(self, state: dict) -> None:
+        """Note the fields of `state` holding append-only lists, lazy or mapped data.
+
+        Checks the exact type of each value, which is cheaper than `isinstance`.
+        """
+        for key, value in state.items():
+            if is_stream(value):
+                self._appends.track(key)
+            elif _paging.is_lazy(value):
+                self._lazy_keys.add(key)
+            elif _mapped.holds_mapped(value):
+                self._mapped.track(key)
 
     def _on_obj_deleted(self, ref: weakref.ReferenceType | None = None) -> None:  # noqa: ARG002
         """Called when the python object is deleted."""
+        self._close()
+        # could swap out esm here for a "deleted" message, or any number of things.
+
+    def _close(self) -> None:
+        """Stop syncing with the view, and close the comm."""
         self.unsync_object_with_view()
+        self._appends.disconnect()
         self._comm.close()
-        # could swap out esm here for a "deleted" message, or any number of things.
+        # no longer cached on the object (see `MimeBundleDescriptor.__get__`), so
+        # displaying it again opens a new comm
+        obj_dict = getattr(self._obj(), "__dict__", None)
+        if obj_dict is not None:
+            for name in [name for name, value in obj_dict.items() if value is self]:
+                del obj_dict[name]
 
     def send_state(self, include: str | Iterable[str] | None = None) -> None:
         """Send state update to the front-end view.
@@ -361,6 +458,9 @@ class ReprMimeBundle:
             If provided, only send the state for the keys in this set.  Otherwise,
             send all state.
         """
+        if self._outbox.put_state(include):
+            return  # sent from the kernel's event loop
+
         obj = self._obj()
         if obj is None:
             return  # pragma: no cover  ... the python object has been deleted
@@ -368,7 +468,13 @@ class ReprMimeBundle:
         if include is not None:
             include = {include} if isinstance(include, str) else set(include)
 
-        state = {**self._get_state(obj, include=include), **self._extra_state}
+        key = self._anywidget_id
+        with _metrics.timed(key, "get_state"), (
+            _tracing.span("get_state", widget=key)
+            if _tracing.CALLBACK
+            else _tracing.NO_SPAN
+        ):
+            state = {**self._get_state(obj, include=include), **self._extra_state}
         if include is not None:
             # ensure that we only send the keys that were requested
             # in case the state getter returned extra keys
@@ -377,10 +483,63 @@ class ReprMimeBundle:
         if not state:
             return  # pragma: no cover
 
-        state, buffer_paths, buffers = remove_buffers(state)
+        self._commands.state_changed(state)
+
+        self._find_fields(state)
+        if self._lazy_keys:
+            state = _paging.describe(state, self._lazy_keys)
+        state = self._appends.encode(state, full=include is None)
+        if not state:
+            return  # only append-only lists, with nothing new to send
+        state = _packing.quantize(state, self._quantize)
+        if _packing.CONFIG is not None:
+            state = _packing.pack(state)
+        self._send_update(self._mapped.encode(state))
+
+    def _send_update(self, state: dict) -> None:
+        """Send a state update (with buffers still in place) to the front-end."""
+        key = self._anywidget_id
+        with _metrics.timed(key, "remove_buffers"):
+            state, buffer_paths, buffers = remove_buffers(state)
         if getattr(self._comm, "kernel", None):
-            msg = {"method": "update", "state": state, "buffer_paths": buffer_paths}
-            self._comm.send(data=msg, buffers=buffers)  # type: ignore[arg-type]
+            msg: dict = {
+                "method": "update",
+                "state": state,
+                "buffer_paths": buffer_paths,
+            }
+            if _outbox.MAX_IN_FLIGHT is not None:
+                # numbered, for the front end to acknowledge
+                msg["seq"] = self._outbox.sent()
+            if _versions.ENABLED:
+                msg["versions"] = self._versions.bump(_versions.update_keys(msg))
+            if _payloads.LIMITS is not None:
+                _payloads.check(key, msg, buffers)
+            with (
+                _tracing.span("comm_send", widget=key, buffers=len(buffers))
+                if _tracing.CALLBACK
+                else _tracing.NO_SPAN
+            ):
+                self._comm.send(data=msg, buffers=buffers)  # type: ignore[arg-type]
+            self._appends.commit()
+            if _metrics.ENABLED:
+                _metrics.record_sent(key, msg, buffers)
+            if _recording.RECORDER is not None:
+                comm_id = self._comm.comm_id
+                _recording.RECORDER.record("out", "msg", comm_id, key, msg, buffers)
+            self._mapped.commit()
+        else:
+            self._appends.discard()
+            self._mapped.discard()
+
+    def _send_chunk(self, content: dict, buffer: memoryview) -> None:
+        """Send a window of a memory-mapped buffer to the front-end."""
+        msg = {"method": "custom", "content": content}
+        self._comm.send(data=msg, buffers=[buffer])  # type: ignore[list-item]
+        if _metrics.ENABLED:
+            _metrics.record_sent(self._anywidget_id, msg, [buffer])
+        if _recording.RECORDER is not None:
+            comm_id, key = self._comm.comm_id, self._anywidget_id
+            _recording.RECORDER.record("out", "msg", comm_id, key, msg, [buffer])
 
     def _handle_msg(self, msg: CommMessage) -> None:
         """Called when a msg is received from the front-end.
@@ -397,31 +556,130 @@ class ReprMimeBundle:
             return  # pragma: no cover  ... the python object has been deleted
 
         data = msg["content"]["data"]
+        if _metrics.ENABLED or _recording.RECORDER is not None:
+            self._observe_received(dict(data), msg.get("buffers"))
+
         if data["method"] == "update":
-            if "state" in data:
-                state = data["state"]
-                if "buffer_paths" in data:
-                    put_buffers(state, data["buffer_paths"], msg["buffers"])
-                self._set_state(obj, state)
+            self._handle_update(obj, data, msg.get("buffers") or [])
 
         elif data["method"] == "request_state":
+            # a new front end, which won't acknowledge what the old one didn't
+            self._outbox.reset()
+            self._mapped.reset()
             self.send_state()
 
-        # elif method == "custom":  # noqa: ERA001
-        # Handle a custom msg from the front-end.
-        # if "content" in data:
-        #     self._handle_custom_msg(data["content"], msg["buffers"])  # noqa: ERA001
+        elif data["method"] == "custom":
+            # Handle a custom msg from the front-end.
+            buffers = cast("list[bytes]", msg.get("buffers", []))
+            self._handle_custom(obj, data["content"], buffers)
         else:  # pragma: no cover
-            err_msg = (
+            err_msg = (  # type: ignore[unreachable]
                 f"Unrecognized method: {data['method']}.  Please report this at "
                 "https://github.com/manzt/anywidget/issues"
             )
             raise ValueError(err_msg)
 
-    # def _handle_custom_msg(self, content: object, buffers: list[memoryview]):
-    #     # TODO(manzt): handle custom callbacks  # noqa: TD003
-    #     # https://github.com/jupyter-widgets/ipywidgets/blob/6547f840edc1884c75e60386ec7fb873ba13f21c/python/ipywidgets/ipywidgets/widgets/widget.py#L662
-    #     ...
+    def _handle_update(self, obj: object, data: UpdateData, buffers: list) -> None:
+        """Handle a state update from the front-end."""
+        key = self._anywidget_id
+        if _versions.ENABLED:
+            update, buffers = self._versions.drop_stale(dict(data), buffers)
+            data = cast("UpdateData", update)
+        if "state" in data:
+            state = data["state"]
+            if "buffer_paths" in data:
+                with _metrics.timed(key, "put_buffers"):
+                    put_buffers(state, data["buffer_paths"], buffers)
+            with (
+                _tracing.span("set_state", widget=key, keys=len(state))
+                if _tracing.CALLBACK
+                else _tracing.NO_SPAN
+            ):
+                self._set_state(obj, state)
+            self._commands.state_changed(state)
+            if self._changes:
+                self._changes.publish(
+                    Change(name, getattr(obj, name, value))
+                    for name, value in state.items()
+                )
+
+    def _handle_custom(
+        self, obj: object, content: object, buffers: list[bytes]
+    ) -> None:
+        """Handle a custom msg: front-end timings, or a command invocation."""
+        if _metrics.is_frontend_timings(content):
+            if _metrics.ENABLED:
+                _metrics.record_frontend(self._anywidget_id, content.get("timings"))
+        elif _outbox.is_ack(content):
+            self._outbox.ack(content["seq"])
+        elif _mapped.is_ack(content):
+            self._mapped.ack()
+        else:
+            self._commands.handle(obj, content, buffers, self._send_custom)
+
+    def _observe_received(self, data: dict, buffers: list | None) -> None:
+        """Count and/or record a message received from the front-end."""
+        if _metrics.ENABLED:
+            _metrics.record_received(self._anywidget_id, data, buffers)
+        if _recording.RECORDER is not None:
+            comm_id = self._comm.comm_id
+            _recording.RECORDER.record(
+                "in", "msg", comm_id, self._anywidget_id, data, buffers
+            )
+
+    def _send_custom(self, content: dict, buffers: list[bytes]) -> None:
+        """Send a custom msg to the front-end (i.e., a command response)."""
+        if self._outbox.put(content, buffers):
+            return  # sent from the kernel's event loop
+        if getattr(self._comm, "kernel", None):
+            msg = {"method": "custom", "content": content}
+            if _payloads.LIMITS is not None:
+                _payloads.check(self._anywidget_id, msg, buffers)
+            with (
+                _tracing.span("comm_send", widget=self._anywidget_id)
+                if _tracing.CALLBACK
+                else _tracing.NO_SPAN
+            ):
+                self._comm.send(data=msg, buffers=buffers)
+            if _metrics.ENABLED:
+                _metrics.record_sent(self._anywidget_id, msg, buffers)
+            if _recording.RECORDER is not None:
+                _recording.RECORDER.record(
+                    "out", "msg", self._comm.comm_id, self._anywidget_id, msg, buffers
+                )
+
+    async def changed(self, *names: str) -> Change:
+        """Wait for the front end to change one of `names` (or any public state).
+
+        Parameters
+        ----------
+        *names : str
+            The names of the state to wait for. All public state if none are given.
+
+        Returns
+        -------
+        Change
+            The name and new value of the changed state.
+        """
+        return await self._changes.changed(*names)
+
+    def changes(self, *names: str) -> AsyncIterator[Change]:
+        """Iterate over the front end's changes to `names` (or any public state).
+
+        Changes made while the consumer is busy are queued, keeping only the
+        latest of each name, so a slow consumer skips intermediate values.
+
+        Parameters
+        ----------
+        *names : str
+            The names of the state to follow. All public state if none are given.
+
+        Returns
+        -------
+        AsyncIterator[Change]
+            The name and new value of each changed field.
+        """
+        return self._changes.changes(*names)
 
     def __call__(self, **kwargs: Sequence[str]) -> tuple[dict, dict] | None:  # noqa: ARG002
         """Called when _repr_mimebundle_ is called on the python object."""
@@ -533,7 +791,7 @@ def determine_state_getter(obj: object) -> _GetState:
     if is_dataclass(obj):
         # caveat: if the dict is not JSON serializeable... you still need to
         # provide an API for the user to customize serialization
-        return lambda obj, include: asdict(obj)  # noqa: ARG005
+        return _get_dataclass_state
 
     if _is_traitlets_object(obj):
         return _get_traitlets_state
@@ -654,6 +912,25 @@ _TRAITLETS_SYNC_FLAG = "sync"
 # state isn't being synced without opting in.
 
 
+def _get_dataclass_state(obj: Any, include: set[str] | None) -> dict:  # noqa: ANN401, ARG001
+    """Get the state of a dataclass instance.
+
+    Like `dataclasses.asdict`, except that memory-mapped fields are kept as they
+    are, rather than deep-copied into memory.
+    """
+    mapped = {}
+    for f in fields(obj):
+        value = getattr(obj, f.name)
+        if _mapped.is_mapped(value):
+            mapped[f.name] = value
+    if not mapped:
+        return asdict(obj)
+    shallow = copy.copy(obj)
+    for name in mapped:
+        object.__setattr__(shallow, name, None)  # (frozen dataclasses too)
+    return {**asdict(shallow), **mapped}
+
+
 def _get_traitlets_state(
     obj: traitlets.HasTraits,
     include: set[str] | None,  # noqa: ARG001
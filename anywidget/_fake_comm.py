@@ -0,0 +1,121 @@
+"""An in-process comm backend that records messages instead of using a kernel.
+
+Used by the benchmarks (and replays of recorded traffic) to exercise the Python
+side of widget synchronization without a running kernel or front end:
+
+>>> with fake_comms() as comms:
+...     w = MyWidget()
+...     w.value = 1
+>>> comms[0].messages[-1].data["state"]
+{'value': 1}
+"""
+
+from __future__ import annotations
+
+import contextlib
+import typing
+import uuid
+
+import comm
+from comm.base_comm import BaseComm
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Iterator
+
+__all__ = ["FakeComm", "FakeMessage", "fake_comms"]
+
+
+class FakeMessage(typing.NamedTuple):
+    """A message published by a `FakeComm`."""
+
+    msg_type: str
+    data: dict
+    metadata: dict
+    buffers: list
+
+
+class FakeComm(BaseComm):
+    """A comm that records the messages it publishes.
+
+    Parameters
+    ----------
+    *args : Any
+        Passed to `comm.base_comm.BaseComm`.
+    record : bool, optional
+        If `True` (default), keep every published message in `messages`. Otherwise
+        only `message_count` is updated, so long benchmarks don't accumulate memory.
+    **kwargs : Any
+        Passed to `comm.base_comm.BaseComm`.
+    """
+
+    # ipywidgets and ReprMimeBundle only send on comms that have a kernel
+    kernel = True
+
+    def __init__(
+        self,
+        *args: typing.Any,  # noqa: ANN401
+        record: bool = True,
+        **kwargs: typing.Any,  # noqa: ANN401
+    ) -> None:
+        self.record = record
+        self.messages: list[FakeMessage] = []
+        self.message_count = 0
+        super().__init__(*args, **kwargs)
+
+    def publish_msg(
+        self,
+        msg_type: str,
+        data: dict | None = None,
+        metadata: dict | None = None,
+        buffers: list | None = None,
+        **keys: typing.Any,  # noqa: ANN401, ARG002
+    ) -> None:
+        """Record a message instead of publishing it on IOPub."""
+        self.message_count += 1
+        if self.record:
+            self.messages.append(
+                FakeMessage(msg_type, data or {}, metadata or {}, list(buffers or []))
+            )
+
+    def receive(self, data: dict, buffers: list | None = None) -> None:
+        """Deliver a `comm_msg` from the (pretend) front end to this comm."""
+        self.handle_msg(
+            {
+                "header": {"msg_id": uuid.uuid4().hex, "msg_type": "comm_msg"},
+                "msg_id": uuid.uuid4().hex,
+                "msg_type": "comm_msg",
+                "parent_header": {},
+                "metadata": {},
+                "content": {"comm_id": self.comm_id, "data": data},
+                "buffers": [memoryview(b) for b in buffers or []],
+            }
+        )
+
+
+@contextlib.contextmanager
+def fake_comms(*, record: bool = True) -> Iterator[list[FakeComm]]:
+    """Create a `FakeComm` for every comm opened within the block.
+
+    Parameters
+    ----------
+    record : bool, optional
+        Whether the comms keep the messages they publish (see `FakeComm`).
+
+    Yields
+    ------
+    list[FakeComm]
+        The comms created so far, in order of creation.
+    """
+    comms: list[FakeComm] = []
+
+    def create_comm(*args: typing.Any, **kwargs: typing.Any) -> FakeComm:  # noqa: ANN401
+        fake = FakeComm(*args, record=record, **kwargs)
+        comms.append(fake)
+        return fake
+
+    original = comm.create_comm
+    comm.create_comm = create_comm
+    try:
+        yield comms
+    finally:
+        comm.create_comm = original
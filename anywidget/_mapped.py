@@ -0,0 +1,224 @@
+"""Memory-mapped buffers in widget state, sent in bounded windows.
+
+An `mmap.mmap` or `np.memmap` in a widget's state (as a top-level value, or in a
+dict) is sent as a binary buffer without first copying it into memory. Mapped
+buffers larger than the window size (see `mapped_buffer_window`) aren't sent
+whole: the state holds a placeholder,
+
+    {"__anywidget_chunked__": "3", "nbytes": 2147483648}
+
+and the buffer follows in custom messages of at most one window each, read from
+the file as they are sent:
+
+    {"kind": "anywidget-chunk", "id": "3", "path": ["image", "data"],
+     "offset": 0, "nbytes": 2147483648}
+
+The front end's `AnyModel` assembles the chunks, and replaces the placeholder
+with a `DataView` of the whole buffer once they have all arrived. It acknowledges
+each chunk with an `{"kind": "anywidget-chunk-ack"}` message, and at most a few
+windows (see `mapped_buffer_window`) are sent ahead of those acknowledgements, so
+the kernel doesn't queue up the whole file in the comm's socket.
+
+Only the keys a widget has seen a mapped value at (when assigned, or in its
+whole state) are looked at when it sends its state, so other widgets don't pay
+for walking theirs.
+
+Placeholders are only made for state that is sent: a widget stages them while
+getting its state to send, then `commit`s them once the state is sent, which
+queues the windows (or `discard`s them, if it wasn't).
+"""
+
+from __future__ import annotations
+
+import collections
+import itertools
+import mmap
+import typing
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from typing_extensions import TypeGuard
+
+__all__ = ["mapped_buffer_window"]
+
+CHUNKED_KEY = "__anywidget_chunked__"
+CHUNK_KIND = "anywidget-chunk"
+CHUNK_ACK_KIND = "anywidget-chunk-ack"
+
+# the active window size in bytes, or `None` to send mapped buffers whole
+WINDOW: int | None = 16 * 2**20
+# the most windows sent ahead of the front end's acknowledgements
+IN_FLIGHT = 2
+
+_IDS = itertools.count()
+
+
+def mapped_buffer_window(
+    window_bytes: int | None = 16 * 2**20, *, in_flight: int = 2
+) -> None:
+    """Set the size of the windows that memory-mapped buffers are sent in.
+
+    Parameters
+    ----------
+    window_bytes : int | None, optional
+        Send mapped buffers larger than this in chunks of (at most) this many
+        bytes (default: 16 MiB). Rounded down to a whole number of memory pages.
+        `None` to send them whole, in the state message.
+    in_flight : int, optional
+        The most windows (per widget) sent before the front end acknowledges
+        receiving them (default: 2).
+    """
+    global WINDOW, IN_FLIGHT  # noqa: PLW0603
+    if in_flight < 1:
+        msg = f"in_flight must be at least 1, not {in_flight}"
+        raise ValueError(msg)
+    if window_bytes is not None:
+        window_bytes = max(window_bytes - window_bytes % mmap.PAGESIZE, mmap.PAGESIZE)
+    WINDOW = window_bytes
+    IN_FLIGHT = in_flight
+
+
+# the types of most values in the state, which can't be mapped
+_PLAIN_TYPES = frozenset(
+    {str, int, float, bool, type(None), dict, list, tuple, bytes, memoryview}
+)
+
+
+def is_mapped(value: object) -> bool:
+    """Whether `value` is a memory-mapped file (`mmap.mmap` or `np.memmap`)."""
+    # (checked by name, so NumPy needn't be imported, and cheaply, as it's called
+    # for every dict value in the state)
+    cls = type(value)
+    if cls in _PLAIN_TYPES:
+        return False
+    return issubclass(cls, mmap.mmap) or (
+        cls.__name__ == "memmap" and hasattr(value, "filename")
+    )
+
+
+def holds_mapped(value: object) -> bool:
+    """Whether `value` is a mapped value, or a dict holding one."""
+    if isinstance(value, dict):
+        return any(holds_mapped(child) for child in value.values())
+    return is_mapped(value)
+
+
+def is_ack(content: object) -> TypeGuard[dict]:
+    """Whether a custom message is the front end acknowledging a window."""
+    return isinstance(content, dict) and content.get("kind") == CHUNK_ACK_KIND
+
+
+def as_buffer(value: typing.Any) -> memoryview:  # noqa: ANN401
+    """A flat view of the bytes of a mapped value (copied only if not contiguous)."""
+    view = memoryview(value)
+    if not view.c_contiguous:
+        return memoryview(value.tobytes())
+    return view.cast("B") if view.format != "B" or view.ndim != 1 else view
+
+
+class _Pending(typing.NamedTuple):
+    id: str
+    path: list[str]
+    buffer: memoryview
+
+
+class MappedBuffers:
+    """The mapped buffers of a widget, replaced by placeholders until sent.
+
+    Parameters
+    ----------
+    send : Callable[[dict, memoryview], object]
+        Sends a window of a buffer, as a custom message.
+    """
+
+    def __init__(self, send: typing.Callable[[dict, memoryview], object]) -> None:
+        self._send = send
+        # the keys that may hold a mapped value (in order, as a dict)
+        self._keys: dict[str, None] = {}
+        # the placeholders of the state being sent
+        self._staged: list[_Pending] = []
+        # the windows waiting to be sent, and the number sent but not acknowledged
+        self._windows: collections.deque[tuple[dict, memoryview]] = collections.deque()
+        self._in_flight = 0
+
+    def track(self, key: str) -> None:
+        """Look for mapped values at `key` in the state from now on."""
+        self._keys[key] = None
+
+    def find(self, state: dict) -> None:
+        """Track the keys of `state` holding mapped values (e.g., the whole state)."""
+        for key, value in state.items():
+            if key not in self._keys and holds_mapped(value):
+                self._keys[key] = None
+
+    def encode(self, state: dict) -> dict:
+        """Replace mapped values in `state` by buffers, or (if large) placeholders.
+
+        Only the tracked keys are looked at. The placeholders are staged, until
+        the state is sent (see `commit`).
+        """
+        self._staged = []
+        encoded = state
+        for key in self._keys:
+            value = state.get(key)
+            new = self._encode(value, [key])
+            if new is not value:
+                if encoded is state:
+                    encoded = dict(state)  # copied on write
+                encoded[key] = new
+        return encoded
+
+    def _encode(self, value: object, path: list[str]) -> object:
+        if is_mapped(value):
+            buffer = as_buffer(value)
+            if WINDOW is None or buffer.nbytes <= WINDOW:
+                return buffer
+            pending = _Pending(str(next(_IDS)), path, buffer)
+            self._staged.append(pending)
+            return {CHUNKED_KEY: pending.id, "nbytes": buffer.nbytes}
+        if not isinstance(value, dict):
+            return value
+        encoded = value
+        for key, child in value.items():
+            new = self._encode(child, [*path, key])
+            if new is not child:
+                if encoded is value:
+                    encoded = dict(value)  # copied on write
+                encoded[key] = new
+        return encoded
+
+    def commit(self) -> None:
+        """Queue the windows of the placeholders in the state just sent."""
+        staged, self._staged = self._staged, []
+        window = WINDOW or mmap.PAGESIZE
+        for item in staged:
+            nbytes = item.buffer.nbytes
+            for offset in range(0, nbytes, window):
+                content = {
+                    "kind": CHUNK_KIND,
+                    "id": item.id,
+                    "path": item.path,
+                    "offset": offset,
+                    "nbytes": nbytes,
+                }
+                self._windows.append((content, item.buffer[offset : offset + window]))
+        self._pump()
+
+    def discard(self) -> None:
+        """Forget the placeholders of a state that wasn't sent."""
+        self._staged = []
+
+    def ack(self) -> None:
+        """The front end has received a window; send the next ones."""
+        self._in_flight = max(self._in_flight - 1, 0)
+        self._pump()
+
+    def reset(self) -> None:
+        """Drop the queued windows (e.g., the front end was reloaded)."""
+        self._windows.clear()
+        self._in_flight = 0
+
+    def _pump(self) -> None:
+        while self._windows and self._in_flight < IN_FLIGHT:
+            content, buffer = self._windows.popleft()
+            self._in_flight += 1
+            self._send(content, buffer)
@@ -0,0 +1,228 @@
+"""Opt-in counters for widget comm traffic.
+
+Metrics are disabled by default, and every instrumented call site only checks
+`ENABLED` (or enters a shared no-op context manager) until they are turned on with
+`anywidget.enable_stats()` or the `ANYWIDGET_METRICS=1` environment variable.
+
+Traffic is aggregated per widget class (keyed by its fully-qualified name, as in
+`_anywidget_id`) and, for state updates, per trait. JSON sizes are measured by
+re-encoding the message, so they are close to, but not exactly, what the kernel
+puts on the wire.
+
+Widgets opened while metrics are enabled also ask their front end to report how
+long it takes to load, initialize and render them (see `Timings` in `widget.js`).
+"""
+
+from __future__ import annotations
+
+import contextlib
+import copy
+import dataclasses
+import json
+import os
+import threading
+import time
+import typing
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Iterator, Sequence
+
+    from typing_extensions import TypeGuard
+
+__all__ = ["Timing", "TraitStats", "WidgetStats", "enable_stats", "stats"]
+
+ENABLED = os.getenv("ANYWIDGET_METRICS") == "1"
+
+# sent to the front end when a comm opens, to receive its timings as they happen
+FRONTEND_TIMINGS_REQUEST = {"kind": "anywidget-timings-request", "subscribe": True}
+
+_LOCK = threading.Lock()
+_NULL_CONTEXT: typing.ContextManager[None] = contextlib.nullcontext()
+
+
+@dataclasses.dataclass
+class TraitStats:
+    """Message counts and sizes for a widget class, or one of its traits."""
+
+    messages_sent: int = 0
+    messages_received: int = 0
+    json_bytes_sent: int = 0
+    json_bytes_received: int = 0
+    buffers_sent: int = 0
+    buffer_bytes_sent: int = 0
+    buffers_received: int = 0
+    buffer_bytes_received: int = 0
+
+
+@dataclasses.dataclass
+class Timing:
+    """Number of calls to, and total wall-clock time spent in, an operation."""
+
+    calls: int = 0
+    seconds: float = 0.0
+
+
+@dataclasses.dataclass
+class WidgetStats(TraitStats):
+    """Traffic for a widget class.
+
+    Attributes
+    ----------
+    traits : dict[str, TraitStats]
+        Traffic attributed to each trait by state updates.
+    timings : dict[str, Timing]
+        Time spent in `get_state`, `remove_buffers`, `put_buffers` and `command`
+        (from dispatch until the command completes, for async, streaming and
+        pooled commands too).
+    frontend : dict[str, Timing]
+        Time spent in the front end, as reported by views: `esm_load`, `initialize`,
+        `render` (per view), and `first_render` (from the comm opening to its first
+        rendered view).
+    """
+
+    traits: dict[str, TraitStats] = dataclasses.field(default_factory=dict)
+    timings: dict[str, Timing] = dataclasses.field(default_factory=dict)
+    frontend: dict[str, Timing] = dataclasses.field(default_factory=dict)
+
+
+_STATS: dict[str, WidgetStats] = {}
+
+
+def enable_stats(enabled: bool = True) -> None:
+    """Turn collection of widget traffic metrics on (or off).
+
+    Parameters
+    ----------
+    enabled : bool, optional
+        Whether to collect metrics. Defaults to `True`.
+    """
+    global ENABLED  # noqa: PLW0603
+    ENABLED = enabled
+
+
+def stats(*, reset: bool = False) -> dict[str, WidgetStats]:
+    """Get a snapshot of the traffic metrics collected so far.
+
+    Metrics are only collected after `anywidget.enable_stats()` is called (or with
+    `ANYWIDGET_METRICS=1` in the environment).
+
+    Parameters
+    ----------
+    reset : bool, optional
+        If `True`, clear the collected metrics after taking the snapshot.
+
+    Returns
+    -------
+    dict[str, WidgetStats]
+        Metrics keyed by the fully-qualified name of the widget class.
+
+    Examples
+    --------
+    >>> anywidget.enable_stats()
+    >>> ...  # use some widgets
+    >>> top = max(anywidget.stats().items(), key=lambda kv: kv[1].json_bytes_sent)
+    """
+    with _LOCK:
+        snapshot = copy.deepcopy(_STATS)
+        if reset:
+            _STATS.clear()
+    return snapshot
+
+
+def timed(key: str, name: str) -> typing.ContextManager[None]:
+    """Time the body of a `with` block as operation `name` of widget `key`."""
+    return _timed(key, name) if ENABLED else _NULL_CONTEXT
+
+
+@contextlib.contextmanager
+def _timed(key: str, name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _LOCK:
+            timings = _STATS.setdefault(key, WidgetStats()).timings
+            timing = timings.setdefault(name, Timing())
+            timing.calls += 1
+            timing.seconds += elapsed
+
+
+def record_sent(key: str, data: dict, buffers: Sequence[object] | None) -> None:
+    """Record a message sent to the front end by widget `key`."""
+    _record(key, data, buffers or [], sent=True)
+
+
+def record_received(key: str, data: dict, buffers: Sequence[object] | None) -> None:
+    """Record a message received from the front end by widget `key`."""
+    _record(key, data, buffers or [], sent=False)
+
+
+def is_frontend_timings(content: object) -> TypeGuard[dict]:
+    """Whether the content of a custom msg is a report of front-end timings."""
+    return isinstance(content, dict) and content.get("kind") == "anywidget-timings"
+
+
+def record_frontend(key: str, timings: object) -> None:
+    """Record timings (in milliseconds) reported by the front end of widget `key`."""
+    if not isinstance(timings, dict):
+        return
+    with _LOCK:
+        frontend = _STATS.setdefault(key, WidgetStats()).frontend
+        for name, samples in timings.items():
+            if not isinstance(samples, list) or not samples:
+                continue
+            timing = frontend.setdefault(str(name), Timing())
+            timing.calls += len(samples)
+            timing.seconds += sum(samples) / 1000
+
+
+def _dumps(value: object) -> int:
+    return len(json.dumps(value, separators=(",", ":"), default=str))
+
+
+def _nbytes(buffer: object) -> int:
+    return memoryview(buffer).nbytes  # type: ignore[arg-type]
+
+
+def _record(key: str, data: dict, buffers: Sequence[object], *, sent: bool) -> None:
+    suffix = "sent" if sent else "received"
+    state = data.get("state")
+    trait_sizes: dict[str, list[int]] = {}
+    if isinstance(state, dict):
+        # [json_bytes, buffer_count, buffer_bytes] per top-level key
+        trait_sizes = {name: [_dumps(value), 0, 0] for name, value in state.items()}
+        for path, buffer in zip(data.get("buffer_paths", []), buffers):
+            sizes = trait_sizes.setdefault(str(path[0]), [0, 0, 0])
+            sizes[1] += 1
+            sizes[2] += _nbytes(buffer)
+
+    json_bytes = _dumps(data)
+    buffer_bytes = sum(_nbytes(buffer) for buffer in buffers)
+    with _LOCK:
+        widget = _STATS.setdefault(key, WidgetStats())
+        _add(widget, suffix, json_bytes, len(buffers), buffer_bytes)
+        for name, (
+            trait_json,
+            trait_buffers,
+            trait_buffer_bytes,
+        ) in trait_sizes.items():
+            trait = widget.traits.setdefault(name, TraitStats())
+            _add(trait, suffix, trait_json, trait_buffers, trait_buffer_bytes)
+
+
+def _add(
+    stats: TraitStats,
+    suffix: str,
+    json_bytes: int,
+    buffer_count: int,
+    buffer_bytes: int,
+) -> None:
+    for field, value in (
+        ("messages", 1),
+        ("json_bytes", json_bytes),
+        ("buffers", buffer_count),
+        ("buffer_bytes", buffer_bytes),
+    ):
+        name = f"{field}_{suffix}"
+        setattr(stats, name, getattr(stats, name) + value)
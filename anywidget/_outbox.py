@@ -0,0 +1,256 @@
+"""Sends from background threads, marshalled onto the kernel's event loop.
+
+Widgets are often updated from other threads (data acquisition, file watchers,
+`@command(executor="thread")`). Sending on a comm from those threads races with
+the kernel's own sends, so each widget has an `Outbox`: calls from other threads
+queue their message and return at once, and the queue is sent, in order, from
+the kernel's event loop. Queued state updates in a row are merged (by key), and
+their values are read when the update is sent, so the latest value wins.
+
+The loop is looked up when sending (so it doesn't matter which thread a widget
+was created on): that of the running IPython kernel, or outside of one, the loop
+the widget was created on (or first sent from). Without a running event loop (e.g.,
+in a script) there is nothing to marshal onto, and messages are sent on the
+calling thread, as they always were. Once a thread is found to be the loop's, its
+sends skip the lookup and go straight out while nothing is queued.
+
+With flow control on (see `flow_control`), state updates are numbered, and the
+front end acknowledges each one once it has applied it (and the browser has had a
+chance to paint). At most `max_in_flight` updates are left unacknowledged: later
+ones wait in the queue, merged like those from other threads, so a widget that
+changes faster than the browser can keep up skips to the latest state rather
+than falling further and further behind.
+"""
+
+from __future__ import annotations
+
+import collections
+import logging
+import sys
+import threading
+import typing
+
+from ._commands import _running_loop
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    import asyncio
+    from collections.abc import Iterable
+
+    from typing_extensions import TypeGuard
+
+__all__ = ["flow_control"]
+
+_logger = logging.getLogger(__name__)
+
+ACK_KIND = "anywidget-ack"
+
+# the most unacknowledged state updates per widget, or `None` for no flow control
+MAX_IN_FLIGHT: int | None = None
+
+
+def flow_control(max_in_flight: int = 2, *, enabled: bool = True) -> None:
+    """Limit how far widgets' state can run ahead of the front end.
+
+    Applies to all widgets (`AnyWidget` and `MimeBundleDescriptor`). Each state
+    update is acknowledged by the front end once applied; while `max_in_flight`
+    are unacknowledged, further updates are held back and merged (by key, with the
+    latest values) until the front end catches up.
+
+    Parameters
+    ----------
+    max_in_flight : int, optional
+        The most unacknowledged state updates per widget (default: 2).
+    enabled : bool, optional
+        Pass `False` to turn flow control off again.
+    """
+    global MAX_IN_FLIGHT  # noqa: PLW0603
+    if max_in_flight < 1:
+        msg = f"max_in_flight must be at least 1, not {max_in_flight}"
+        raise ValueError(msg)
+    MAX_IN_FLIGHT = max_in_flight if enabled else None
+
+
+def is_ack(content: object) -> TypeGuard[dict]:
+    """Whether a custom message is the front end acknowledging a state update."""
+    return isinstance(content, dict) and content.get("kind") == ACK_KIND
+
+
+def _kernel_loop() -> asyncio.AbstractEventLoop | None:
+    """The event loop of the running IPython kernel, if any."""
+    # (looked up by module, so ipykernel isn't imported outside of a kernel)
+    kernelbase = sys.modules.get("ipykernel.kernelbase")
+    if kernelbase is None or not kernelbase.Kernel.initialized():
+        return None
+    io_loop = getattr(kernelbase.Kernel.instance(), "io_loop", None)
+    return getattr(io_loop, "asyncio_loop", None)
+
+
+class _StateUpdate:
+    """A queued state update, of some keys (or the whole state, if `None`)."""
+
+    __slots__ = ("keys",)
+
+    def __init__(self, keys: set[str] | None) -> None:
+        self.keys = keys
+
+    def merge(self, keys: set[str] | None) -> None:
+        if self.keys is None or keys is None:
+            self.keys = None
+        else:
+            self.keys |= keys
+
+
+class Outbox:
+    """The messages of a widget, sent (in order) from its event loop.
+
+    Parameters
+    ----------
+    send_state : Callable[[list[str] | None], object]
+        Sends a state update of the given keys (or of the whole state).
+    send : Callable[[object, list | None], object]
+        Sends a custom message, with buffers.
+    """
+
+    def __init__(
+        self,
+        send_state: typing.Callable[[list[str] | None], object],
+        send: typing.Callable[[typing.Any, typing.Any], object],
+    ) -> None:
+        self._send_state = send_state
+        self._send = send
+        # outside of a kernel, the loop the widget was created (or first sent) on
+        self._loop = _running_loop()
+        # the loop queued messages are sent from
+        self._target: asyncio.AbstractEventLoop | None = None
+        # the thread last found to be the loop's (or, without a loop, sending), so
+        # its sends skip looking up the loop while nothing is queued
+        self._loop_thread: int | None = None
+        self._lock = threading.Lock()
+        self._queue: collections.deque[_StateUpdate | tuple[object, list | None]] = (
+            collections.deque()
+        )
+        self._scheduled = False
+        self._flushing = False
+        # the sequence numbers of the last state update sent, and acknowledged
+        self._sent = 0
+        self._acked = 0
+
+    def put_state(self, key: str | Iterable[str] | None) -> bool:
+        """Queue a state update, if it can't be sent right away.
+
+        That is, if called from another thread than the loop's, or if too many
+        state updates are unacknowledged.
+
+        Returns
+        -------
+        bool
+            Whether it was queued. If not, the caller should send it right away.
+        """
+        if (
+            threading.get_ident() == self._loop_thread
+            and not self._queue
+            and not self._blocked()
+        ):
+            return False
+        on_loop = self._on_loop()
+        keys = None if key is None else {key} if isinstance(key, str) else set(key)
+        with self._lock:
+            if on_loop and (self._flushing or not (self._queue or self._blocked())):
+                return False
+            tail = self._queue[-1] if self._queue else None
+            if isinstance(tail, _StateUpdate):
+                tail.merge(keys)
+            else:
+                self._queue.append(_StateUpdate(keys))
+            if not on_loop:
+                self._schedule()
+        return True
+
+    def put(self, content: object, buffers: list | None) -> bool:
+        """Queue a custom message, if it can't be sent right away.
+
+        That is, if called from another thread than the loop's, or if it would
+        overtake queued state updates.
+
+        Returns
+        -------
+        bool
+            Whether it was queued. If not, the caller should send it right away.
+        """
+        if threading.get_ident() == self._loop_thread and not self._queue:
+            return False
+        on_loop = self._on_loop()
+        with self._lock:
+            if on_loop and (self._flushing or not self._queue):
+                return False
+            self._queue.append((content, buffers))
+            if not on_loop:
+                self._schedule()
+        return True
+
+    def sent(self) -> int:
+        """Count a state update as sent, returning its sequence number."""
+        self._sent += 1
+        return self._sent
+
+    def ack(self, seq: int) -> None:
+        """The front end has applied the state updates up to `seq`."""
+        self._acked = max(self._acked, min(seq, self._sent))
+        self.flush()
+
+    def reset(self) -> None:
+        """Forget unacknowledged updates (e.g., the front end was reloaded)."""
+        self._acked = self._sent
+
+    def _blocked(self) -> bool:
+        return MAX_IN_FLIGHT is not None and self._sent - self._acked >= MAX_IN_FLIGHT
+
+    def _on_loop(self) -> bool:
+        """Whether called on the loop's thread (after sending what it can first)."""
+        running = _running_loop()
+        loop = _kernel_loop()
+        if loop is None:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = running
+                self._loop_thread = None
+            loop = self._loop
+        if loop is not None and loop.is_running() and loop is not running:
+            self._target = loop
+            return False
+        self._loop_thread = threading.get_ident()
+        if not self._flushing:
+            self.flush()
+        return True
+
+    def _schedule(self) -> None:
+        # (called with the lock held)
+        if not self._scheduled:
+            self._scheduled = True
+            typing.cast("typing.Any", self._target).call_soon_threadsafe(self.flush)
+
+    def flush(self) -> None:
+        """Send the queued messages, in order (from the loop's thread).
+
+        Stops at a state update while too many are unacknowledged.
+        """
+        self._flushing = True
+        try:
+            while True:
+                with self._lock:
+                    entry = self._queue[0] if self._queue else None
+                    if entry is None or (
+                        isinstance(entry, _StateUpdate) and self._blocked()
+                    ):
+                        self._scheduled = False
+                        return
+                    self._queue.popleft()
+                try:
+                    if isinstance(entry, _StateUpdate):
+                        keys = entry.keys
+                        self._send_state(None if keys is None else sorted(keys))
+                    else:
+                        self._send(*entry)
+                except Exception:
+                    _logger.exception("anywidget: failed to send a queued message")
+        finally:
+            self._flushing = False
@@ -0,0 +1,329 @@
+"""Packing of numeric lists (and lossy quantization of numeric traits) into buffers.
+
+With packing enabled (`anywidget.experimental.pack_numeric_lists()`), every list
+(or tuple) of at least `min_length` ints or floats in a widget's state is replaced
+before sending by a small marker holding the values as a typed binary buffer:
+
+    {"__anywidget_packed__": "float64", "typed_array": false, "buffer": <buffer>}
+
+which `remove_buffers` then moves out of the JSON, like any other buffer. The
+front end's `AnyModel` rehydrates the marker into a plain `Array` (or, with
+`typed_array`, a `Float64Array`/`Int32Array`) before the state reaches the
+widget's code.
+
+Fields with a `Quantize` policy (trait metadata on `AnyWidget`s, dataclass field
+metadata, or `MimeBundleDescriptor(quantize=...)`) are packed the same way, at a
+lower precision (`float32`, `float16`, or `int16` fixed point with a scale and
+offset), whatever their length, and dequantized by the front end.
+"""
+
+from __future__ import annotations
+
+import array
+import dataclasses
+import math
+import struct
+import sys
+import typing
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Mapping
+
+__all__ = ["Quantize", "pack_numeric_lists"]
+
+PACKED_KEY = "__anywidget_packed__"
+
+# integers outside this range are packed as float64 (exact up to 2**53)
+_INT32_MIN, _INT32_MAX = -(2**31), 2**31 - 1
+_FLOAT64_EXACT = 2**53
+_INT16_MIN, _INT16_MAX = -(2**15), 2**15 - 1
+
+# buffer formats (see `struct`) that hold numbers
+_NUMERIC_FORMATS = frozenset("bBhHiIlLqQefd")
+# struct formats (little-endian) for each quantized dtype
+_QUANTIZED_FORMATS = {"float32": "f", "float16": "e", "int16": "h"}
+# the largest finite values of the quantized float dtypes
+_FLOAT_LIMITS = {"float32": 3.4028234663852886e38, "float16": 65504.0}
+_NOT_FINITE = "Can't quantize NaN or infinite values to int16."
+
+
+class _Packing(typing.NamedTuple):
+    min_length: int
+    typed_arrays: bool
+
+
+# the active configuration, checked at each send site
+CONFIG: _Packing | None = None
+
+
+def pack_numeric_lists(
+    min_length: int = 1024,
+    *,
+    typed_arrays: bool = False,
+    enabled: bool = True,
+) -> None:
+    """Send long lists of numbers as binary buffers rather than JSON.
+
+    Applies to the state of all widgets (`AnyWidget` and `MimeBundleDescriptor`)
+    sent after this is called. No changes are needed to widget code.
+
+    Parameters
+    ----------
+    min_length : int, optional
+        Pack lists (and tuples) of ints or floats with at least this many items.
+        Defaults to 1024.
+    typed_arrays : bool, optional
+        If `True`, the front end receives packed lists as `Float64Array` or
+        `Int32Array`, instead of plain `Array`s (the default). Typed arrays avoid a
+        copy, but they are sent back to the kernel as bytes if the front end sets
+        them, so are best suited to read-only data.
+    enabled : bool, optional
+        Pass `False` to turn packing off again.
+    """
+    global CONFIG  # noqa: PLW0603
+    CONFIG = _Packing(min_length, typed_arrays) if enabled else None
+
+
+def pack(state: dict) -> dict:
+    """Replace long numeric lists in `state` with packed buffers.
+
+    Containers are only copied along the paths to packed lists; everything else
+    in `state` is returned as-is.
+    """
+    config = CONFIG
+    if config is None:
+        return state
+    return typing.cast("dict", _pack(state, config))
+
+
+def _pack(value: object, config: _Packing) -> object:
+    if isinstance(value, dict):
+        packed = {key: _pack(child, config) for key, child in value.items()}
+        changed = any(packed[key] is not child for key, child in value.items())
+        return packed if changed else value
+    if isinstance(value, (list, tuple)):
+        if len(value) >= config.min_length:
+            marker = _pack_numbers(value, config)
+            if marker is not None:
+                return marker
+        if not any(isinstance(child, (dict, list, tuple)) for child in value):
+            return value
+        items = [_pack(child, config) for child in value]
+        if all(item is child for item, child in zip(items, value)):
+            return value
+        return items if isinstance(value, list) else tuple(items)
+    return value
+
+
+def _pack_numbers(values: list | tuple, config: _Packing) -> dict | None:
+    """Pack a list of ints or floats, or return `None` if it isn't one."""
+    types = set(map(type, values))
+    if types == {int}:
+        if min(values) >= _INT32_MIN and max(values) <= _INT32_MAX:
+            return _marker(array.array("i", values), "int32", config)
+        if min(values) < -_FLOAT64_EXACT or max(values) > _FLOAT64_EXACT:
+            return None  # can't be represented exactly in JavaScript
+    elif not types or not types <= {int, float}:
+        return None
+    return _marker(array.array("d", values), "float64", config)
+
+
+def _marker(packed: array.array, dtype: str, config: _Packing) -> dict:
+    if sys.byteorder == "big":
+        # browsers are (all but universally) little-endian
+        packed.byteswap()
+    return {
+        PACKED_KEY: dtype,
+        "typed_array": config.typed_arrays,
+        "buffer": memoryview(packed),
+    }
+
+
+@dataclasses.dataclass(frozen=True)
+class Quantize:
+    """A lossy encoding for a numeric field, to make its updates smaller.
+
+    Applies to lists (and tuples) of numbers, and to numeric buffers (e.g.,
+    `array.array("d", ...)` or a NumPy array), which the front end receives as
+    plain `Array`s of the dequantized values (or typed arrays, with
+    `typed_array=True`). Other values are sent as-is.
+
+    Parameters
+    ----------
+    dtype : {"float32", "float16", "int16"}, optional
+        The encoding. `"float32"` (default) and `"float16"` halve and quarter the
+        size of float64 data. `"int16"` is fixed point: values are sent as
+        `round((value - offset) / scale)`, clipped to the int16 range, and decoded
+        as `q * scale + offset`.
+    scale : float | None, optional
+        The step between representable values. Required for `"int16"`.
+    offset : float, optional
+        The value represented by zero (`"int16"` only). Defaults to 0.
+    typed_array : bool, optional
+        Whether the front end receives a typed array (`Float32Array`, or
+        `Float64Array` for `"int16"`) instead of a plain `Array`. Defaults to
+        `False`.
+
+    Examples
+    --------
+    >>> class Plot(anywidget.AnyWidget):
+    ...     x = traitlets.List().tag(sync=True, quantize=Quantize("float32"))
+    ...     y = traitlets.List().tag(
+    ...         sync=True, quantize=Quantize("int16", scale=0.01, offset=-100)
+    ...     )
+    """
+
+    dtype: typing.Literal["float32", "float16", "int16"] = "float32"
+    scale: float | None = None
+    offset: float = 0.0
+    typed_array: bool = False
+
+    def __post_init__(self) -> None:
+        if self.dtype not in _QUANTIZED_FORMATS:
+            msg = f"Unsupported quantization dtype: {self.dtype!r}"
+            raise ValueError(msg)
+        if self.dtype == "int16" and not self.scale:
+            msg = "int16 quantization requires a non-zero `scale`."
+            raise ValueError(msg)
+
+    def encode(self, value: object) -> object:
+        """Quantize `value` into a packed marker, or return it unchanged."""
+        values = _numbers(value)
+        if values is None:
+            return value
+        # (checked by name, like `_mapped.is_mapped`, so NumPy needn't be imported)
+        numpy = sys.modules.get("numpy")
+        if numpy is not None:
+            data = self._encode_numpy(numpy, values)
+        else:
+            data = self._encode_array(values)
+        marker: dict[str, object] = {
+            PACKED_KEY: self.dtype,
+            "typed_array": self.typed_array,
+            "buffer": data,
+        }
+        if self.dtype == "int16":
+            marker["scale"] = self.scale
+            marker["offset"] = self.offset
+        return marker
+
+    def _encode_numpy(self, numpy: typing.Any, values: typing.Sequence) -> memoryview:  # noqa: ANN401
+        """Quantize with NumPy's vectorized conversions."""
+        data = numpy.asarray(values)
+        if data.dtype.kind not in "iuf":
+            data = data.astype("float64")
+        if self.dtype == "int16":
+            if data.dtype.kind == "f" and not numpy.isfinite(data).all():
+                raise ValueError(_NOT_FINITE)
+            scale = typing.cast("float", self.scale)
+            data = numpy.rint((data - self.offset) / scale)
+            quantized = numpy.clip(data, _INT16_MIN, _INT16_MAX).astype("<i2")
+        else:
+            # out of range: clipped to the largest finite value (NaN is kept)
+            limit = _FLOAT_LIMITS[self.dtype]
+            quantized = numpy.clip(data, -limit, limit).astype(
+                "<f4" if self.dtype == "float32" else "<f2"
+            )
+        return memoryview(quantized).cast("B")
+
+    def _encode_array(self, values: typing.Sequence) -> memoryview:
+        """Quantize with the `array` module (or `struct`, for float16)."""
+        data: array.array | bytes
+        if self.dtype == "int16":
+            scale, offset = typing.cast("float", self.scale), self.offset
+            try:
+                data = array.array(
+                    "h",
+                    (
+                        min(max(round((v - offset) / scale), _INT16_MIN), _INT16_MAX)
+                        for v in values
+                    ),
+                )
+            except (ValueError, OverflowError):
+                raise ValueError(_NOT_FINITE) from None
+        elif self.dtype == "float32":
+            data = array.array("f", values)
+            if math.inf in data or -math.inf in data:
+                data = array.array("f", _clipped(values, _FLOAT_LIMITS["float32"]))
+        else:
+            try:
+                data = struct.pack(f"<{len(values)}e", *values)
+            except OverflowError:
+                clipped = _clipped(values, _FLOAT_LIMITS["float16"])
+                data = struct.pack(f"<{len(values)}e", *clipped)
+        if isinstance(data, array.array) and sys.byteorder == "big":
+            # browsers are (all but universally) little-endian
+            data.byteswap()
+        return memoryview(data).cast("B")
+
+
+def _clipped(values: typing.Iterable[float], limit: float) -> list[float]:
+    """`values`, clipped to +/-`limit` (keeping NaN)."""
+    return [v if math.isnan(v) else min(max(v, -limit), limit) for v in values]
+
+
+def _numbers(value: object) -> typing.Sequence | None:
+    """The numbers in a numeric list or buffer, or `None` if `value` isn't one.
+
+    Buffers are returned as (flat) memoryviews, without copying them.
+    """
+    if isinstance(value, (list, tuple)):
+        # (comparing exact types excludes bools)
+        return value if all(type(v) in {int, float} for v in value) else None
+    if isinstance(value, (str, bytes, bytearray)):
+        return None  # bytes have no dtype to quantize from
+    try:
+        view = memoryview(value)  # type: ignore[arg-type]
+    except TypeError:
+        return None
+    fmt = view.format.lstrip("@")
+    if fmt not in _NUMERIC_FORMATS:
+        return None  # not numeric, or not in native byte order
+    if view.ndim != 1:
+        if not view.c_contiguous:
+            return None
+        view = view.cast("B").cast(typing.cast("typing.Any", fmt))
+    return view
+
+
+def quantize(state: dict, policies: Mapping[str, Quantize]) -> dict:
+    """Apply the quantization `policies` to the top-level fields of `state`."""
+    if not policies or policies.keys().isdisjoint(state):
+        return state
+    return {
+        key: policies[key].encode(value) if key in policies else value
+        for key, value in state.items()
+    }
+
+
+# the instance attribute caching an object's trait policies, with its class
+_TRAIT_POLICIES = "_anywidget_quantize"
+
+
+def trait_policies(obj: typing.Any) -> dict[str, Quantize]:  # noqa: ANN401
+    """The quantization policies tagged on the synced traits of a `HasTraits`.
+
+    Cached on the object (rather than per class, as `add_traits` gives each
+    instance its own class), until its traits change.
+    """
+    cls = type(obj)
+    cached = obj.__dict__.get(_TRAIT_POLICIES)
+    if cached is None or cached[0] is not cls:
+        policies = {
+            name: trait.metadata["quantize"]
+            for name, trait in obj.traits(sync=True).items()
+            if isinstance(trait.metadata.get("quantize"), Quantize)
+        }
+        cached = obj.__dict__[_TRAIT_POLICIES] = (cls, policies)
+    return typing.cast("dict[str, Quantize]", cached[1])
+
+
+def field_policies(obj: object) -> dict[str, Quantize]:
+    """The quantization policies in the field metadata of a dataclass instance."""
+    if not dataclasses.is_dataclass(obj):
+        return {}
+    return {
+        field.name: field.metadata["quantize"]
+        for field in dataclasses.fields(obj)
+        if isinstance(field.metadata.get("quantize"), Quantize)
+    }
@@ -0,0 +1,568 @@
+"""Paged access to large arrays and tables, fetched by the front end on demand.
+
+A `PagedData` in a widget's state (a `Paged` trait on an `AnyWidget`, or a field
+of a `MimeBundleDescriptor`-based object) is sent as a small description, rather
+than its data:
+
+    {"__anywidget_paged__": 1000, "length": 1000000, "pages": 1000,
+     "columns": ["a", "b"], "shape": null}
+
+The front end then fetches only the pages it needs (e.g., those in view) with the
+built-in `_anywidget_page` command, through the usual command channel:
+
+    {"key": "table", "page": 12, "prefetch": [13]}
+
+Pages are cached on the kernel in an `LRU`. Pages named in `prefetch` are loaded
+into the cache in the background (on a thread, after the response is sent), so
+scrolling to them is quick.
+
+A `PyramidData` (a `Pyramid` trait) is sent as a description holding its coarsest
+level of detail (sampled, rather than averaged), so the front end can show
+something at once. Finer levels are downsampled lazily, a region at a time (and
+cached), and streamed coarse to fine by the built-in `_anywidget_levels` command,
+for the whole array or just a region of it:
+
+    {"key": "image", "level": 0, "region": [[0, 512], [256, 768]]}
+"""
+
+from __future__ import annotations
+
+import array
+import logging
+import math
+import sys
+import typing
+
+import traitlets.traitlets as t
+
+from ._commands import (
+    _ANYWIDGET_COMMANDS,
+    _CACHE_OWNERS,
+    LRU,
+    _Command,
+    _CommandOptions,
+    _get_executor,
+    _running_loop,
+)
+from ._streams import _TYPECODE_DTYPES
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    import asyncio
+    from collections.abc import Iterable
+
+    from ._commands import _CommandResult
+
+__all__ = ["Paged", "PagedData", "Pyramid", "PyramidData"]
+
+_logger = logging.getLogger(__name__)
+
+T = typing.TypeVar("T")
+
+PAGED_KEY = "__anywidget_paged__"
+PAGE_COMMAND = "_anywidget_page"
+PYRAMID_KEY = "__anywidget_pyramid__"
+LEVELS_COMMAND = "_anywidget_levels"
+
+# NumPy dtype strings of the numbers sent as buffers (little-endian only)
+_BUFFER_DTYPES = {
+    "|i1": "int8",
+    "|u1": "uint8",
+    "<i2": "int16",
+    "<u2": "uint16",
+    "<i4": "int32",
+    "<u4": "uint32",
+    "<f4": "float32",
+    "<f8": "float64",
+}
+
+
+class PagedData:
+    """Rows of a large array or table, sent to the front end a page at a time.
+
+    Parameters
+    ----------
+    data : object
+        The rows: a sequence (e.g., a `list` or `array.array`), an array sliced
+        along its first axis (e.g., a NumPy array or `np.memmap`), or a table with
+        `.iloc` and `.columns` (e.g., a pandas DataFrame). Numeric arrays and
+        columns are sent as binary buffers, and everything else as JSON.
+    page_size : int, optional
+        The number of rows per page (default: 1000).
+    cache : LRU, optional
+        The cache of recently served pages (default: a new `LRU(maxsize=32)`).
+        May be shared between several sources.
+
+    Examples
+    --------
+    >>> class Table(anywidget.AnyWidget):
+    ...     rows = Paged().tag(sync=True)
+    >>> table = Table(rows=PagedData(np.load("big.npy", mmap_mode="r")))
+    """
+
+    def __init__(
+        self,
+        data: object,
+        page_size: int = 1000,
+        cache: LRU | None = None,
+    ) -> None:
+        if page_size < 1:
+            msg = f"page_size must be positive, not {page_size}"
+            raise ValueError(msg)
+        self.data = data
+        self.page_size = page_size
+        self.cache = LRU(maxsize=32) if cache is None else cache
+        self._owner = next(_CACHE_OWNERS)
+
+    def __len__(self) -> int:
+        return len(self.data)  # type: ignore[arg-type]
+
+    @property
+    def pages(self) -> int:
+        """The number of pages."""
+        return math.ceil(len(self) / self.page_size)
+
+    def describe(self) -> dict:
+        """The description of the data sent as the widget's state."""
+        shape = getattr(self.data, "shape", None)
+        columns = getattr(self.data, "columns", None) if _is_table(self.data) else None
+        return {
+            PAGED_KEY: self.page_size,
+            "length": len(self),
+            "pages": self.pages,
+            "columns": None if columns is None else [str(c) for c in columns],
+            "shape": None if shape is None else list(shape),
+        }
+
+    def page(self, index: int) -> _CommandResult:
+        """Get a page (from the cache if possible) as a command response."""
+        if not 0 <= index < self.pages:
+            msg = f"Page {index} out of range for {self.pages} pages."
+            raise IndexError(msg)
+        key = (index,)
+        cached = self.cache.get(self._owner, key)
+        if cached is None:
+            cached = self._load(index)
+            self.cache.put(self._owner, key, cached)
+        return cached
+
+    def prefetch(self, indices: Iterable[int]) -> None:
+        """Load pages into the cache, ignoring those out of range."""
+        for index in indices:
+            if 0 <= index < self.pages:
+                self.page(index)
+
+    def invalidate(self) -> None:
+        """Drop the cached pages (e.g., after changing `data` in place)."""
+        self.cache.invalidate(self._owner)
+
+    def __deepcopy__(self, memo: dict) -> PagedData:
+        # state getters like `dataclasses.asdict` deep-copy field values
+        return self
+
+    def __repr__(self) -> str:
+        return f"PagedData(<{type(self.data).__name__}>, page_size={self.page_size})"
+
+    def _load(self, index: int) -> _CommandResult:
+        start = index * self.page_size
+        stop = min(start + self.page_size, len(self))
+        buffers: list[bytes] = []
+        response: dict[str, object] = {"page": index, "start": start, "stop": stop}
+        if _is_table(self.data):
+            rows = self.data.iloc[start:stop]  # type: ignore[attr-defined]
+            response["columns"] = {
+                str(name): _encode(rows[name].to_numpy(), buffers)
+                for name in rows.columns
+            }
+        else:
+            response["data"] = _encode(self.data[start:stop], buffers)  # type: ignore[index]
+        return response, buffers
+
+
+def _is_table(data: object) -> bool:
+    return hasattr(data, "iloc") and hasattr(data, "columns")
+
+
+def _encode(values: typing.Any, buffers: list[bytes]) -> object:  # noqa: ANN401
+    """Encode a block of values, as a reference to a buffer if numeric."""
+    if isinstance(values, array.array):
+        dtype = _TYPECODE_DTYPES.get(values.typecode)
+        shape: list[int] = [len(values)]
+        if sys.byteorder == "big":
+            # browsers are (all but universally) little-endian
+            values = array.array(values.typecode, values)
+            values.byteswap()
+    else:
+        dtype_str = getattr(getattr(values, "dtype", None), "str", None)
+        dtype = _BUFFER_DTYPES.get(typing.cast("str", dtype_str))
+        shape = list(getattr(values, "shape", ()))
+    if dtype is None:
+        # e.g., a list, or an array of strings or objects
+        return values.tolist() if hasattr(values, "tolist") else list(values)
+    buffers.append(values.tobytes())
+    return {"dtype": dtype, "shape": shape, "buffer": len(buffers) - 1}
+
+
+class PyramidData:
+    """A numeric array sent coarsest level of detail first, then finer levels.
+
+    Level 0 is the array itself. Each level above it averages `factor` values
+    (or `factor` x `factor` pixels, for 2-D and higher arrays, e.g., images of
+    shape `(height, width)` or `(height, width, channels)`) of the level below,
+    keeping the array's dtype. Levels are computed a region (tile) at a time, from
+    the same region of the level below, when first requested, and cached until
+    `clear()`.
+
+    The coarsest level, sent with the widget's state, instead samples every
+    `factor**n`-th value, so that first paint doesn't read the whole array.
+
+    Parameters
+    ----------
+    data : object
+        The array: a sequence of numbers (e.g., an `array.array`), or a NumPy
+        array (including an `np.memmap`), downsampled along its first (or first
+        two) axes.
+    factor : int, optional
+        The downsampling factor between levels (default: 2).
+    max_size : int, optional
+        The coarsest level is the first with at most this many values (or pixels)
+        (default: 4096). It's sent with the widget's state.
+    cache : LRU, optional
+        The cache of computed tiles (default: a new `LRU(maxsize=64)`). May be
+        shared between several sources.
+
+    Examples
+    --------
+    >>> class Viewer(anywidget.AnyWidget):
+    ...     image = Pyramid().tag(sync=True)
+    >>> viewer = Viewer(image=np.load("scan.npy", mmap_mode="r"))
+    """
+
+    def __init__(
+        self,
+        data: object,
+        factor: int = 2,
+        max_size: int = 4096,
+        cache: LRU | None = None,
+    ) -> None:
+        if factor < 2:  # noqa: PLR2004
+            msg = f"factor must be at least 2, not {factor}"
+            raise ValueError(msg)
+        self.data = data
+        self.factor = factor
+        self.max_size = max_size
+        self.cache = LRU(maxsize=64) if cache is None else cache
+        self._owner = next(_CACHE_OWNERS)
+        # bumped by `clear`, so the front end can drop stale levels
+        self.version = 0
+
+    @property
+    def shapes(self) -> list[tuple[int, ...]]:
+        """The shape of each level, finest (level 0) first."""
+        shape = tuple(getattr(self.data, "shape", (len(self.data),)))  # type: ignore[arg-type]
+        spatial = min(len(shape), 2)
+        shapes = [shape]
+        while math.prod(shape[:spatial]) > self.max_size and all(
+            size >= self.factor for size in shape[:spatial]
+        ):
+            shape = (
+                *(size // self.factor for size in shape[:spatial]),
+                *shape[spatial:],
+            )
+            shapes.append(shape)
+        return shapes
+
+    def level(self, index: int) -> object:
+        """The (whole) array at a level of detail."""
+        shapes = self.shapes
+        if not 0 <= index < len(shapes):
+            msg = f"Level {index} out of range for {len(shapes)} levels."
+            raise IndexError(msg)
+        shape = shapes[index]
+        return self._tile(index, tuple((0, size) for size in shape[: _spatial(shape)]))
+
+    def region(
+        self, index: int, region: list[list[int]] | None = None
+    ) -> _CommandResult:
+        """A region (in level 0 coordinates) of a level, as a command response."""
+        shapes = self.shapes
+        if not 0 <= index < len(shapes):
+            msg = f"Level {index} out of range for {len(shapes)} levels."
+            raise IndexError(msg)
+        shape = shapes[index]
+        scale = self.factor**index
+        # in the level's coordinates (rounded outwards, and clipped to the level)
+        bounds = [
+            [min(start // scale, size), min(-(-stop // scale), size)]
+            for (start, stop), size in zip(region or [], shape)
+        ]
+        full = tuple((0, size) for size in shape[: _spatial(shape)])
+        tile = tuple((start, stop) for start, stop in bounds) + full[len(bounds) :]
+        buffers: list[bytes] = []
+        response = {
+            "level": index,
+            "version": self.version,
+            "region": bounds or None,
+            "data": _encode(self._tile(index, tile), buffers),
+        }
+        return response, buffers
+
+    def clear(self) -> None:
+        """Drop the computed levels (e.g., after changing `data` in place)."""
+        self.cache.invalidate(self._owner)
+        self.version += 1
+
+    def describe(self) -> dict:
+        """The description (with the coarsest level) sent as the widget's state."""
+        shapes = self.shapes
+        buffers: list[bytes] = []
+        coarsest = _encode(
+            _sample(self.data, self.factor ** (len(shapes) - 1), shapes[-1]), buffers
+        )
+        if buffers:
+            typing.cast("dict", coarsest)["buffer"] = memoryview(buffers[0])
+        return {
+            PYRAMID_KEY: self.factor,
+            "version": self.version,
+            "shapes": [list(shape) for shape in shapes],
+            "coarsest": coarsest,
+        }
+
+    def __deepcopy__(self, memo: dict) -> PyramidData:
+        # see `PagedData.__deepcopy__`
+        return self
+
+    def __repr__(self) -> str:
+        return f"PyramidData(<{type(self.data).__name__}>, factor={self.factor})"
+
+    def _tile(self, index: int, bounds: tuple[tuple[int, int], ...]) -> object:
+        """A region of a level, downsampled from the same region of the level below."""
+        slices = tuple(slice(start, stop) for start, stop in bounds)
+        if index == 0:
+            return self.data[slices if len(slices) > 1 else slices[0]]  # type: ignore[index]
+        key = (index, bounds)
+        cached = self.cache.get(self._owner, key)
+        if cached is None:
+            below = tuple(
+                (start * self.factor, stop * self.factor) for start, stop in bounds
+            )
+            values = _downsample(self._tile(index - 1, below), self.factor)
+            # (an `LRU` holds anything, not just command responses)
+            cached = typing.cast("_CommandResult", values)
+            self.cache.put(self._owner, key, cached)
+        return cached
+
+
+def _spatial(shape: tuple[int, ...]) -> int:
+    """The number of axes downsampled: the first (or first two)."""
+    return min(len(shape), 2)
+
+
+def _sample(values: typing.Any, step: int, shape: tuple[int, ...]) -> object:  # noqa: ANN401
+    """Every `step`-th value (or pixel), giving an array of `shape`."""
+    slices = tuple(slice(0, size * step, step) for size in shape[: _spatial(shape)])
+    return values[slices if len(slices) > 1 else slices[0]]
+
+
+def _downsample(values: typing.Any, factor: int) -> object:  # noqa: ANN401
+    """Average blocks of `factor` values (or pixels), dropping any remainder.
+
+    The result has the dtype (or `array` typecode) of `values`, with integers
+    rounded.
+    """
+    if hasattr(values, "reshape"):
+        # a NumPy array (only its methods are used, so NumPy isn't imported)
+        shape = values.shape
+        spatial = _spatial(shape)
+        cropped = values[
+            tuple(slice(0, size - size % factor) for size in shape[:spatial])
+        ]
+        blocks = [dim for size in shape[:spatial] for dim in (size // factor, factor)]
+        axes = tuple(range(1, 2 * spatial, 2))
+        blocked = cropped.reshape(*blocks, *shape[spatial:])
+        if values.dtype.kind == "f":
+            # averaged in the array's own precision
+            return blocked.mean(axis=axes, dtype=values.dtype)
+        return blocked.mean(axis=axes).round().astype(values.dtype)
+    length = len(values) - len(values) % factor
+    means = (sum(values[i : i + factor]) / factor for i in range(0, length, factor))
+    typecode = getattr(values, "typecode", "d")
+    if typecode not in "fd":
+        return array.array(typecode, map(round, means))
+    return array.array(typecode, means)
+
+
+def _source(obj: object, key: str, kind: type[T]) -> T:
+    source = getattr(obj, key, None)
+    if not isinstance(source, kind):
+        msg = f"{key!r} is not a {kind.__name__}."
+        raise TypeError(msg)
+    return source
+
+
+def _page_command(obj: object, msg: dict, buffers: list[bytes]) -> _CommandResult:  # noqa: ARG001
+    """Serve a page of one of the `PagedData` in the state of `obj`."""
+    source = _source(obj, msg["key"], PagedData)
+    result = source.page(msg["page"])
+    prefetch = msg.get("prefetch") or []
+    loop = _running_loop()
+    if prefetch and loop is not None:
+        # off the loop, so loading pages doesn't hold up other messages
+        future = loop.run_in_executor(
+            _get_executor("thread"), source.prefetch, prefetch
+        )
+        future.add_done_callback(_log_prefetch_error)
+    return result
+
+
+def _log_prefetch_error(future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        _logger.error(
+            "anywidget: failed to prefetch pages", exc_info=future.exception()
+        )
+
+
+def _levels_command(
+    obj: object,
+    msg: dict,
+    buffers: list[bytes],  # noqa: ARG001
+) -> typing.Iterator[_CommandResult]:
+    """Stream the levels of a `PyramidData`, from coarse to fine, down to `level`."""
+    source = _source(obj, msg["key"], PyramidData)
+    # the coarsest level was sent with the state
+    for index in range(len(source.shapes) - 2, msg.get("level", 0) - 1, -1):
+        yield source.region(index, msg.get("region"))
+
+
+# the built-in commands serving lazily sent data
+COMMANDS = {
+    PAGE_COMMAND: _Command(_page_command, _CommandOptions()),
+    LEVELS_COMMAND: _Command(_levels_command, _CommandOptions()),
+}
+
+
+# the data sent as a description, and served by the commands
+_LAZY_TYPES = (PagedData, PyramidData)
+_LAZY_CLASSES = frozenset(_LAZY_TYPES)
+
+
+def is_lazy(value: object) -> bool:
+    """Whether `value` is exactly a `PagedData` or a `PyramidData`."""
+    return type(value) in _LAZY_CLASSES
+
+
+def describe(state: dict, keys: set[str]) -> dict:
+    """Replace the `PagedData` (and `PyramidData`) at `keys` with descriptions.
+
+    `keys` are those found to hold such data (see `is_lazy`), so the rest of the
+    state isn't looked at.
+    """
+    if not keys or keys.isdisjoint(state):
+        return state
+    return {
+        key: value.describe()
+        if key in keys and isinstance(value, _LAZY_TYPES)
+        else value
+        for key, value in state.items()
+    }
+
+
+class _LazyTrait(t.TraitType[T, typing.Any]):
+    """A trait whose value is described in the state, and served by commands."""
+
+    def __init__(self, **kwargs: typing.Any) -> None:  # noqa: ANN401
+        super().__init__(**kwargs)
+        # sent as a description, rather than the data
+        self.metadata.setdefault("to_json", lambda value, widget: value.describe())  # noqa: ARG005
+
+    def subclass_init(self, cls: type[t.HasTraits]) -> None:
+        super().subclass_init(cls)
+        # serve the data to the front end (`AnyWidget` collects commands before this)
+        commands = cls.__dict__.get(_ANYWIDGET_COMMANDS)
+        if commands is not None:
+            commands.update(COMMANDS)
+
+
+class Paged(_LazyTrait[PagedData]):
+    """A trait holding a `PagedData`, served to the front end a page at a time.
+
+    Sequences and arrays assigned to the trait are wrapped in a `PagedData`.
+
+    Parameters
+    ----------
+    page_size : int, optional
+        The page size of wrapped data (default: 1000).
+
+    Examples
+    --------
+    >>> class Table(anywidget.AnyWidget):
+    ...     rows = Paged(page_size=500).tag(sync=True)
+    """
+
+    info_text = "a PagedData (or data to page)"
+
+    def __init__(
+        self,
+        page_size: int = 1000,
+        **kwargs: typing.Any,  # noqa: ANN401
+    ) -> None:
+        super().__init__(**kwargs)
+        self.page_size = page_size
+
+    def make_dynamic_default(self) -> PagedData:
+        return PagedData([], self.page_size)
+
+    def validate(self, obj: t.HasTraits | None, value: object) -> PagedData:
+        if isinstance(value, PagedData):
+            return value
+        if hasattr(value, "__len__") and hasattr(value, "__getitem__"):
+            return PagedData(value, self.page_size)
+        return self.error(obj, value)
+
+
+class Pyramid(_LazyTrait[PyramidData]):
+    """A trait holding a `PyramidData`, sent coarsest level of detail first.
+
+    Arrays assigned to the trait are wrapped in a `PyramidData`. The levels of the
+    previous value are dropped when it's replaced.
+
+    Parameters
+    ----------
+    factor : int, optional
+        The downsampling factor of wrapped arrays (default: 2).
+    max_size : int, optional
+        The size of the coarsest level of wrapped arrays (default: 4096).
+
+    Examples
+    --------
+    >>> class Viewer(anywidget.AnyWidget):
+    ...     image = Pyramid(max_size=256 * 256).tag(sync=True)
+    """
+
+    info_text = "a PyramidData (or a numeric array)"
+
+    def __init__(
+        self,
+        factor: int = 2,
+        max_size: int = 4096,
+        **kwargs: typing.Any,  # noqa: ANN401
+    ) -> None:
+        super().__init__(**kwargs)
+        self.factor = factor
+        self.max_size = max_size
+
+    def make_dynamic_default(self) -> PyramidData:
+        return PyramidData(array.array("d"), self.factor, self.max_size)
+
+    def validate(self, obj: t.HasTraits | None, value: object) -> PyramidData:
+        if isinstance(value, PyramidData):
+            return value
+        if hasattr(value, "__len__") and hasattr(value, "__getitem__"):
+            return PyramidData(value, self.factor, self.max_size)
+        return self.error(obj, value)
+
+    def set(self, obj: t.HasTraits, value: object) -> None:
+        name = typing.cast("str", self.name)
+        old = obj._trait_values.get(name)  # noqa: SLF001
+        super().set(obj, value)
+        if isinstance(old, PyramidData) and old is not getattr(obj, name):
+            old.clear()
@@ -0,0 +1,257 @@
+"""Detection of oversized widget messages, with a breakdown of their payloads.
+
+With checks enabled (`anywidget.experimental.check_payloads()`), every message a
+widget sends is measured after its binary buffers have been separated out. A
+message above the configured limits is broken down by key path into JSON and
+buffer bytes, and paths holding long lists of numbers (e.g., a float array
+encoded as JSON) are flagged as better sent as binary buffers.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import numbers
+import typing
+import warnings
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Sequence
+
+__all__ = ["PathSize", "PayloadReport", "check_payloads"]
+
+# only paths making up at least this fraction of a message are reported
+_MIN_FRACTION = 0.01
+# lists of numbers at least this long are suggested as binary
+_MIN_NUMERIC_LENGTH = 64
+# at most this many paths are reported, largest first
+_MAX_PATHS = 10
+
+
+class _Limits(typing.NamedTuple):
+    json_bytes: int | None
+    buffer_bytes: int | None
+    callback: typing.Callable[[PayloadReport], None] | None
+    warn: bool
+
+
+# the active limits, checked at each send site
+LIMITS: _Limits | None = None
+
+
+@dataclasses.dataclass(frozen=True)
+class PathSize:
+    """The size of the value at a key path in a message.
+
+    Attributes
+    ----------
+    path : tuple[str | int, ...]
+        Keys (and list indices) from the top-level state to the value.
+    json_bytes : int
+        Size of the value's JSON encoding.
+    buffer_bytes : int
+        Size of the binary buffers under the path.
+    binary_candidate : bool
+        Whether the value is a long list of numbers, which would be much smaller
+        (and faster to encode) as a binary buffer (e.g., `array.tobytes()`).
+    """
+
+    path: tuple[str | int, ...]
+    json_bytes: int
+    buffer_bytes: int
+    binary_candidate: bool = False
+
+    @property
+    def name(self) -> str:
+        """The path as a dotted string."""
+        return ".".join(map(str, self.path))
+
+
+@dataclasses.dataclass(frozen=True)
+class PayloadReport:
+    """A breakdown of an oversized message.
+
+    Attributes
+    ----------
+    widget : str
+        The fully-qualified class name of the widget that sent the message.
+    json_bytes : int
+        Size of the message's JSON part.
+    buffer_bytes : int
+        Total size of the message's binary buffers.
+    paths : list[PathSize]
+        The largest key paths in the message, largest first.
+    """
+
+    widget: str
+    json_bytes: int
+    buffer_bytes: int
+    paths: list[PathSize]
+
+    @property
+    def binary_candidates(self) -> list[PathSize]:
+        """Paths that would be better sent as binary buffers."""
+        return [path for path in self.paths if path.binary_candidate]
+
+    def summary(self) -> str:
+        """Summarize the report in one line."""
+        total = self.json_bytes + self.buffer_bytes
+        line = (
+            f"anywidget: {self.widget} sent a {_format_bytes(total)} message "
+            f"({_format_bytes(self.json_bytes)} JSON, "
+            f"{_format_bytes(self.buffer_bytes)} buffers)"
+        )
+        if self.paths:
+            largest = self.paths[0]
+            line += (
+                f"; largest path: {largest.name} "
+                f"({_format_bytes(largest.json_bytes + largest.buffer_bytes)})"
+            )
+        if self.binary_candidates:
+            names = ", ".join(path.name for path in self.binary_candidates)
+            line += f". Consider sending {names} as binary buffers"
+        return line + "."
+
+
+def check_payloads(
+    *,
+    json_bytes: int | None = 1_000_000,
+    buffer_bytes: int | None = None,
+    callback: typing.Callable[[PayloadReport], None] | None = None,
+    warn: bool = True,
+    enabled: bool = True,
+) -> None:
+    """Flag messages sent by widgets that exceed size limits.
+
+    Parameters
+    ----------
+    json_bytes : int | None, optional
+        Flag messages whose JSON part exceeds this many bytes (default: 1 MB).
+        `None` for no limit.
+    buffer_bytes : int | None, optional
+        Flag messages whose binary buffers exceed this many bytes in total.
+        `None` (default) for no limit.
+    callback : Callable[[PayloadReport], None] | None, optional
+        Called with a report for each flagged message.
+    warn : bool, optional
+        Whether to emit a one-line `UserWarning` for each flagged message.
+        Defaults to `True`.
+    enabled : bool, optional
+        Pass `False` to turn checks off again.
+
+    Examples
+    --------
+    >>> reports = []
+    >>> check_payloads(json_bytes=100_000, callback=reports.append)
+    """
+    global LIMITS  # noqa: PLW0603
+    LIMITS = _Limits(json_bytes, buffer_bytes, callback, warn) if enabled else None
+
+
+def check(
+    widget: str,
+    data: dict,
+    buffers: Sequence[object] | None,
+    *,
+    stacklevel: int = 3,
+) -> PayloadReport | None:
+    """Check a message about to be sent against the active limits."""
+    limits = LIMITS
+    if limits is None:
+        return None
+
+    buffers = buffers or []
+    buffer_sizes = [memoryview(b).nbytes for b in buffers]  # type: ignore[arg-type]
+    json_size = _json_size(data)
+    if not (
+        (limits.json_bytes is not None and json_size > limits.json_bytes)
+        or (limits.buffer_bytes is not None and sum(buffer_sizes) > limits.buffer_bytes)
+    ):
+        return None
+
+    report = profile(widget, data, buffer_sizes)
+    if limits.warn:
+        warnings.warn(report.summary(), stacklevel=stacklevel)
+    if limits.callback is not None:
+        limits.callback(report)
+    return report
+
+
+def profile(widget: str, data: dict, buffer_sizes: Sequence[int]) -> PayloadReport:
+    """Break down a message (with buffers removed) by key path."""
+    # state updates are profiled by trait, custom messages by content
+    payload = data.get("state", data.get("content", data))
+    buffer_paths = [
+        tuple(path) for path in data.get("buffer_paths", []) if isinstance(path, list)
+    ]
+    json_size = _json_size(data)
+    total = json_size + sum(buffer_sizes)
+
+    paths: list[PathSize] = []
+    _walk(payload, (), total, paths)
+    # buffers that replaced a whole top-level value don't appear in the JSON
+    missing = {path[:1] for path in buffer_paths} - {p.path for p in paths}
+    paths.extend(PathSize(path, 0, 0) for path in missing)
+
+    sized = [
+        dataclasses.replace(
+            path,
+            buffer_bytes=sum(
+                size
+                for buffer_path, size in zip(buffer_paths, buffer_sizes)
+                if buffer_path[: len(path.path)] == path.path
+            ),
+        )
+        for path in paths
+    ]
+    sized = [p for p in sized if p.json_bytes + p.buffer_bytes >= total * _MIN_FRACTION]
+    sized.sort(key=lambda p: p.json_bytes + p.buffer_bytes, reverse=True)
+    return PayloadReport(widget, json_size, sum(buffer_sizes), sized[:_MAX_PATHS])
+
+
+def _walk(
+    value: object,
+    path: tuple[str | int, ...],
+    total: int,
+    out: list[PathSize],
+) -> None:
+    """Record the size of the (large enough) values under `path`, depth first."""
+    if isinstance(value, dict):
+        for key, child in value.items():
+            size = _json_size(child)
+            if size < total * _MIN_FRACTION:
+                continue
+            child_path = (*path, key)
+            out.append(PathSize(child_path, size, 0, _is_numeric_list(child)))
+            if not _is_numeric_list(child):
+                _walk(child, child_path, total, out)
+    elif isinstance(value, (list, tuple)) and path:
+        for index, child in enumerate(value):
+            if isinstance(child, (dict, list, tuple)):
+                _walk(child, (*path, index), total, out)
+
+
+def _is_numeric_list(value: object) -> bool:
+    """Whether `value` is a long (possibly nested) list of numbers."""
+    if not isinstance(value, (list, tuple)) or not value:
+        return False
+    if all(isinstance(item, (list, tuple)) for item in value):
+        count = sum(len(item) for item in value)
+        items = [x for item in value for x in item]
+    else:
+        count, items = len(value), list(value)
+    return count >= _MIN_NUMERIC_LENGTH and all(
+        isinstance(x, numbers.Real) and not isinstance(x, bool) for x in items
+    )
+
+
+def _json_size(value: object) -> int:
+    return len(json.dumps(value, separators=(",", ":"), default=str))
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "kB", "MB"):
+        if size < 1000:  # noqa: PLR2004
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1000
+    return f"{size:.1f} GB"
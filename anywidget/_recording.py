@@ -0,0 +1,321 @@
+"""Record widget comm traffic to disk, and replay it against fake comms.
+
+A recording is a gzipped JSON Lines file. The first line is a header, and each
+following line is one message:
+
+- `t`: seconds since recording started
+- `dir`: `"out"` (to the front end) or `"in"` (from the front end)
+- `type`: `"open"` (comm opened) or `"msg"`
+- `comm`: the comm id, and `widget`: the fully-qualified widget class name
+- `method`: the message method (`"update"`, `"custom"`, ...), if any
+- `json_bytes`, `buffer_paths` and `buffer_bytes` (the size of each buffer)
+- with `payloads=True`, also `data` (the JSON part of the message) and `buffers`
+  (base64-encoded)
+
+Replaying recreates each recorded widget with a factory for its class, and drives
+it with the recorded inbound messages (and, optionally, the recorded state changes
+made on the Python side) at the original or an accelerated pace.
+"""
+
+from __future__ import annotations
+
+import base64
+import contextlib
+import dataclasses
+import gzip
+import json
+import threading
+import time
+import typing
+
+from ._util import put_buffers
+from ._version import __version__
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    import pathlib
+    from collections.abc import Iterator, Mapping, Sequence
+
+    from ._fake_comm import FakeComm
+
+__all__ = ["Recorder", "ReplayReport", "record_traffic", "replay_traffic"]
+
+_FORMAT_VERSION = 1
+
+# the active recorder, checked at each instrumented call site
+RECORDER: Recorder | None = None
+
+
+def _nbytes(buffer: object) -> int:
+    return memoryview(buffer).nbytes  # type: ignore[arg-type]
+
+
+class Recorder:
+    """Writes widget messages to a gzipped JSON Lines file.
+
+    Parameters
+    ----------
+    path : str | pathlib.Path
+        The file to write.
+    payloads : bool, optional
+        Whether to include message contents and buffers (required for replay).
+        Defaults to `False`, which only records timing and sizes.
+    """
+
+    def __init__(self, path: str | pathlib.Path, *, payloads: bool = False) -> None:
+        self.payloads = payloads
+        self._file = gzip.open(path, "wt", encoding="utf-8")  # noqa: SIM115
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._write(
+            {
+                "version": _FORMAT_VERSION,
+                "anywidget": __version__,
+                "started": time.time(),
+                "payloads": payloads,
+            }
+        )
+
+    def record(  # noqa: PLR0913, PLR0917
+        self,
+        direction: typing.Literal["in", "out"],
+        msg_type: typing.Literal["open", "msg"],
+        comm_id: str,
+        widget: str,
+        data: dict,
+        buffers: Sequence[object] | None,
+    ) -> None:
+        """Record a message sent on (or received by) a widget's comm."""
+        buffers = buffers or []
+        entry: dict[str, object] = {
+            "t": round(time.monotonic() - self._start, 6),
+            "dir": direction,
+            "type": msg_type,
+            "comm": comm_id,
+            "widget": widget,
+            "method": data.get("method"),
+            "json_bytes": len(json.dumps(data, separators=(",", ":"), default=str)),
+            "buffer_paths": data.get("buffer_paths", []),
+            "buffer_bytes": [_nbytes(buffer) for buffer in buffers],
+        }
+        if self.payloads:
+            entry["data"] = data
+            entry["buffers"] = [
+                base64.b64encode(memoryview(buffer)).decode("ascii")  # type: ignore[arg-type]
+                for buffer in buffers
+            ]
+        self._write(entry)
+
+    def close(self) -> None:
+        """Flush and close the recording."""
+        with self._lock:
+            self._file.close()
+
+    def _write(self, entry: dict) -> None:
+        line = json.dumps(entry, separators=(",", ":"), default=str)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+
+
+@contextlib.contextmanager
+def record_traffic(
+    path: str | pathlib.Path,
+    *,
+    payloads: bool = False,
+) -> Iterator[Recorder]:
+    """Record the comm traffic of all widgets to `path` within the block.
+
+    Parameters
+    ----------
+    path : str | pathlib.Path
+        The file to write (gzipped JSON Lines).
+    payloads : bool, optional
+        Whether to include message contents and buffers, which are needed to
+        replay the recording. Defaults to `False`.
+
+    Yields
+    ------
+    Recorder
+        The active recorder.
+
+    Examples
+    --------
+    >>> with record_traffic("session.jsonl.gz", payloads=True):
+    ...     ...  # interact with widgets
+    """
+    global RECORDER  # noqa: PLW0603
+    if RECORDER is not None:
+        msg = "Already recording widget traffic."
+        raise RuntimeError(msg)
+    recorder = RECORDER = Recorder(path, payloads=payloads)
+    try:
+        yield recorder
+    finally:
+        RECORDER = None
+        recorder.close()
+
+
+def read_traffic(path: str | pathlib.Path) -> tuple[dict, list[dict]]:
+    """Read a recording, returning its header and messages."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(next(f))
+        if header.get("version") != _FORMAT_VERSION:
+            msg = f"Unsupported recording version: {header.get('version')}"
+            raise ValueError(msg)
+        return header, [json.loads(line) for line in f]
+
+
+@dataclasses.dataclass
+class ReplayReport:
+    """Summary of a replay.
+
+    Attributes
+    ----------
+    elapsed : float
+        Wall-clock seconds the replay took.
+    recorded_duration : float
+        Seconds between the first and last recorded message.
+    messages_in : int
+        Inbound messages delivered to the replayed widgets.
+    recorded_messages_out : int
+        Outbound messages in the recording, for widgets that were replayed.
+    messages_out : int
+        Outbound messages the replayed widgets sent.
+    skipped_widgets : set[str]
+        Recorded widget classes without a factory (whose messages were skipped).
+    """
+
+    elapsed: float = 0.0
+    recorded_duration: float = 0.0
+    messages_in: int = 0
+    recorded_messages_out: int = 0
+    messages_out: int = 0
+    skipped_widgets: set[str] = dataclasses.field(default_factory=set)
+
+
+class _Replayed(typing.NamedTuple):
+    obj: object
+    comm: FakeComm
+
+
+def replay_traffic(
+    path: str | pathlib.Path,
+    factories: Mapping[str, typing.Callable[[], object]],
+    *,
+    speed: float | None = 1.0,
+    python_changes: bool = True,
+) -> ReplayReport:
+    """Replay a recording against fake comms.
+
+    Parameters
+    ----------
+    path : str | pathlib.Path
+        A recording made by `record_traffic(..., payloads=True)`.
+    factories : Mapping[str, Callable[[], object]]
+        Callables that create a widget, keyed by the fully-qualified widget class
+        name (e.g., `"my_module.Counter"`). Called once per recorded comm.
+    speed : float | None, optional
+        How much faster than recorded to replay (e.g., `10` for 10x). `None` replays
+        as fast as possible. Defaults to `1.0` (the original pace).
+    python_changes : bool, optional
+        If `True` (default), also re-apply state changes that were made on the
+        Python side (recorded as outbound updates), so the replay reproduces the
+        kernel's outbound traffic as well as the front end's.
+
+    Returns
+    -------
+    ReplayReport
+        A summary of the replay.
+
+    Raises
+    ------
+    ValueError
+        If the recording doesn't include payloads.
+    """
+    # (imported here, as `comm` is only needed to replay)
+    from ._fake_comm import fake_comms
+
+    header, entries = read_traffic(path)
+    if not header.get("payloads"):
+        msg = "Replaying requires a recording made with `payloads=True`."
+        raise ValueError(msg)
+
+    report = ReplayReport()
+    if entries:
+        report.recorded_duration = entries[-1]["t"] - entries[0]["t"]
+
+    replayed: dict[str, _Replayed] = {}
+    start = time.monotonic()
+    with fake_comms(record=False) as comms:
+        for entry in entries:
+            if speed is not None:
+                delay = start + entry["t"] / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            if entry["type"] == "open":
+                widget = _replay_open(entry, factories, comms)
+                if widget is None:
+                    report.skipped_widgets.add(entry["widget"])
+                else:
+                    replayed[entry["comm"]] = widget
+                continue
+
+            target = replayed.get(entry["comm"])
+            if target is not None:
+                _replay_message(target, entry, report, python_changes=python_changes)
+
+        report.messages_out = sum(r.comm.message_count - 1 for r in replayed.values())
+    report.elapsed = time.monotonic() - start
+    return report
+
+
+def _decode(buffers: Sequence[str]) -> list[bytes]:
+    return [base64.b64decode(buffer) for buffer in buffers]
+
+
+def _replay_open(
+    entry: dict,
+    factories: Mapping[str, typing.Callable[[], object]],
+    comms: list[FakeComm],
+) -> _Replayed | None:
+    """Create the widget for a recorded comm, returning it and its new comm."""
+    factory = factories.get(entry["widget"])
+    if factory is None:
+        return None
+    opened = len(comms)
+    obj = factory()
+    comm = getattr(obj, "comm", None)
+    if comm is None:
+        # a MimeBundleDescriptor-based widget opens its comm on first access
+        comm = obj._repr_mimebundle_._comm  # type: ignore[attr-defined]  # noqa: SLF001
+    if comm not in comms[opened:]:
+        msg = f"Factory for {entry['widget']} didn't open a new comm."
+        raise RuntimeError(msg)
+    return _Replayed(obj, comm)
+
+
+def _replay_message(
+    target: _Replayed,
+    entry: dict,
+    report: ReplayReport,
+    *,
+    python_changes: bool,
+) -> None:
+    """Deliver a recorded inbound message, or re-apply a recorded outbound update."""
+    if entry["dir"] == "in":
+        target.comm.receive(entry["data"], _decode(entry["buffers"]))
+        report.messages_in += 1
+        return
+    report.recorded_messages_out += 1
+    if python_changes and entry["method"] == "update":
+        _apply_python_change(target.obj, entry)
+
+
+def _apply_python_change(obj: object, entry: dict) -> None:
+    """Set the public attributes from a recorded outbound update on `obj`."""
+    state = entry["data"].get("state", {})
+    put_buffers(state, entry["buffer_paths"], _decode(entry["buffers"]))  # type: ignore[arg-type]
+    for key, value in state.items():
+        if not key.startswith("_"):
+            setattr(obj, key, value)
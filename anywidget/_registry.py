@@ -0,0 +1,221 @@
+"""The registry of comms opened for `MimeBundleDescriptor`-based objects.
+
+Each object displayed (or synced) through a `MimeBundleDescriptor` gets a single
+comm, shared by all of its views, which is closed when the object is garbage
+collected. `anywidget.experimental.comm_registry` keeps track of them:
+
+>>> comm_registry.usage()
+{'my_module.Foo': CommUsage(comms=3, nbytes=1216)}
+>>> comm_registry.close_all(cls=Foo)
+3
+
+Objects are identified by a token handed out when their comm opens. They are
+looked up by `id()`, but only together with a check that it's still the same
+object, so an id reused after an object is gone never finds its comm. Objects
+that can't be weakly referenced are kept alive by their comm until it's closed
+(e.g., with `close_all`).
+
+(`AnyWidget` comms are tracked by ipywidgets instead, see `Widget.close_all`.)
+"""
+
+from __future__ import annotations
+
+import itertools
+import sys
+import typing
+import warnings
+import weakref
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from comm.base_comm import BaseComm
+
+__all__ = ["CommRegistry", "CommUsage", "comm_registry"]
+
+
+class CommUsage(typing.NamedTuple):
+    """The open comms of the objects of a class.
+
+    Attributes
+    ----------
+    comms : int
+        The number of open comms.
+    nbytes : int
+        The approximate memory of the objects (and their attributes), in bytes.
+    """
+
+    comms: int
+    nbytes: int
+
+
+class _Entry:
+    __slots__ = ("closers", "cls", "comm", "obj_id", "ref", "token")
+
+    def __init__(
+        self,
+        token: int,
+        obj: object,
+        comm: BaseComm,
+        ref: typing.Callable[[], object],
+    ) -> None:
+        self.token = token
+        self.obj_id = id(obj)
+        self.cls = type(obj)
+        self.comm = comm
+        self.ref = ref
+        # tear down the (views of the) object when its comm is closed
+        self.closers: list[weakref.WeakMethod] = []
+
+
+class CommRegistry:
+    """The open comms of `MimeBundleDescriptor`-based objects, one per object."""
+
+    def __init__(self) -> None:
+        self._entries: dict[int, _Entry] = {}
+        # id(obj) -> token, of the objects with open comms
+        self._tokens: dict[int, int] = {}
+        self._next_token = itertools.count(1)
+        self._threshold: int | None = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, obj: object) -> bool:
+        """Whether `obj` (or the object with id `obj`) has an open comm."""
+        if isinstance(obj, int):
+            return obj in self._tokens
+        return self._find(obj) is not None
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__}: {len(self)} open comms>"
+
+    def _find(self, obj: object) -> _Entry | None:
+        entry = self._entries.get(self._tokens.get(id(obj), 0))
+        return entry if entry is not None and entry.ref() is obj else None
+
+    def get_or_open(
+        self,
+        obj: object,
+        open_comm: typing.Callable[[], BaseComm],
+        on_close: typing.Callable[[], object] | None = None,
+    ) -> BaseComm:
+        """Get the comm of `obj`, opening one (with `open_comm`) if it has none.
+
+        Parameters
+        ----------
+        obj : object
+            The object the comm syncs.
+        open_comm : Callable[[], BaseComm]
+            Opens a new comm for `obj`.
+        on_close : Callable[[], object] | None, optional
+            A bound method to call if the comm is closed by `close_all` (held
+            weakly).
+        """
+        entry = self._find(obj)
+        if entry is None:
+            comm = open_comm()
+            token = next(self._next_token)
+            try:
+                ref: typing.Callable[[], object] = weakref.ref(obj)
+                weakref.finalize(obj, self._discard, token)
+            except TypeError:
+                # not weakrefable, so it's kept alive until its comm is closed
+                ref = lambda: obj  # noqa: E731
+            entry = _Entry(token, obj, comm, ref)
+            self._entries[token] = entry
+            self._tokens[entry.obj_id] = token
+            self._check_threshold()
+        if on_close is not None:
+            entry.closers = [c for c in entry.closers if c() is not None]
+            entry.closers.append(weakref.WeakMethod(on_close))
+        return entry.comm
+
+    def _discard(self, token: int) -> _Entry | None:
+        entry = self._entries.pop(token, None)
+        if entry is not None and self._tokens.get(entry.obj_id) == token:
+            del self._tokens[entry.obj_id]
+        return entry
+
+    def usage(self) -> dict[str, CommUsage]:
+        """Count the open comms (and the memory of their objects) per class.
+
+        Returns
+        -------
+        dict[str, CommUsage]
+            Keyed by the fully-qualified name of the objects' class.
+        """
+        usage: dict[str, CommUsage] = {}
+        for entry in list(self._entries.values()):
+            name = f"{entry.cls.__module__}.{entry.cls.__qualname__}"
+            comms, nbytes = usage.get(name, (0, 0))
+            usage[name] = CommUsage(comms + 1, nbytes + _sizeof(entry.ref()))
+        return usage
+
+    def close_all(self, cls: type | None = None) -> int:
+        """Close the comms of all objects (or only of instances of `cls`).
+
+        The objects stop syncing with their views, and are no longer kept alive
+        by their comms.
+
+        Parameters
+        ----------
+        cls : type | None, optional
+            Only close the comms of instances of this class (or its subclasses).
+
+        Returns
+        -------
+        int
+            The number of comms closed.
+        """
+        closing = [
+            entry
+            for entry in list(self._entries.values())
+            if cls is None or issubclass(entry.cls, cls)
+        ]
+        for entry in closing:
+            self._discard(entry.token)
+            for closer in entry.closers:
+                close = closer()
+                if close is not None:
+                    close()
+            entry.comm.close()
+        return len(closing)
+
+    def clear(self) -> None:
+        """Forget all comms, without closing them."""
+        self._entries.clear()
+        self._tokens.clear()
+
+    def warn_above(self, threshold: int | None = 1000) -> None:
+        """Warn when more than `threshold` comms are open (`None` to stop).
+
+        A long-running kernel with ever more open comms usually means that
+        objects are being displayed and never released.
+        """
+        self._threshold = threshold
+
+    def _check_threshold(self) -> None:
+        threshold = self._threshold
+        # (warns each time the count goes over the threshold)
+        if threshold is None or len(self) != threshold + 1:
+            return
+        name, usage = max(self.usage().items(), key=lambda item: item[1].comms)
+        warnings.warn(
+            f"{len(self)} anywidget comms are open, {usage.comms} of them for "
+            f"{name}. Objects that are no longer used may be kept alive; "
+            "see `anywidget.experimental.comm_registry`.",
+            stacklevel=4,
+        )
+
+
+# the open comms of all `MimeBundleDescriptor`-based objects
+comm_registry = CommRegistry()
+
+
+def _sizeof(obj: object) -> int:
+    """The (shallow) size of an object and its attributes, in bytes."""
+    if obj is None:
+        return 0
+    size = sys.getsizeof(obj)
+    for value in getattr(obj, "__dict__", {}).values():
+        size += sys.getsizeof(value)
+    return size
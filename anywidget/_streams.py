@@ -0,0 +1,501 @@
+"""Containers for streaming data that only send what changed.
+
+An `AppendOnlyList` in a widget's state (a synced trait on an `AnyWidget`, or a
+field of a `MimeBundleDescriptor`-based object) is sent in full when the widget
+opens (or the front end asks for its whole state). After that, appending to it
+sends only the new items, along with the offset where they go:
+
+    {"__anywidget_append__": 1000, "items": [...]}
+
+The front end's `AnyModel` appends the items to the array it already has (in
+place), and fires an `append:<name>` event with just the new items, followed by
+the usual `change:<name>`.
+
+A `RingBuffer` keeps only its last `capacity` numbers, in a preallocated typed
+array on both sides, so memory stays constant however long it's written to.
+Writes send only the newly written slots, with the slot they start at and the
+new head (the next slot to write):
+
+    {"__anywidget_ring__": 1000, "dtype": "float64", "full": false,
+     "start": 998, "head": 2, "length": 1000, "buffer": <buffer>}
+
+The front end writes them into its copy of the ring (wrapping around the end),
+and fires `append:<name>` with the new values and their start slot.
+"""
+
+from __future__ import annotations
+
+import array
+import sys
+import typing
+from collections.abc import Sequence
+
+import traitlets.traitlets as t
+from psygnal import Signal
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Iterable, Iterator
+
+__all__ = ["AppendOnly", "AppendOnlyList", "Ring", "RingBuffer"]
+
+APPEND_KEY = "__anywidget_append__"
+RING_KEY = "__anywidget_ring__"
+
+# `array` typecodes (for ring buffers), and the typed arrays they map to
+_TYPECODE_DTYPES = {
+    "b": "int8",
+    "B": "uint8",
+    "h": "int16",
+    "H": "uint16",
+    "i": "int32",
+    "I": "uint32",
+    "f": "float32",
+    "d": "float64",
+}
+
+T = typing.TypeVar("T")
+
+
+class AppendOnlyList(Sequence[T]):
+    """A list that can only grow, so widgets can send just the new items.
+
+    Parameters
+    ----------
+    items : Iterable[T], optional
+        The initial items.
+
+    Examples
+    --------
+    >>> @anywidget.experimental.dataclass(esm="index.js")
+    ... class Log:
+    ...     lines: AppendOnlyList[str] = field(default_factory=AppendOnlyList)
+    >>> log = Log()
+    >>> log.lines.append("started")  # sends only "started" to the front end
+    """
+
+    appended = Signal(int)
+    """Emitted with the index of the first new item, after items are appended."""
+
+    def __init__(self, items: Iterable[T] = ()) -> None:
+        self._items = list(items)
+
+    def append(self, item: T) -> None:
+        """Append an item."""
+        self._items.append(item)
+        self.appended.emit(len(self._items) - 1)
+
+    def extend(self, items: Iterable[T]) -> None:
+        """Append several items (sent together)."""
+        offset = len(self._items)
+        self._items.extend(items)
+        if len(self._items) > offset:
+            self.appended.emit(offset)
+
+    @typing.overload
+    def __getitem__(self, index: int) -> T: ...
+
+    @typing.overload
+    def __getitem__(self, index: slice) -> list[T]: ...
+
+    def __getitem__(self, index: int | slice) -> T | list[T]:
+        return self._items[index]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self._items)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, AppendOnlyList):
+            return self._items == other._items
+        return isinstance(other, (list, tuple)) and self._items == list(other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"AppendOnlyList({self._items!r})"
+
+    def __deepcopy__(self, memo: dict) -> AppendOnlyList[T]:
+        # state getters like `dataclasses.asdict` deep-copy field values; keep the
+        # same list, so the widget can tell what it already sent
+        return self
+
+    @property
+    def _written(self) -> int:
+        return len(self._items)
+
+    def _encode(self, since: int | None) -> object:
+        """The whole list, or (with `since`) a marker with the items after it."""
+        if since is None:
+            return list(self._items)
+        return {APPEND_KEY: since, "items": self._items[since:]}
+
+
+class AppendOnly(t.TraitType[AppendOnlyList, typing.Any]):
+    """A trait holding an `AppendOnlyList` (assigned lists are converted to one).
+
+    Examples
+    --------
+    >>> class Log(anywidget.AnyWidget):
+    ...     lines = AppendOnly().tag(sync=True)
+    >>> log = Log()
+    >>> log.lines.append("started")  # sends only "started" to the front end
+    """
+
+    info_text = "an AppendOnlyList (or a list or tuple)"
+
+    def __init__(self, default_value: Iterable = (), **kwargs: typing.Any) -> None:  # noqa: ANN401
+        super().__init__(**kwargs)
+        self._initial = tuple(default_value)
+
+    def instance_init(self, obj: t.HasTraits) -> None:
+        super().instance_init(obj)
+        _track_appends(obj, self.name)
+
+    def make_dynamic_default(self) -> AppendOnlyList:
+        # each instance gets its own list
+        return AppendOnlyList(self._initial)
+
+    def validate(self, obj: t.HasTraits | None, value: object) -> AppendOnlyList:
+        if isinstance(value, AppendOnlyList):
+            return value
+        if isinstance(value, (list, tuple)):
+            return AppendOnlyList(value)
+        return self.error(obj, value)
+
+
+class RingBuffer(Sequence[float]):
+    """A fixed-size buffer of the last `capacity` numbers written to it.
+
+    Backed by a preallocated `array.array`, as is its copy in the front end (a
+    typed array), so memory stays constant however many values are written.
+
+    Parameters
+    ----------
+    capacity : int
+        The number of values kept.
+    typecode : str, optional
+        The `array` typecode of the values: `"d"` (float64, default), `"f"`,
+        `"b"`, `"B"`, `"h"`, `"H"`, `"i"` or `"I"`.
+    items : Iterable[float], optional
+        Initial values to write.
+
+    Examples
+    --------
+    >>> class Monitor(anywidget.AnyWidget):
+    ...     cpu = Ring(3600).tag(sync=True)
+    >>> monitor = Monitor()
+    >>> monitor.cpu.append(0.25)  # sends only the new slot to the front end
+    """
+
+    appended = Signal(int)
+    """Emitted with the number of values written before, after values are written."""
+
+    def __init__(
+        self, capacity: int, typecode: str = "d", items: Iterable[float] = ()
+    ) -> None:
+        if capacity < 1:
+            msg = "RingBuffer capacity must be at least 1."
+            raise ValueError(msg)
+        if typecode not in _TYPECODE_DTYPES:
+            msg = f"Unsupported RingBuffer typecode: {typecode!r}"
+            raise ValueError(msg)
+        # zero-filled, like the front end's typed array
+        self._data: array.array[typing.Any] = array.array(
+            typecode, bytes(capacity * _itemsize(typecode))
+        )
+        self._head = 0  # the next slot to write
+        self._count = 0  # values written, ever
+        self.extend(items)
+
+    @property
+    def capacity(self) -> int:
+        """The number of values kept."""
+        return len(self._data)
+
+    @property
+    def typecode(self) -> str:
+        """The `array` typecode of the values."""
+        return self._data.typecode
+
+    @property
+    def head(self) -> int:
+        """The slot the next value is written to."""
+        return self._head
+
+    def append(self, value: float) -> None:
+        """Write a value, overwriting the oldest if full."""
+        self.extend((value,))
+
+    def extend(self, values: Iterable[float]) -> None:
+        """Write several values (sent together), overwriting the oldest if full."""
+        new: array.array[typing.Any] = array.array(self.typecode, values)
+        if not new:
+            return
+        offset, capacity = self._count, self.capacity
+        self._count += len(new)
+        if len(new) >= capacity:
+            # only the last `capacity` values are kept
+            self._data[:] = new[len(new) - capacity :]
+            self._head = 0
+        else:
+            end = self._head + len(new)
+            first = min(end, capacity) - self._head
+            self._data[self._head : self._head + first] = new[:first]
+            self._data[: len(new) - first] = new[first:]
+            self._head = end % capacity
+        self.appended.emit(offset)
+
+    def tolist(self) -> list[float]:
+        """The values, oldest first."""
+        return self._slots(len(self))
+
+    @typing.overload
+    def __getitem__(self, index: int) -> float: ...
+
+    @typing.overload
+    def __getitem__(self, index: slice) -> list[float]: ...
+
+    def __getitem__(self, index: int | slice) -> float | list[float]:
+        if isinstance(index, slice):
+            return self.tolist()[index]
+        length = len(self)
+        if not -length <= index < length:
+            msg = "RingBuffer index out of range"
+            raise IndexError(msg)
+        slot = (self._head - length + index % length) % self.capacity
+        return typing.cast("float", self._data[slot])
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def __iter__(self) -> Iterator[float]:
+        return iter(self.tolist())
+
+    def __repr__(self) -> str:
+        return f"RingBuffer({self.capacity}, {self.typecode!r}, {self.tolist()!r})"
+
+    def __deepcopy__(self, memo: dict) -> RingBuffer:
+        # see `AppendOnlyList.__deepcopy__`
+        return self
+
+    def _slots(self, count: int) -> list[float]:
+        """The last `count` values written, oldest first."""
+        start = (self._head - count) % self.capacity
+        if start + count <= self.capacity:
+            return self._data[start : start + count].tolist()
+        return self._data[start:].tolist() + self._data[: self._head].tolist()
+
+    @property
+    def _written(self) -> int:
+        return self._count
+
+    def _encode(self, since: int | None) -> object:
+        """All the slots, or (with `since`) a marker with the slots written after."""
+        count = self._count - (since or 0)
+        full = since is None or count > self.capacity
+        if full:
+            start, data = 0, array.array(self.typecode, self._data)
+        else:
+            start = (self._head - count) % self.capacity
+            data = array.array(self.typecode, self._slots(count))
+        if sys.byteorder == "big":
+            # browsers are (all but universally) little-endian
+            data.byteswap()
+        return {
+            RING_KEY: self.capacity,
+            "dtype": _TYPECODE_DTYPES[self.typecode],
+            "full": full,
+            "start": start,
+            "head": self._head,
+            "length": len(self),
+            "buffer": memoryview(data),
+        }
+
+
+def _itemsize(typecode: str) -> int:
+    return array.array(typecode).itemsize
+
+
+class Ring(t.TraitType[RingBuffer, typing.Any]):
+    """A trait holding a `RingBuffer` (assigned lists are written to a new one).
+
+    Parameters
+    ----------
+    capacity : int
+        The capacity of the trait's ring buffers.
+    typecode : str, optional
+        The `array` typecode of the values (default: `"d"`, float64).
+
+    Examples
+    --------
+    >>> class Monitor(anywidget.AnyWidget):
+    ...     cpu = Ring(3600).tag(sync=True)
+    """
+
+    info_text = "a RingBuffer (or a list or tuple of numbers)"
+
+    def __init__(
+        self,
+        capacity: int,
+        typecode: str = "d",
+        **kwargs: typing.Any,  # noqa: ANN401
+    ) -> None:
+        super().__init__(**kwargs)
+        self.capacity = capacity
+        self.typecode = typecode
+
+    def instance_init(self, obj: t.HasTraits) -> None:
+        super().instance_init(obj)
+        _track_appends(obj, self.name)
+
+    def make_dynamic_default(self) -> RingBuffer:
+        # each instance gets its own buffer
+        return RingBuffer(self.capacity, self.typecode)
+
+    def validate(self, obj: t.HasTraits | None, value: object) -> RingBuffer:
+        if isinstance(value, RingBuffer):
+            return value
+        if isinstance(value, (list, tuple)):
+            try:
+                return RingBuffer(self.capacity, self.typecode, value)
+            except TypeError:
+                pass
+        return self.error(obj, value)
+
+
+# the containers that send only what changed
+_STREAM_TYPES = (AppendOnlyList, RingBuffer)
+_STREAM_CLASSES = frozenset(_STREAM_TYPES)
+
+
+def is_stream(value: object) -> bool:
+    """Whether `value` is exactly an `AppendOnlyList` or a `RingBuffer`.
+
+    Checks the exact type (rather than `isinstance`, which is slower for these
+    `Sequence`s), so instances of subclasses must be tracked explicitly.
+    """
+    return type(value) in _STREAM_CLASSES
+
+
+def _track_appends(obj: object, name: str | None) -> None:
+    """Tell `obj` (e.g., an `AnyWidget`) that it holds a list (or ring) at `name`."""
+    track = getattr(obj, "_track_appends", None)
+    if track is not None and name is not None:
+        track(name)
+
+
+class _Sent(typing.NamedTuple):
+    items: AppendOnlyList | RingBuffer
+    length: int
+    disconnect: typing.Callable[[], object]
+
+
+class AppendTracker:
+    """Tracks which items of a widget's append-only lists (and rings) were sent.
+
+    `encode` encodes the state against what was sent before, and `commit` records
+    it as sent once the state has actually been sent (or `discard` drops it), so
+    state that never reaches the front end doesn't count.
+
+    Only the keys registered with `track` are looked at, so the rest of the state
+    isn't walked on every send.
+
+    Parameters
+    ----------
+    send_state : Callable[[str], None]
+        Sends the state of one key; called when a tracked list is appended to.
+    """
+
+    def __init__(self, send_state: typing.Callable[[str], object]) -> None:
+        self._send_state = send_state
+        # the keys that may hold a list (or ring)
+        self._keys: set[str] = set()
+        self._sent: dict[str, _Sent] = {}
+        # what the last `encode` sends, by key (`None` to stop tracking the key)
+        self._pending: dict[str, tuple[AppendOnlyList | RingBuffer, int] | None] = {}
+
+    def track(self, key: str) -> None:
+        """Look for a list (or ring) at `key` in the state from now on."""
+        self._keys.add(key)
+
+    def encode(self, state: dict, *, full: bool) -> dict:
+        """Replace append-only lists in `state` with their items, or new items.
+
+        With `full`, lists are sent in full (as plain lists, or all the slots of
+        rings). Otherwise, lists sent before are replaced by a marker with their new
+        items, or dropped from `state` if there are none.
+        """
+        self._pending.clear()
+        keys = self._keys.intersection(state) if self._keys else None
+        if not keys:
+            return state
+        encoded = dict(state)
+        for key in keys:
+            value, sent = state[key], self._sent.get(key)
+            if not isinstance(value, _STREAM_TYPES):
+                if sent is not None:
+                    self._pending[key] = None  # replaced by something else
+                continue
+            length = value._written  # noqa: SLF001
+            if sent is None or sent.items is not value or full or sent.length > length:
+                encoded[key] = value._encode(None)  # noqa: SLF001
+            elif length == sent.length:
+                del encoded[key]  # nothing new
+                continue
+            else:
+                encoded[key] = value._encode(sent.length)  # noqa: SLF001
+            self._pending[key] = (value, length)
+        return encoded
+
+    def encode_full(self, state: dict) -> dict:
+        """Replace append-only lists (and rings) in `state` with all their items.
+
+        For state that isn't sent (e.g., `get_state()` outside of a send), so what
+        the front end has isn't changed.
+        """
+        keys = self._keys.intersection(state) if self._keys else None
+        if not keys:
+            return state
+        return {
+            key: value._encode(None)  # noqa: SLF001
+            if key in keys and isinstance(value, _STREAM_TYPES)
+            else value
+            for key, value in state.items()
+        }
+
+    def commit(self) -> None:
+        """Record the state from the last `encode` as sent."""
+        pending, self._pending = self._pending, {}
+        for key, entry in pending.items():
+            sent = self._sent.get(key)
+            if entry is None:
+                if sent is not None:
+                    sent.disconnect()
+                    del self._sent[key]
+                continue
+            items, length = entry
+            if sent is None or sent.items is not items:
+                if sent is not None:
+                    sent.disconnect()
+                sent = self._track(key, items)
+            self._sent[key] = sent._replace(length=length)
+
+    def discard(self) -> None:
+        """Drop the state from the last `encode`, which wasn't sent."""
+        self._pending.clear()
+
+    def disconnect(self) -> None:
+        """Stop sending appends to any of the tracked lists."""
+        self._pending.clear()
+        for sent in self._sent.values():
+            sent.disconnect()
+        self._sent.clear()
+
+    def _track(self, key: str, items: AppendOnlyList | RingBuffer) -> _Sent:
+        def _on_appended(offset: int) -> None:  # noqa: ARG001
+            self._send_state(key)
+
+        items.appended.connect(_on_appended)
+        return _Sent(items, 0, lambda: items.appended.disconnect(_on_appended))
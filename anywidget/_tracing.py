@@ -0,0 +1,84 @@
+"""Optional tracing spans around the state synchronization hot path.
+
+anywidget doesn't depend on OpenTelemetry, but any callable that takes a span name
+and an `attributes` keyword argument and returns a context manager can be
+registered. In particular, a tracer's `start_as_current_span` works as-is:
+
+>>> from opentelemetry import trace
+>>> tracer = trace.get_tracer("anywidget")
+>>> anywidget.set_span_callback(tracer.start_as_current_span)
+
+Spans are named `anywidget.<operation>`, for `get_state`, `remove_buffers`,
+`put_buffers`, `comm_open`, `comm_send`, `set_state` (applying an update from the
+front end) and `command`. The `command` span lasts until the command completes,
+including async, streaming and pooled (`executor=`) commands.
+
+The innermost open span (the value its context manager entered with) is kept in a
+`contextvars.ContextVar`, see `current_span`. Async commands run in tasks (and
+thread-pool commands in a copy of the context) created while their `command`
+span is current, so spans opened by the command (by anywidget, or with a
+`contextvars`-based tracer such as OpenTelemetry's) are its children.
+
+Each call site checks `CALLBACK` before building a span, so tracing costs a single
+attribute check when no callback is registered::
+
+    with _tracing.span("get_state") if _tracing.CALLBACK else _tracing.NO_SPAN:
+        ...
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import typing
+
+__all__ = ["current_span", "set_span_callback"]
+
+SpanCallback = typing.Callable[..., typing.ContextManager[object]]
+
+CALLBACK: SpanCallback | None = None
+NO_SPAN: typing.ContextManager[None] = contextlib.nullcontext()
+
+_CURRENT_SPAN: contextvars.ContextVar[object] = contextvars.ContextVar(
+    "anywidget_current_span", default=None
+)
+
+
+def set_span_callback(callback: SpanCallback | None) -> None:
+    """Register a callback that opens tracing spans, or remove it with `None`.
+
+    Parameters
+    ----------
+    callback : Callable[..., ContextManager] | None
+        Called as `callback(name, attributes={...})` around each traced operation.
+        The returned context manager is entered for the duration of the operation.
+    """
+    global CALLBACK  # noqa: PLW0603
+    CALLBACK = callback
+
+
+def current_span() -> object:
+    """The innermost open anywidget span in the current context, if any.
+
+    That is, the value the callback's context manager returned when entered (for
+    OpenTelemetry, the `Span`).
+    """
+    return _CURRENT_SPAN.get()
+
+
+def span(name: str, **attributes: object) -> typing.ContextManager[object]:
+    """Open a span for operation `name` with the registered callback, if any."""
+    callback = CALLBACK
+    if callback is None:
+        return NO_SPAN
+    return _span(callback(f"anywidget.{name}", attributes=attributes))
+
+
+@contextlib.contextmanager
+def _span(manager: typing.ContextManager[object]) -> typing.Iterator[object]:
+    with manager as value:
+        token = _CURRENT_SPAN.set(value)
+        try:
+            yield value
+        finally:
+            _CURRENT_SPAN.reset(token)
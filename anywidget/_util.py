@@ -5,8 +5,9 @@ import pathlib
 import re
 import sys
 from functools import lru_cache
-from typing import Any
+from typing import Any, Mapping
 
+from . import _mapped, _tracing
 from ._file_contents import _VIRTUAL_FILES, FileContents, VirtualFileContents
 
 _BINARY_TYPES = (memoryview, bytearray, bytes)
@@ -17,6 +18,7 @@ _PROTOCOL_VERSION = f"{_PROTOCOL_VERSION_MAJOR}.{_PROTOCOL_VERSION_MINOR}.0"
 _ANYWIDGET_ID_KEY = "_anywidget_id"
 _ESM_KEY = "_esm"
 _CSS_KEY = "_css"
+_FILE_SUFFIX_RE = re.compile(r"[a-zA-Z0-9]\.[a-zA-Z0-9]+$")
 _DEFAULT_ESM = """
 function render(view) {
   console.log("Dev note: No _esm defined for this widget:", view);
@@ -75,11 +77,11 @@ def _separate_buffers(  # noqa: C901, PLR0912
                     _sub[i] = _v
     elif isinstance(substate, dict):
         for k, v in substate.items():
-            if isinstance(v, _BINARY_TYPES):
+            if isinstance(v, _BINARY_TYPES) or _mapped.is_mapped(v):
                 if _sub is None:
                     _sub = dict(substate)  # shallow clone dict
                 del _sub[k]
-                buffers.append(v)
+                buffers.append(_as_buffer(v))
                 buffer_paths.append([*path, k])
             elif isinstance(v, (dict, list, tuple)):
                 _v = _separate_buffers(v, [*path, k], buffer_paths, buffers)
@@ -93,10 +95,16 @@ def _separate_buffers(  # noqa: C901, PLR0912
     return _sub if _sub is not None else substate
 
 
+def _as_buffer(value: object) -> object:
+    return value if isinstance(value, _BINARY_TYPES) else _mapped.as_buffer(value)
+
+
 def remove_buffers(state: object) -> tuple[Any, list[list], list[memoryview]]:
     """Return (state_without_buffers, buffer_paths, buffers) for binary message parts.
 
-    A binary message part is a memoryview, bytearray, or python 3 bytes object.
+    A binary message part is a memoryview, bytearray, or python 3 bytes object. Values
+    of dicts may also be memory-mapped files (`mmap.mmap` or `np.memmap`), which are
+    sent as memoryviews (without reading them into memory first).
 
     Examples
     --------
@@ -120,7 +128,8 @@ def remove_buffers(state: object) -> tuple[Any, list[list], list[memoryview]]:
     """
     buffer_paths: list = []
     buffers: list[memoryview] = []
-    state = _separate_buffers(state, [], buffer_paths, buffers)
+    with _tracing.span("remove_buffers") if _tracing.CALLBACK else _tracing.NO_SPAN:
+        state = _separate_buffers(state, [], buffer_paths, buffers)
     return state, buffer_paths, buffers
 
 
@@ -134,13 +143,14 @@ def put_buffers(
     ...except here we modify the existing dict/lists.
     Modifying should be fine, since this is used when state comes from the wire.
     """
-    for buffer_path, buffer in zip(buffer_paths, buffers):
-        # we'd like to set say sync_data['x'][0]['y'] = buffer
-        # where buffer_path in this example would be ['x', 0, 'y']
-        obj = state
-        for key in buffer_path[:-1]:
-            obj = obj[key]
-        obj[buffer_path[-1]] = buffer
+    with _tracing.span("put_buffers") if _tracing.CALLBACK else _tracing.NO_SPAN:
+        for buffer_path, buffer in zip(buffer_paths, buffers):
+            # we'd like to set say sync_data['x'][0]['y'] = buffer
+            # where buffer_path in this example would be ['x', 0, 'y']
+            obj = state
+            for key in buffer_path[:-1]:
+                obj = obj[key]
+            obj[buffer_path[-1]] = buffer
 
 
 def in_colab() -> bool:
@@ -251,12 +261,61 @@ def try_file_path(x: object) -> pathlib.Path | None:
 
     # Is a single line string, but we don't know if it's a file path or raw contents.
 
+    return _resolve_path_str(x, pathlib.Path.cwd())
+
+
+@lru_cache(maxsize=256)
+def _resolve_path_str(x: str, base: pathlib.Path) -> pathlib.Path | None:
+    """Resolve a single-line string with a file extension (relative to `base`).
+
+    Memoized, as every widget class resolves its `_esm`/`_css`, and `resolve()`
+    hits the filesystem. Cleared whenever a watched asset changes (see
+    `_clear_resolved_paths`), e.g., when a symlink is pointed elsewhere.
+    """
     # Just check if it has a file extension for now.
-    includes_file_suffix = re.search(r"[a-zA-Z0-9]\.[a-zA-Z0-9]+$", x) is not None
-    if includes_file_suffix:
-        return pathlib.Path(x).resolve().absolute()
+    if _FILE_SUFFIX_RE.search(x) is None:
+        return None
+    return (base / x).resolve().absolute()
+
+
+def _clear_resolved_paths(*_: object) -> None:
+    _resolve_path_str.cache_clear()
+
 
-    return None
+def try_file_contents_many(
+    values: Mapping[str, object],
+) -> dict[str, FileContents | VirtualFileContents]:
+    """Batched version of `try_file_contents`.
+
+    Returns a dict with only the keys of `values` that could be coerced.
+
+    Raises
+    ------
+    FileNotFoundError
+        If any of the file paths is not found.
+    """
+    contents: dict[str, FileContents | VirtualFileContents] = {}
+    paths: dict[str, pathlib.Path] = {}
+    for key, x in values.items():
+        if isinstance(x, str) and x in _VIRTUAL_FILES:
+            contents[key] = _VIRTUAL_FILES[x]
+            continue
+        maybe_path = try_file_path(x)
+        if maybe_path is not None:
+            paths[key] = maybe_path
+
+    for key, path in paths.items():
+        if not path.is_file():
+            msg = f"File not found: {path}"
+            raise FileNotFoundError(msg)
+        contents[key] = file_contents = FileContents(
+            path=path,
+            start_thread=_should_start_thread(path),
+        )
+        # (the files' watchers tell when cached resolutions may be stale)
+        file_contents.changed.connect(_clear_resolved_paths)
+        file_contents.deleted.connect(_clear_resolved_paths)
+    return contents
 
 
 def try_file_contents(x: object) -> FileContents | VirtualFileContents | None:
@@ -267,21 +326,7 @@ def try_file_contents(x: object) -> FileContents | VirtualFileContents | None:
     FileNotFoundError
         If the file is not found.
     """
-    if isinstance(x, str) and x in _VIRTUAL_FILES:
-        return _VIRTUAL_FILES[x]
-
-    maybe_path = try_file_path(x)
-    if maybe_path is None:
-        return None
-
-    path = maybe_path
-    if not path.is_file():
-        msg = f"File not found: {path}"
-        raise FileNotFoundError(msg)
-    return FileContents(
-        path=path,
-        start_thread=_should_start_thread(path),
-    )
+    return try_file_contents_many({"": x}).get("")
 
 
 def repr_mimebundle(
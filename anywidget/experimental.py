@@ -7,14 +7,52 @@ import typing
 
 import psygnal
 
+from ._changes import Change
+from ._commands import LRU, CacheInfo, command, command_cancelled
 from ._descriptor import MimeBundleDescriptor
+from ._mapped import mapped_buffer_window
+from ._outbox import flow_control
+from ._packing import Quantize, pack_numeric_lists
+from ._paging import Paged, PagedData, Pyramid, PyramidData
+from ._payloads import PayloadReport, check_payloads
+from ._recording import record_traffic, replay_traffic
+from ._registry import CommRegistry, CommUsage, comm_registry
+from ._streams import AppendOnly, AppendOnlyList, Ring, RingBuffer
+from ._versions import versioned_updates
 
 if typing.TYPE_CHECKING:  # pragma: no cover
     import pathlib
 
-    from ._protocols import WidgetBase
-
-__all__ = ["MimeBundleDescriptor", "dataclass", "widget"]
+__all__ = [
+    "LRU",
+    "AppendOnly",
+    "AppendOnlyList",
+    "CacheInfo",
+    "Change",
+    "CommRegistry",
+    "CommUsage",
+    "MimeBundleDescriptor",
+    "Paged",
+    "PagedData",
+    "PayloadReport",
+    "Pyramid",
+    "PyramidData",
+    "Quantize",
+    "Ring",
+    "RingBuffer",
+    "check_payloads",
+    "comm_registry",
+    "command",
+    "command_cancelled",
+    "dataclass",
+    "flow_control",
+    "mapped_buffer_window",
+    "pack_numeric_lists",
+    "record_traffic",
+    "replay_traffic",
+    "versioned_updates",
+    "widget",
+]
 
 T = typing.TypeVar("T")
 
@@ -107,73 +145,3 @@ def dataclass(
         return widget(esm=esm, css=css)(cls)
 
     return _decorator(cls) if cls is not None else _decorator  # type: ignore[return-value]
-
-
-_ANYWIDGET_COMMAND = "_anywidget_command"
-_ANYWIDGET_COMMANDS = "_anywidget_commands"
-
-_AnyWidgetCommand = typing.Callable[
-    [object, object, typing.List[bytes]],
-    typing.Tuple[object, typing.List[bytes]],
-]
-
-
-def command(cmd: T) -> T:
-    """Mark a function as a command for anywidget.
-
-    Parameters
-    ----------
-    cmd : Callable
-        The function to mark as a command.
-
-    Returns
-    -------
-    Callable
-        The decorated function annotated as a command.
-
-    """
-    setattr(cmd, _ANYWIDGET_COMMAND, True)
-    return cmd
-
-
-def _collect_anywidget_commands(widget_cls: type) -> None:
-    cmds: dict[str, _AnyWidgetCommand] = {}
-    for base in widget_cls.__mro__:
-        if not hasattr(base, "__dict__"):
-            continue
-        for name, attr in base.__dict__.items():
-            if callable(attr) and getattr(attr, _ANYWIDGET_COMMAND, False):
-                cmds[name] = attr  # noqa: PERF403
-
-    setattr(widget_cls, _ANYWIDGET_COMMANDS, cmds)
-
-
-def _register_anywidget_commands(widget: WidgetBase) -> None:
-    """Register a custom message reducer for a widget if it implements the protocol."""
-    # Only add the callback if the widget has any commands.
-    cmds = typing.cast(
-        "dict[str, _AnyWidgetCommand]",
-        getattr(type(widget), _ANYWIDGET_COMMANDS, {}),
-    )
-    if not cmds:
-        return
-
-    def handle_anywidget_command(
-        self: WidgetBase,
-        msg: str | list | dict,
-        buffers: list[bytes],
-    ) -> None:
-        if not isinstance(msg, dict) or msg.get("kind") != "anywidget-command":
-            return
-        cmd = cmds[msg["name"]]
-        response, buffers = cmd(widget, msg["msg"], buffers)
-        self.send(
-            {
-                "id": msg["id"],
-                "kind": "anywidget-command-response",
-                "response": response,
-            },
-            buffers,
-        )
-
-    widget.on_msg(handle_anywidget_command)
@@ -2,10 +2,26 @@
 
 from __future__ import annotations
 
+import typing
+
 import ipywidgets
 import traitlets.traitlets as t
 
+from . import (
+    _mapped,
+    _metrics,
+    _outbox,
+    _packing,
+    _payloads,
+    _recording,
+    _tracing,
+    _versions,
+)
+from ._changes import Change, ChangeFeed
+from ._commands import _collect_anywidget_commands, _register_anywidget_commands
 from ._file_contents import FileContents, VirtualFileContents
+from ._mapped import MappedBuffers
+from ._streams import AppendOnlyList, AppendTracker, is_stream
 from ._util import (
     _ANYWIDGET_ID_KEY,
     _CSS_KEY,
@@ -13,11 +29,14 @@ from ._util import (
     _ESM_KEY,
     enable_custom_widget_manager_once,
     in_colab,
+    remove_buffers,
     repr_mimebundle,
-    try_file_contents,
+    try_file_contents_many,
 )
 from ._version import _ANYWIDGET_SEMVER_VERSION
-from .experimental import _collect_anywidget_commands, _register_anywidget_commands
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import AsyncIterator, Iterable
 
 _PLAIN_TEXT_MAX_LEN = 110
 
@@ -33,7 +52,23 @@ class AnyWidget(ipywidgets.DOMWidget):  # type: ignore [misc]
     _view_module = t.Unicode("anywidget").tag(sync=True)
     _view_module_version = t.Unicode(_ANYWIDGET_SEMVER_VERSION).tag(sync=True)
 
+    # while opening the comm, the state it's opened with (see `open`)
+    _open_state: dict | None = None
+    # whether the state being got is sent (see `get_state`)
+    _sending = False
+    # sends only the new items of append-only lists (and rings), once a trait
+    # holds one (see `_track_appends`)
+    _appends: AppendTracker | None = None
+
     def __init__(self, *args: object, **kwargs: object) -> None:
+        # sends from other threads on the kernel's event loop, in order
+        self._outbox = _outbox.Outbox(self.send_state, self.send)
+        # sends large memory-mapped buffers in windows, after the state
+        self._mapped = MappedBuffers(self._send_chunk)
+        # the front end's changes, for `changed()` and `changes()`
+        self._changes = ChangeFeed()
+        # the latest version of each trait, to drop stale updates from the front end
+        self._versions = _versions.Versions()
         if in_colab():
             enable_custom_widget_manager_once()
 
@@ -65,14 +100,235 @@ class AnyWidget(ipywidgets.DOMWidget):  # type: ignore [misc]
     def __init_subclass__(cls, **kwargs: dict) -> None:
         """Coerces _esm and _css to FileContents if they are files."""
         super().__init_subclass__(**kwargs)
-        for key in (_ESM_KEY, _CSS_KEY) & cls.__dict__.keys():
-            # TODO(manzt): Upgrade to := when we drop Python 3.7
-            # https://github.com/manzt/anywidget/pull/167
-            file_contents = try_file_contents(getattr(cls, key))
-            if file_contents:
-                setattr(cls, key, file_contents)
+        file_contents = try_file_contents_many(
+            {
+                key: getattr(cls, key)
+                for key in (_ESM_KEY, _CSS_KEY) & cls.__dict__.keys()
+            }
+        )
+        for key, value in file_contents.items():
+            setattr(cls, key, value)
         _collect_anywidget_commands(cls)
 
+    def get_state(self, key: str | list[str] | None = None) -> dict:
+        """Get the widget state, with opt-in quantization, packing and metrics."""
+        if not (_metrics.ENABLED or _tracing.CALLBACK):
+            state: dict = super().get_state(key)
+        else:
+            widget = self._anywidget_id
+            with _metrics.timed(widget, "get_state"), _tracing.span(
+                "get_state", widget=widget
+            ):
+                state = super().get_state(key)
+        if self._appends is not None:
+            state = (
+                # committed once sent (see `_send` and `open`)
+                self._appends.encode(state, full=key is None)
+                if self._sending
+                else self._appends.encode_full(state)
+            )
+        state = _packing.quantize(state, _packing.trait_policies(self))
+        if _packing.CONFIG is not None:
+            state = _packing.pack(state)
+        if self._sending:
+            if key is None:
+                # (e.g., mapped trait defaults, which aren't assigned)
+                self._mapped.find(state)
+            state = self._mapped.encode(state)
+        if self._open_state is not None:
+            self._open_state = state
+        return state
+
+    def send_state(self, key: str | Iterable[str] | None = None) -> None:
+        """Send the widget state (on the kernel's event loop, from another thread)."""
+        if self._outbox.put_state(key):
+            return
+        self._sending = True
+        try:
+            super().send_state(key)
+        finally:
+            self._sending = False
+            # (unless sent)
+            if self._appends is not None:
+                self._appends.discard()
+            self._mapped.discard()
+
+    def send(self, content: object, buffers: list | None = None) -> None:
+        """Send a custom message (on the kernel's event loop, from another thread)."""
+        if not self._outbox.put(content, buffers):
+            super().send(content, buffers)
+
+    def _track_appends(self, name: str) -> None:
+        """Send only the new items of the append-only list (or ring) at `name`.
+
+        Called when such a trait is set up, or a list is assigned to another trait.
+        """
+        if self._appends is None:
+            self._appends = AppendTracker(self.send_state)
+        self._appends.track(name)
+
+    def _notify_trait(self, name: str, old_value: object, new_value: object) -> None:
+        if is_stream(new_value):
+            self._track_appends(name)
+        elif _mapped.holds_mapped(new_value):
+            self._mapped.track(name)
+        super()._notify_trait(name, old_value, new_value)
+
+    def _should_send_property(self, key: str, value: object) -> bool:
+        if self._appends is not None and isinstance(value, AppendOnlyList):
+            # compared to the front end's value as JSON
+            value = list(value)
+        return super()._should_send_property(key, value)  # type: ignore[no-any-return]
+
+    def open(self) -> None:
+        """Open a comm to the front end, instrumenting it if enabled."""
+        opening = self.comm is None
+        if opening:
+            self._open_state = {}  # (replaced by the state the comm opens with)
+            self._sending = True
+        try:
+            super().open()
+        finally:
+            sent_state, self._open_state = self._open_state, None
+            self._sending = False
+        recorder = _recording.RECORDER
+        if not opening or self.comm is None:
+            if self._appends is not None:
+                self._appends.discard()
+            self._mapped.discard()
+            return
+        if self._appends is not None:
+            self._appends.commit()
+        self._mapped.commit()
+        if _metrics.ENABLED and getattr(self.comm, "kernel", None):
+            # sent on the comm directly, so it isn't counted as widget traffic
+            request = {"method": "custom", "content": _metrics.FRONTEND_TIMINGS_REQUEST}
+            self.comm.send(data=request)
+        if sent_state is not None and (
+            recorder is not None or _payloads.LIMITS is not None
+        ):
+            state, buffer_paths, buffers = remove_buffers(sent_state)
+            data = {"state": state, "buffer_paths": buffer_paths}
+            if _payloads.LIMITS is not None:
+                _payloads.check(self._anywidget_id, data, buffers)
+            if recorder is not None:
+                comm_id, widget = self.comm.comm_id, self._anywidget_id
+                recorder.record("out", "open", comm_id, widget, data, buffers)
+
+    def _send(self, msg: dict, buffers: list | None = None) -> None:
+        if (
+            _outbox.MAX_IN_FLIGHT is not None
+            and msg.get("method") == "update"
+            and getattr(self.comm, "kernel", None)
+        ):
+            # numbered, for the front end to acknowledge
+            msg = {**msg, "seq": self._outbox.sent()}
+        if _versions.ENABLED and getattr(self.comm, "kernel", None):
+            method, keys = msg.get("method"), _versions.update_keys(msg)
+            if method == "update":
+                msg = {**msg, "versions": self._versions.bump(keys)}
+            elif method == "echo_update":
+                msg = {**msg, "versions": self._versions.current(keys)}
+        if _payloads.LIMITS is not None and self.comm is not None:
+            _payloads.check(self._anywidget_id, msg, buffers)
+        with (
+            _tracing.span("comm_send", widget=self._anywidget_id)
+            if _tracing.CALLBACK
+            else _tracing.NO_SPAN
+        ):
+            super()._send(msg, buffers)
+        if self.comm is None:
+            self._mapped.discard()
+            return
+        if _metrics.ENABLED:
+            _metrics.record_sent(self._anywidget_id, msg, buffers)
+        if _recording.RECORDER is not None:
+            comm_id, widget = self.comm.comm_id, self._anywidget_id
+            _recording.RECORDER.record("out", "msg", comm_id, widget, msg, buffers)
+        if msg.get("method") == "update" and getattr(self.comm, "kernel", True):
+            # then send the windows of its mapped buffers
+            if self._appends is not None:
+                self._appends.commit()
+            self._mapped.commit()
+
+    def _send_chunk(self, content: dict, buffer: memoryview) -> None:
+        self._send({"method": "custom", "content": content}, [buffer])
+
+    def _handle_msg(self, msg: dict) -> None:
+        data = msg["content"]["data"]
+        if _metrics.ENABLED:
+            _metrics.record_received(self._anywidget_id, data, msg.get("buffers"))
+        if _recording.RECORDER is not None:
+            comm_id, widget = self.comm.comm_id, self._anywidget_id
+            buffers = msg.get("buffers")
+            _recording.RECORDER.record("in", "msg", comm_id, widget, data, buffers)
+        if data.get("method") == "custom" and _metrics.is_frontend_timings(
+            data.get("content")
+        ):
+            # reported by the front end, not meant for `on_msg` callbacks
+            if _metrics.ENABLED:
+                _metrics.record_frontend(self._anywidget_id, data["content"]["timings"])
+            return
+        if data.get("method") == "custom" and _outbox.is_ack(data.get("content")):
+            self._outbox.ack(data["content"]["seq"])
+            return
+        if data.get("method") == "custom" and _mapped.is_ack(data.get("content")):
+            self._mapped.ack()
+            return
+        if data.get("method") == "request_state":
+            # a new front end, which won't acknowledge what the old one didn't
+            self._outbox.reset()
+            self._mapped.reset()
+        if data.get("method") == "update" and _versions.ENABLED:
+            data, buffers = self._versions.drop_stale(data, msg.get("buffers") or [])
+            msg = {
+                **msg,
+                "content": {**msg["content"], "data": data},
+                "buffers": buffers,
+            }
+        super()._handle_msg(msg)
+        if self._changes and data.get("method") == "update":
+            self._changes.publish(
+                Change(name, getattr(self, name))
+                for name in _versions.update_keys(data)
+                if self.has_trait(name)
+            )
+
+    async def changed(self, *names: str) -> Change:
+        """Wait for the front end to change one of `names` (or any public trait).
+
+        Parameters
+        ----------
+        *names : str
+            The names of the traits to wait for. All public synced traits if none
+            are given.
+
+        Returns
+        -------
+        Change
+            The name and new value of the changed trait.
+        """
+        return await self._changes.changed(*names)
+
+    def changes(self, *names: str) -> AsyncIterator[Change]:
+        """Iterate over the front end's changes to `names` (or any public trait).
+
+        Changes made while the consumer is busy are queued, keeping only the
+        latest of each trait, so a slow consumer skips intermediate values.
+
+        Parameters
+        ----------
+        *names : str
+            The names of the traits to follow. All public synced traits if none
+            are given.
+
+        Returns
+        -------
+        AsyncIterator[Change]
+            The name and new value of each changed trait.
+        """
+        return self._changes.changes(*names)
+
     def __repr__(self) -> str:
         """Return a simple repr to avoid expensive ipywidgets trait serialization."""
         return object.__repr__(self)
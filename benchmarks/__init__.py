@@ -0,0 +1,10 @@
+"""Benchmarks for the Python side of widget synchronization.
+
+Widgets are backed by `anywidget._fake_comm`, so no kernel or front end is needed.
+Run from the repository root with:
+
+    uv run python -m benchmarks --output results.json
+    uv run python -m benchmarks --compare results.json
+
+See `python -m benchmarks --help` for filtering and repeat options.
+"""
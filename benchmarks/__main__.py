@@ -0,0 +1,151 @@
+"""Run the benchmarks, optionally writing JSON results or comparing to a baseline."""
+
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import json
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+import typing
+
+import anywidget
+
+from .suite import BENCHMARKS, Skip
+
+if typing.TYPE_CHECKING:
+    from .suite import Benchmark
+
+# results whose median changed by less than this fraction are reported as unchanged
+_NOISE = 0.05
+
+
+def _commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"],  # noqa: S607
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run_benchmark(func: Benchmark, repeat: int) -> dict:
+    """Time a benchmark, returning per-call statistics in seconds."""
+    gen = func()
+    try:
+        target = next(gen)
+        timer = timeit.Timer(target)
+        number, _ = timer.autorange()
+        times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    finally:
+        gen.close()
+    return {
+        "number": number,
+        "repeat": repeat,
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def run(pattern: str, repeat: int) -> dict:
+    """Run all benchmarks matching `pattern`, printing progress to stderr."""
+    results: dict[str, dict] = {}
+    skipped: dict[str, str] = {}
+    for name, func in BENCHMARKS.items():
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+        try:
+            result = run_benchmark(func, repeat)
+        except Skip as e:
+            skipped[name] = str(e)
+            print(f"{name:<40} skipped ({e})", file=sys.stderr)
+            continue
+        results[name] = result
+        print(f"{name:<40} {_format(result['median'])}", file=sys.stderr)
+
+    return {
+        "version": 1,
+        "anywidget": anywidget.__version__,
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def compare(baseline: dict, current: dict) -> list[str]:
+    """Format a line per benchmark comparing median times to a baseline."""
+    lines = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            lines.append(f"{name:<40} {_format(result['median']):>10}  (new)")
+            continue
+        ratio = result["median"] / before["median"]
+        verdict = ""
+        if abs(ratio - 1) > _NOISE:
+            verdict = "slower" if ratio > 1 else "faster"
+        lines.append(
+            f"{name:<40} {_format(before['median']):>10} -> "
+            f"{_format(result['median']):>10}  {ratio:6.2f}x {verdict}".rstrip()
+        )
+    return lines
+
+
+def _format(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument(
+        "-k",
+        "--filter",
+        default="*",
+        help="only run benchmarks whose name matches this glob pattern",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=5,
+        help="number of timing runs per benchmark (default: 5)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=pathlib.Path,
+        help="write results as JSON to this file",
+    )
+    parser.add_argument(
+        "--compare",
+        type=pathlib.Path,
+        help="compare results to a JSON file from a previous run",
+    )
+    args = parser.parse_args(argv)
+
+    current = run(args.filter, args.repeat)
+    if args.output is not None:
+        args.output.write_text(json.dumps(current, indent=2) + "\n")
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())
+        print("\n".join(compare(baseline, current)))
+
+
+if __name__ == "__main__":
+    main()
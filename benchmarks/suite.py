@@ -0,0 +1,347 @@
+"""The benchmarks.
+
+Each benchmark is a generator function: it sets up whatever it needs, yields the
+callable to time, and tears down once the generator is closed. Benchmarks that
+need an optional dependency raise `Skip` when it's missing.
+
+NOTE: no `from __future__ import annotations` here, since pydantic needs to
+resolve the `ClassVar` annotations of models defined in functions.
+"""
+
+import dataclasses
+import importlib
+import itertools
+from typing import Any, Callable, ClassVar, Dict, Iterator, List
+
+import anywidget
+import anywidget.experimental
+import psygnal
+import traitlets
+from anywidget._descriptor import MimeBundleDescriptor, determine_state_getter
+from anywidget._fake_comm import fake_comms
+from anywidget._util import remove_buffers
+from anywidget.experimental import command
+
+Benchmark = Callable[[], Iterator[Callable[[], object]]]
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+# how many widgets to create per call in the construction benchmarks
+N_WIDGETS = 1_000
+# number of (non-updated) fields on the models in the update benchmarks
+N_FIELDS = 16
+
+
+class Skip(Exception):  # noqa: N818
+    """Raised by a benchmark that can't run in this environment."""
+
+
+def benchmark(name: str) -> Callable[[Benchmark], Benchmark]:
+    """Register a benchmark under `name`."""
+
+    def decorator(func: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = func
+        return func
+
+    return decorator
+
+
+def _optional(name: str) -> Any:  # noqa: ANN401
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        msg = f"{name} is not installed"
+        raise Skip(msg) from None
+
+
+def _fields() -> Dict[str, int]:
+    return {f"field_{i}": i for i in range(N_FIELDS)}
+
+
+def _int_traits() -> Dict[str, traitlets.Int]:
+    return {name: traitlets.Int(i).tag(sync=True) for name, i in _fields().items()}
+
+
+def _counter_widget() -> type:
+    @command
+    def _echo(self: object, msg: object, buffers: List[bytes]) -> Any:  # noqa: ANN401, ARG001
+        return msg, buffers
+
+    namespace = {
+        "_esm": "export default {}",
+        "value": traitlets.Int(0).tag(sync=True),
+        "_echo": _echo,
+        **_int_traits(),
+    }
+    return type("Counter", (anywidget.AnyWidget,), namespace)
+
+
+def _close(widget: anywidget.AnyWidget) -> None:
+    widget.layout.close()
+    widget.close()
+
+
+# ------------- Construction --------------
+
+
+@benchmark(f"construct.anywidget[{N_WIDGETS}]")
+def construct_anywidget() -> Iterator[Callable[[], object]]:
+    counter = _counter_widget()
+
+    def construct() -> None:
+        widgets = [counter() for _ in range(N_WIDGETS)]
+        for widget in widgets:
+            _close(widget)
+
+    with fake_comms(record=False):
+        yield construct
+
+
+@benchmark(f"construct.descriptor[{N_WIDGETS}]")
+def construct_descriptor() -> Iterator[Callable[[], object]]:
+    @anywidget.experimental.dataclass(esm="export default {}")
+    class Counter:
+        value: int = 0
+
+    def construct() -> None:
+        widgets = [Counter() for _ in range(N_WIDGETS)]
+        for widget in widgets:
+            widget._repr_mimebundle_  # noqa: B018
+        # the comms are closed as the objects are collected
+
+    with fake_comms(record=False):
+        yield construct
+
+
+# ------------- Single-field updates, by state getter --------------
+
+
+@benchmark("update.anywidget")
+def update_anywidget() -> Iterator[Callable[[], object]]:
+    with fake_comms(record=False):
+        widget = _counter_widget()()
+        values = itertools.count()
+
+        def update() -> None:
+            widget.value = next(values)
+
+        yield update
+        _close(widget)
+
+
+@benchmark("update.dataclass")
+def update_dataclass() -> Iterator[Callable[[], object]]:
+    model = dataclasses.make_dataclass(
+        "Model",
+        [("value", int, 0), *((name, int, i) for name, i in _fields().items())],
+    )
+    model = psygnal.evented(model)
+    model._repr_mimebundle_ = MimeBundleDescriptor()
+    with fake_comms(record=False):
+        obj = model()
+        obj._repr_mimebundle_  # noqa: B018
+        values = itertools.count()
+
+        def update() -> None:
+            obj.value = next(values)
+
+        yield update
+
+
+@benchmark("update.traitlets")
+def update_traitlets() -> Iterator[Callable[[], object]]:
+    namespace = {
+        "value": traitlets.Int(0).tag(sync=True),
+        "_repr_mimebundle_": MimeBundleDescriptor(),
+        **_int_traits(),
+    }
+    model = type("Model", (traitlets.HasTraits,), namespace)
+    with fake_comms(record=False):
+        obj = model()
+        obj._repr_mimebundle_  # noqa: B018
+        values = itertools.count()
+
+        def update() -> None:
+            obj.value = next(values)
+
+        yield update
+
+
+def _update_and_send(obj: Any) -> Callable[[], object]:  # noqa: ANN401
+    """Update `value` and explicitly send it, for models without an observer API."""
+    repr_obj = obj._repr_mimebundle_
+    values = itertools.count()
+
+    def update() -> None:
+        obj.value = next(values)
+        repr_obj.send_state("value")
+
+    return update
+
+
+def _pydantic_model(base: type) -> type:
+    namespace: Dict[str, Any] = {
+        "__slots__": ("__weakref__",),
+        "__annotations__": {
+            "value": int,
+            **dict.fromkeys(_fields(), int),
+            "_repr_mimebundle_": ClassVar,
+        },
+        "value": 0,
+        **_fields(),
+        "_repr_mimebundle_": MimeBundleDescriptor(autodetect_observer=False),
+    }
+    return type("Model", (base,), namespace)
+
+
+@benchmark("update.pydantic_v2")
+def update_pydantic_v2() -> Iterator[Callable[[], object]]:
+    pydantic = _optional("pydantic")
+    if not pydantic.VERSION.startswith("2"):
+        msg = "pydantic v2 is not installed"
+        raise Skip(msg)
+    with fake_comms(record=False):
+        yield _update_and_send(_pydantic_model(pydantic.BaseModel)())
+
+
+@benchmark("update.pydantic_v1")
+def update_pydantic_v1() -> Iterator[Callable[[], object]]:
+    pydantic = _optional("pydantic")
+    if not pydantic.VERSION.startswith("1"):
+        # models from `pydantic.v1` aren't detected as pydantic models
+        msg = "pydantic v1 is not installed"
+        raise Skip(msg)
+    model = _pydantic_model(pydantic.BaseModel)
+    # v1 models are immutable by default, unlike v2
+    model.__config__.allow_mutation = True
+    with fake_comms(record=False):
+        yield _update_and_send(model())
+
+
+@benchmark("update.msgspec")
+def update_msgspec() -> Iterator[Callable[[], object]]:
+    msgspec = _optional("msgspec")
+    model = msgspec.defstruct(
+        "Model",
+        [("value", int, 0), *((name, int, i) for name, i in _fields().items())],
+        weakref=True,
+    )
+    # Structs don't allow new class attributes after definition
+    model = type(
+        "Model",
+        (model,),
+        {
+            "__annotations__": {"_repr_mimebundle_": ClassVar},
+            "_repr_mimebundle_": MimeBundleDescriptor(autodetect_observer=False),
+        },
+    )
+    with fake_comms(record=False):
+        yield _update_and_send(model())
+
+
+# ------------- State getters --------------
+
+
+@benchmark("determine_state_getter")
+def determine_getters() -> Iterator[Callable[[], object]]:
+    objs = [
+        dataclasses.make_dataclass("Model", [("value", int, 0)])(),
+        type("Model", (traitlets.HasTraits,), {"value": traitlets.Int(0)})(),
+    ]
+
+    def determine() -> None:
+        for obj in objs:
+            determine_state_getter(obj)
+
+    yield determine
+
+
+# ------------- Buffers --------------
+
+
+@benchmark("remove_buffers.nested[256]")
+def remove_nested_buffers() -> Iterator[Callable[[], object]]:
+    buffer = memoryview(b"x" * 1024)
+    state = {
+        f"trait_{i}": {"shape": [16, 16], "chunks": [{"data": buffer}] * 16}
+        for i in range(16)
+    }
+
+    def remove() -> None:
+        remove_buffers(state)
+
+    yield remove
+
+
+@benchmark("send_state.buffers[64x64KiB]")
+def send_buffers() -> Iterator[Callable[[], object]]:
+    buffers = {f"buffer_{i}": memoryview(bytes(64 * 1024)) for i in range(64)}
+
+    class Model:
+        _repr_mimebundle_ = MimeBundleDescriptor(autodetect_observer=False)
+
+        def _get_anywidget_state(self, include: Any) -> Dict[str, Any]:  # noqa: ANN401, ARG002
+            return {"meta": {"dtype": "uint8", "count": len(buffers)}, **buffers}
+
+    with fake_comms(record=False):
+        obj = Model()
+        repr_obj = obj._repr_mimebundle_
+        yield repr_obj.send_state
+
+
+# ------------- Commands --------------
+
+
+def _call(name: str, call_id: int, msg: object) -> Dict[str, Any]:
+    return {"id": str(call_id), "kind": "anywidget-command", "name": name, "msg": msg}
+
+
+@benchmark("command.anywidget")
+def command_anywidget() -> Iterator[Callable[[], object]]:
+    with fake_comms(record=False):
+        widget = _counter_widget()()
+        ids = itertools.count()
+
+        def invoke() -> None:
+            content = _call("_echo", next(ids), {"x": 1})
+            widget.comm.receive({"method": "custom", "content": content})
+
+        yield invoke
+        _close(widget)
+
+
+@benchmark("command.anywidget.batch[16]")
+def command_anywidget_batch() -> Iterator[Callable[[], object]]:
+    with fake_comms(record=False):
+        widget = _counter_widget()()
+        ids = itertools.count()
+
+        def invoke() -> None:
+            calls = [_call("_echo", next(ids), {"x": i}) for i in range(16)]
+            content = {"kind": "anywidget-command-batch", "calls": calls}
+            widget.comm.receive({"method": "custom", "content": content})
+
+        yield invoke
+        _close(widget)
+
+
+@benchmark("command.descriptor")
+def command_descriptor() -> Iterator[Callable[[], object]]:
+    @anywidget.experimental.dataclass(esm="export default {}")
+    class Counter:
+        value: int = 0
+
+        @command
+        def _echo(self, msg: object, buffers: List[bytes]) -> Any:  # noqa: ANN401
+            return msg, buffers
+
+    with fake_comms(record=False):
+        obj = Counter()
+        comm = obj._repr_mimebundle_._comm
+        ids = itertools.count()
+
+        def invoke() -> None:
+            content = _call("_echo", next(ids), {"x": 1})
+            comm.receive({"method": "custom", "content": content})
+
+        yield invoke
@@ -262,17 +262,28 @@ function throw_anywidget_error(source) {
  * @typedef InvokeOptions
  * @prop {DataView[]} [buffers]
  * @prop {AbortSignal} [signal]
+ * @prop {boolean} [stream]
+ * @prop {number} [window] - Max chunks the kernel may send ahead (streaming).
  */
 
 /**
+ * Invoke a command on the kernel.
+ *
+ * With `{ stream: true }`, returns an async iterator over the chunks yielded by
+ * a generator command. The kernel sends at most `window` chunks ahead of what
+ * has been consumed, and breaking out of the loop cancels the command.
+ *
  * @template T
  * @param {import("@anywidget/types").AnyModel} model
  * @param {string} name
  * @param {any} [msg]
  * @param {InvokeOptions} [options]
- * @return {Promise<[T, DataView[]]>}
+ * @return {Promise<[T, DataView[]]> | AsyncGenerator<[T, DataView[]]>}
  */
 export function invoke(model, name, msg, options = {}) {
+	if (options.stream) {
+		return invoke_stream(model, name, msg, options);
+	}
 	// crypto.randomUUID() is not available in non-secure contexts (i.e., http://)
 	// so we use simple (non-secure) polyfill.
 	let id = uuid.v4();
@@ -281,27 +292,567 @@ export function invoke(model, name, msg, options = {}) {
 	return new Promise((resolve, reject) => {
 		if (signal.aborted) {
 			reject(signal.reason);
+			return;
 		}
-		signal.addEventListener("abort", () => {
-			model.off("msg:custom", handler);
-			reject(signal.reason);
-		});
-
 		/**
-		 * @param {{ id: string, kind: "anywidget-command-response", response: T }} msg
+		 * @param {CommandResponse<T> | BatchResponse<T>} msg
 		 * @param {DataView[]} buffers
 		 */
 		function handler(msg, buffers) {
+			if (msg.kind === "anywidget-command-batch-response") {
+				let entry = msg.messages.find((m) => m.id === id);
+				if (!entry) return;
+				let start = entry.buffer_offset;
+				handler(entry, buffers.slice(start, start + entry.buffer_count));
+				return;
+			}
 			if (!(msg.id === id)) return;
-			resolve([msg.response, buffers]);
+			if (msg.error) {
+				reject(command_error(msg.error));
+			} else {
+				resolve([msg.response, buffers]);
+			}
 			model.off("msg:custom", handler);
+			signal.removeEventListener("abort", on_abort);
 		}
 		model.on("msg:custom", handler);
-		model.send(
-			{ id, kind: "anywidget-command", name, msg },
-			undefined,
+		let unqueue = send_command(
+			model,
+			{ id, name, msg },
 			options.buffers ?? [],
 		);
+
+		function on_abort() {
+			model.off("msg:custom", handler);
+			if (!unqueue()) {
+				// Let the kernel drop queued work or signal running work to stop.
+				model.send({ id, kind: "anywidget-command-cancel" });
+			}
+			reject(signal.reason);
+		}
+		signal.addEventListener("abort", on_abort, { once: true });
+	});
+}
+
+/**
+ * @template T
+ * @typedef CommandResponse
+ * @prop {string} id
+ * @prop {"anywidget-command-response"} kind
+ * @prop {T} response
+ * @prop {CommandError} [error] - Set if the command raised.
+ */
+
+/**
+ * @typedef CommandError
+ * @prop {string} name - The name of the Python exception.
+ * @prop {string} message
+ */
+
+/**
+ * @param {CommandError} error
+ * @returns {Error}
+ */
+function command_error(error) {
+	let err = new Error(`[anywidget] Command failed: ${error.message}`);
+	err.name = error.name;
+	return err;
+}
+
+/**
+ * @template T
+ * @typedef BatchResponse
+ * @prop {"anywidget-command-batch-response"} kind
+ * @prop {Array<CommandResponse<T> & BufferRange>} messages
+ */
+
+/**
+ * @typedef BufferRange
+ * @prop {number} buffer_offset
+ * @prop {number} buffer_count
+ */
+
+/**
+ * @typedef PendingCommand
+ * @prop {{ id: string, name: string, msg: any }} call
+ * @prop {DataView[]} buffers
+ */
+
+/** @type {WeakMap<import("@anywidget/types").AnyModel, PendingCommand[]>} */
+let PENDING_COMMANDS = new WeakMap();
+
+/**
+ * Queues a command invocation to be sent at the end of the current microtask.
+ *
+ * Invocations made in the same microtask (e.g., a grid fetching all of its
+ * cells) are coalesced into a single `anywidget-command-batch` message, with
+ * their buffers concatenated. The kernel replies to the batch in one message.
+ *
+ * @param {import("@anywidget/types").AnyModel} model
+ * @param {PendingCommand["call"]} call
+ * @param {DataView[]} buffers
+ * @returns {() => boolean} Removes the call if it hasn't been sent yet.
+ */
+function send_command(model, call, buffers) {
+	let queue = PENDING_COMMANDS.get(model);
+	if (!queue) {
+		let pending = /** @type {PendingCommand[]} */ ([]);
+		PENDING_COMMANDS.set(model, pending);
+		queueMicrotask(() => {
+			PENDING_COMMANDS.delete(model);
+			flush_commands(model, pending);
+		});
+		queue = pending;
+	}
+	let entry = { call, buffers };
+	let entries = queue;
+	entries.push(entry);
+	return () => {
+		let index = entries.indexOf(entry);
+		if (index === -1) return false;
+		entries.splice(index, 1);
+		return true;
+	};
+}
+
+/**
+ * @param {import("@anywidget/types").AnyModel} model
+ * @param {PendingCommand[]} pending
+ */
+function flush_commands(model, pending) {
+	if (pending.length === 0) return;
+	if (pending.length === 1) {
+		let [{ call, buffers }] = pending;
+		model.send({ kind: "anywidget-command", ...call }, undefined, buffers);
+		return;
+	}
+	model.send(
+		{
+			kind: "anywidget-command-batch",
+			calls: pending.map(({ call, buffers }) => ({
+				...call,
+				buffer_count: buffers.length,
+			})),
+		},
+		undefined,
+		pending.flatMap(({ buffers }) => buffers),
+	);
+}
+
+/**
+ * @template T
+ * @param {import("@anywidget/types").AnyModel} model
+ * @param {string} name
+ * @param {any} msg
+ * @param {InvokeOptions} options
+ * @return {AsyncGenerator<[T, DataView[]]>}
+ */
+async function* invoke_stream(model, name, msg, options) {
+	let id = uuid.v4();
+	let signal = options.signal;
+	/** @type {Array<[T, DataView[]]>} */
+	let chunks = [];
+	let done = false;
+	/** @type {CommandError | undefined} */
+	let error;
+	/** @type {(() => void) | undefined} */
+	let wake;
+
+	/**
+	 * @param {{ id: string, kind: "anywidget-command-chunk" | "anywidget-command-response", response: T, error?: CommandError }} msg
+	 * @param {DataView[]} buffers
+	 */
+	function handler(msg, buffers) {
+		if (!(msg.id === id)) return;
+		if (msg.kind === "anywidget-command-chunk") {
+			chunks.push([msg.response, buffers]);
+		} else if (msg.kind === "anywidget-command-response") {
+			done = true;
+			error = msg.error;
+		}
+		wake?.();
+	}
+	let on_abort = () => wake?.();
+
+	model.on("msg:custom", handler);
+	signal?.addEventListener("abort", on_abort);
+	model.send(
+		{
+			id,
+			kind: "anywidget-command",
+			name,
+			msg,
+			stream: { window: options.window ?? 8 },
+		},
+		undefined,
+		options.buffers ?? [],
+	);
+	try {
+		for (let seq = 0; ; ) {
+			signal?.throwIfAborted();
+			let chunk = chunks.shift();
+			if (chunk) {
+				yield chunk;
+				// Acknowledge once the consumer asks for more, so the kernel
+				// never gets more than `window` chunks ahead of the consumer.
+				model.send({ id, kind: "anywidget-command-ack", seq: seq++ });
+				continue;
+			}
+			if (error) throw command_error(error);
+			if (done) return;
+			await new Promise((resolve) => {
+				wake = () => resolve(undefined);
+			});
+			wake = undefined;
+		}
+	} finally {
+		model.off("msg:custom", handler);
+		signal?.removeEventListener("abort", on_abort);
+		if (!done) {
+			model.send({ id, kind: "anywidget-command-cancel" });
+		}
+	}
+}
+
+let PAGED_KEY = "__anywidget_paged__";
+
+/**
+ * The description of a `PagedData` sent as a widget's state.
+ *
+ * @typedef Paged
+ * @property {number} __anywidget_paged__ - The page size.
+ * @property {number} length
+ * @property {number} pages
+ * @property {Array<string> | null} columns
+ * @property {Array<number> | null} shape
+ */
+
+/**
+ * A block of values in a page: a (JSON) array, or a numeric buffer.
+ *
+ * @typedef {Array<unknown> | { dtype: keyof typeof TYPED_ARRAYS, shape: Array<number>, buffer: number }} PageBlock
+ */
+
+/**
+ * @typedef Rows
+ * @property {number} start
+ * @property {number} stop
+ * @property {ArrayLike<unknown>} [data] - The rows (flattened, for arrays).
+ * @property {Record<string, ArrayLike<unknown>>} [columns] - The columns of tables.
+ */
+
+/**
+ * @param {PageBlock} block
+ * @param {DataView[]} buffers
+ * @returns {{ values: ArrayLike<unknown>, width: number }}
+ */
+function decode_block(block, buffers) {
+	if (Array.isArray(block)) {
+		return { values: block, width: 1 };
+	}
+	let TypedArray = TYPED_ARRAYS[block.dtype];
+	assert(TypedArray, `[anywidget] Unknown page dtype: ${block.dtype}`);
+	let view = buffers[block.buffer];
+	// copied, so the values are aligned
+	let values = new TypedArray(
+		view.buffer.slice(view.byteOffset, view.byteOffset + view.byteLength),
+	);
+	let width = block.shape.slice(1).reduce((a, b) => a * b, 1);
+	return { values, width };
+}
+
+/**
+ * Joins the rows `[skip, skip + count)` of consecutive blocks.
+ *
+ * @param {Array<{ values: ArrayLike<unknown>, width: number }>} blocks
+ * @param {number} skip
+ * @param {number} count
+ * @returns {ArrayLike<unknown>}
+ */
+function join_rows(blocks, skip, count) {
+	let width = blocks[0]?.width ?? 1;
+	let first = blocks[0]?.values;
+	let TypedArray =
+		ArrayBuffer.isView(first) &&
+		blocks.every((b) => b.values.constructor === first.constructor)
+			? /** @type {new (n: number) => any} */ (first.constructor)
+			: undefined;
+	let out = TypedArray ? new TypedArray(count * width) : [];
+	let offset = 0;
+	for (let { values } of blocks) {
+		let rows = values.length / width;
+		let from = Math.min(skip, rows);
+		let to = Math.min(rows, skip + count - offset / width);
+		skip -= from;
+		for (let i = from * width; i < to * width; i++) {
+			out[offset++] = values[i];
+		}
+	}
+	return out;
+}
+
+/**
+ * Fetches rows `[start, stop)` of a `PagedData` in the model's state, getting
+ * only the pages they are on (in one round trip). The kernel is asked to
+ * prefetch the pages either side, so scrolling to them is quick.
+ *
+ * @param {import("@anywidget/types").AnyModel} model
+ * @param {string} name
+ * @param {number} start
+ * @param {number} stop
+ * @param {{ signal?: AbortSignal }} [options]
+ * @returns {Promise<Rows>}
+ */
+async function fetch_rows(model, name, start, stop, options = {}) {
+	let paged = /** @type {Paged} */ (model.get(name));
+	assert(
+		typeof paged === "object" && paged !== null && PAGED_KEY in paged,
+		`[anywidget] '${name}' is not a PagedData.`,
+	);
+	let size = paged[PAGED_KEY];
+	start = Math.max(0, start);
+	stop = Math.min(stop, paged.length);
+	if (stop <= start) {
+		return paged.columns ? { start, stop, columns: {} } : { start, stop, data: [] };
+	}
+	let first = Math.floor(start / size);
+	let last = Math.floor((stop - 1) / size);
+	/** @type {Array<Promise<[{ columns?: Record<string, PageBlock>, data?: PageBlock }, DataView[]]>>} */
+	let requests = [];
+	for (let page = first; page <= last; page++) {
+		let prefetch = [];
+		if (page === first && first > 0) prefetch.push(first - 1);
+		if (page === last && last + 1 < paged.pages) prefetch.push(last + 1);
+		requests.push(
+			/** @type {any} */ (
+				invoke(model, "_anywidget_page", { key: name, page, prefetch }, options)
+			),
+		);
+	}
+	let pages = await Promise.all(requests);
+	let skip = start - first * size;
+	let count = stop - start;
+	if (paged.columns) {
+		/** @type {Record<string, ArrayLike<unknown>>} */
+		let columns = {};
+		for (let column of paged.columns) {
+			let blocks = pages.map(([page, buffers]) =>
+				decode_block(/** @type {PageBlock} */ (page.columns?.[column]), buffers),
+			);
+			columns[column] = join_rows(blocks, skip, count);
+		}
+		return { start, stop, columns };
+	}
+	let blocks = pages.map(([page, buffers]) =>
+		decode_block(/** @type {PageBlock} */ (page.data), buffers),
+	);
+	return { start, stop, data: join_rows(blocks, skip, count) };
+}
+
+let PYRAMID_KEY = "__anywidget_pyramid__";
+
+/**
+ * The description of a `PyramidData` sent as a widget's state.
+ *
+ * @typedef Pyramid
+ * @property {number} __anywidget_pyramid__ - The downsampling factor.
+ * @property {number} version
+ * @property {Array<Array<number>>} shapes - Of each level, finest first.
+ * @property {PageBlock | { dtype: keyof typeof TYPED_ARRAYS, shape: Array<number>, buffer: DataView }} coarsest
+ */
+
+/**
+ * @typedef Level
+ * @property {number} level - 0 is the full resolution.
+ * @property {number} version
+ * @property {Array<[number, number]> | null} region - In the level's coordinates.
+ * @property {Array<number>} shape
+ * @property {ArrayLike<unknown>} data - Flattened (row-major).
+ */
+
+/**
+ * Iterates over the levels of detail of a `PyramidData` in the model's state,
+ * from the coarsest (sent with the state) down to `level` (default: 0). With a
+ * `region` (`[start, stop]` per axis, in full-resolution coordinates), finer
+ * levels only cover that region.
+ *
+ * @param {import("@anywidget/types").AnyModel} model
+ * @param {string} name
+ * @param {{ level?: number, region?: Array<[number, number]>, signal?: AbortSignal }} [options]
+ * @returns {AsyncGenerator<Level>}
+ */
+async function* fetch_levels(model, name, options = {}) {
+	let pyramid = /** @type {Pyramid} */ (model.get(name));
+	assert(
+		typeof pyramid === "object" && pyramid !== null && PYRAMID_KEY in pyramid,
+		`[anywidget] '${name}' is not a PyramidData.`,
+	);
+	let coarsest = pyramid.coarsest;
+	let { values } = Array.isArray(coarsest)
+		? decode_block(coarsest, [])
+		: decode_block({ ...coarsest, buffer: 0 }, [
+				/** @type {DataView} */ (coarsest.buffer),
+			]);
+	let last = pyramid.shapes.length - 1;
+	yield {
+		level: last,
+		version: pyramid.version,
+		region: null,
+		shape: pyramid.shapes[last],
+		data: values,
+	};
+	let msg = { key: name, level: options.level ?? 0, region: options.region };
+	let chunks = /** @type {AsyncGenerator<[any, DataView[]]>} */ (
+		invoke(model, "_anywidget_levels", msg, {
+			stream: true,
+			signal: options.signal,
+		})
+	);
+	for await (let [response, buffers] of chunks) {
+		let { values } = decode_block(response.data, buffers);
+		yield {
+			level: response.level,
+			version: response.version,
+			region: response.region,
+			shape: Array.isArray(response.data)
+				? [response.data.length]
+				: response.data.shape,
+			data: values,
+		};
+	}
+}
+
+let CHUNKED_KEY = "__anywidget_chunked__";
+
+/**
+ * A window of a memory-mapped buffer, sent after the state holding its placeholder.
+ *
+ * @typedef Chunk
+ * @property {"anywidget-chunk"} kind
+ * @property {string} id
+ * @property {Array<string>} path - To the placeholder in the state.
+ * @property {number} offset
+ * @property {number} nbytes - Of the whole buffer.
+ */
+
+/**
+ * @param {unknown} value
+ * @returns {value is Chunk}
+ */
+function is_chunk(value) {
+	return (
+		typeof value === "object" &&
+		value !== null &&
+		"kind" in value &&
+		value.kind === "anywidget-chunk"
+	);
+}
+
+/**
+ * Replaces the placeholder `id` at `path` in `value` (copying the objects along
+ * the path), or returns `undefined` if it isn't there (anymore).
+ *
+ * @param {unknown} value
+ * @param {Array<string>} path
+ * @param {string} id
+ * @param {DataView} data
+ * @returns {unknown}
+ */
+function replace_chunked(value, path, id, data) {
+	if (typeof value !== "object" || value === null) return undefined;
+	if (path.length === 0) {
+		// @ts-expect-error - checked for the key first
+		return CHUNKED_KEY in value && value[CHUNKED_KEY] === id ? data : undefined;
+	}
+	let [key, ...rest] = path;
+	// @ts-expect-error - a missing key is handled below
+	let child = replace_chunked(value[key], rest, id, data);
+	return child === undefined ? undefined : { ...value, [key]: child };
+}
+
+/** @type {WeakMap<object, Map<string, { bytes: Uint8Array, received: number }>>} */
+let CHUNKS = new WeakMap();
+
+/**
+ * Copies a chunk into its buffer, and once all have arrived, replaces the
+ * placeholder in the model's state with a `DataView` of the buffer.
+ *
+ * @param {import("@anywidget/types").AnyModel & { set_state(state: Record<string, unknown>): void }} model
+ * @param {Chunk} chunk
+ * @param {Array<ArrayBuffer | ArrayBufferView>} buffers
+ */
+function receive_chunk(model, chunk, buffers) {
+	let pending = CHUNKS.get(model) ?? new Map();
+	CHUNKS.set(model, pending);
+	let entry = pending.get(chunk.id) ?? {
+		bytes: new Uint8Array(chunk.nbytes),
+		received: 0,
+	};
+	pending.set(chunk.id, entry);
+	let buffer = buffers[0];
+	let bytes = ArrayBuffer.isView(buffer)
+		? new Uint8Array(buffer.buffer, buffer.byteOffset, buffer.byteLength)
+		: new Uint8Array(buffer);
+	entry.bytes.set(bytes, chunk.offset);
+	entry.received += bytes.byteLength;
+	if (entry.received < chunk.nbytes) return;
+	pending.delete(chunk.id);
+	let [key, ...rest] = chunk.path;
+	let data = new DataView(entry.bytes.buffer);
+	let value = replace_chunked(model.get(key), rest, chunk.id, data);
+	// (a newer state may have replaced the placeholder in the meantime)
+	if (value !== undefined) model.set_state({ [key]: value });
+}
+
+/** @type {WeakMap<object, Map<string, number>>} */
+let VERSIONS = new WeakMap();
+
+/**
+ * Records the per-key versions of a state update from the kernel (see
+ * `anywidget.experimental.versioned_updates`), first dropping the keys that
+ * aren't newer than the latest version the model has seen. A tie is a change
+ * of ours crossing the kernel's, and ours wins.
+ *
+ * @param {object} model
+ * @param {{ content: { data: any }, buffers?: Array<ArrayBuffer | ArrayBufferView> }} msg
+ * @param {boolean} drop - Whether to drop stale keys (not for echoes of our own updates).
+ */
+function apply_versions(model, msg, drop) {
+	let { data } = msg.content;
+	let latest = VERSIONS.get(model) ?? new Map();
+	VERSIONS.set(model, latest);
+	/** @type {Set<string>} */
+	let stale = new Set();
+	for (let [key, version] of Object.entries(data.versions)) {
+		let known = latest.get(key) ?? 0;
+		if (drop && version <= known) {
+			stale.add(key);
+		} else {
+			latest.set(key, Math.max(known, version));
+		}
+	}
+	if (stale.size === 0) return;
+	for (let key of stale) delete data.state[key];
+	/** @type {Array<Array<string | number>>} */
+	let paths = data.buffer_paths ?? [];
+	let keep = paths.map((path) => !stale.has(String(path[0])));
+	data.buffer_paths = paths.filter((_, i) => keep[i]);
+	msg.buffers = (msg.buffers ?? []).filter((_, i) => keep[i]);
+}
+
+/**
+ * Resolves once the browser has had a chance to paint (or on the next task, where
+ * there are no animation frames).
+ *
+ * @returns {Promise<void>}
+ */
+function next_frame() {
+	return new Promise((resolve) => {
+		if (typeof requestAnimationFrame === "function") {
+			requestAnimationFrame(() => resolve());
+		} else {
+			setTimeout(resolve, 0);
+		}
 	});
 }
 
@@ -342,6 +893,214 @@ function observe(model, name, { signal }) {
 	return get;
 }
 
+let PACKED_KEY = "__anywidget_packed__";
+
+let PACKED_DTYPES = {
+	int32: Int32Array,
+	float64: Float64Array,
+	// lossy encodings, from `anywidget.experimental.Quantize`
+	float32: Float32Array,
+	float16: Uint16Array,
+	int16: Int16Array,
+};
+
+/**
+ * @typedef Packed
+ * @property {keyof typeof PACKED_DTYPES} __anywidget_packed__
+ * @property {boolean} typed_array
+ * @property {ArrayBuffer | ArrayBufferView} buffer
+ * @property {number} [scale] - For fixed-point (`int16`) values.
+ * @property {number} [offset] - For fixed-point (`int16`) values.
+ */
+
+/**
+ * Decodes IEEE 754 half-precision floats (not all browsers have `Float16Array`).
+ *
+ * @param {Uint16Array} bits
+ * @returns {Float32Array}
+ */
+function decode_float16(bits) {
+	let out = new Float32Array(bits.length);
+	for (let i = 0; i < bits.length; i++) {
+		let sign = bits[i] & 0x8000 ? -1 : 1;
+		let exponent = (bits[i] >> 10) & 0x1f;
+		let fraction = bits[i] & 0x3ff;
+		if (exponent === 0) {
+			out[i] = sign * 2 ** -14 * (fraction / 1024);
+		} else if (exponent === 0x1f) {
+			out[i] = fraction ? Number.NaN : sign * Number.POSITIVE_INFINITY;
+		} else {
+			out[i] = sign * 2 ** (exponent - 15) * (1 + fraction / 1024);
+		}
+	}
+	return out;
+}
+
+/**
+ * @param {Packed} packed
+ * @returns {Int32Array | Float32Array | Float64Array | Array<number>}
+ */
+function unpack_numeric_list(packed) {
+	let dtype = packed[PACKED_KEY];
+	let TypedArray = PACKED_DTYPES[dtype];
+	assert(TypedArray, `[anywidget] Unknown packed dtype: ${dtype}`);
+	let data = packed.buffer;
+	let view = ArrayBuffer.isView(data) ? data : new DataView(data);
+	let buffer = view.buffer;
+	let byte_offset = view.byteOffset;
+	if (byte_offset % TypedArray.BYTES_PER_ELEMENT !== 0) {
+		// typed arrays must be aligned to their element size
+		buffer = buffer.slice(byte_offset, byte_offset + view.byteLength);
+		byte_offset = 0;
+	}
+	let raw = new TypedArray(
+		buffer,
+		byte_offset,
+		view.byteLength / TypedArray.BYTES_PER_ELEMENT,
+	);
+	/** @type {Int32Array | Float32Array | Float64Array} */
+	let array;
+	if (raw instanceof Uint16Array) {
+		array = decode_float16(raw);
+	} else if (raw instanceof Int16Array) {
+		let { scale = 1, offset = 0 } = packed;
+		array = Float64Array.from(raw, (q) => q * scale + offset);
+	} else {
+		array = raw;
+	}
+	return packed.typed_array ? array : Array.from(array);
+}
+
+/**
+ * Rehydrates (in place) the numeric lists that the kernel packed into binary
+ * buffers (see `anywidget.experimental.pack_numeric_lists` and `Quantize`).
+ *
+ * @param {unknown} value - Deserialized state, with buffers already put back.
+ * @returns {unknown}
+ */
+function unpack_numeric_lists(value) {
+	if (
+		typeof value !== "object" ||
+		value === null ||
+		ArrayBuffer.isView(value)
+	) {
+		return value;
+	}
+	if (PACKED_KEY in value) {
+		return unpack_numeric_list(/** @type {Packed} */ (value));
+	}
+	let target = /** @type {Record<string | number, unknown>} */ (value);
+	let entries = Array.isArray(value) ? value.entries() : Object.entries(value);
+	for (let [key, child] of entries) {
+		if (typeof child === "object" && child !== null) {
+			target[key] = unpack_numeric_lists(child);
+		}
+	}
+	return value;
+}
+
+let APPEND_KEY = "__anywidget_append__";
+
+/**
+ * New items for an append-only list, starting at index `__anywidget_append__`.
+ *
+ * @typedef Append
+ * @property {number} __anywidget_append__
+ * @property {ArrayLike<unknown>} items
+ */
+
+/**
+ * @param {unknown} value
+ * @returns {value is Append}
+ */
+function is_append(value) {
+	return typeof value === "object" && value !== null && APPEND_KEY in value;
+}
+
+let RING_KEY = "__anywidget_ring__";
+
+let TYPED_ARRAYS = {
+	int8: Int8Array,
+	uint8: Uint8Array,
+	int16: Int16Array,
+	uint16: Uint16Array,
+	int32: Int32Array,
+	uint32: Uint32Array,
+	float32: Float32Array,
+	float64: Float64Array,
+};
+
+/**
+ * Slots of a ring buffer (`anywidget.experimental.RingBuffer`) from the kernel:
+ * all of them (`full`), or those written since the last update, which go in
+ * the ring from slot `start` (wrapping around the end).
+ *
+ * @typedef RingUpdate
+ * @property {number} __anywidget_ring__ - The capacity.
+ * @property {keyof typeof TYPED_ARRAYS} dtype
+ * @property {boolean} full
+ * @property {number} start
+ * @property {number} head
+ * @property {number} length
+ * @property {ArrayBuffer | ArrayBufferView} buffer
+ */
+
+/**
+ * A ring buffer as widgets see it. `data` is preallocated (`capacity` slots)
+ * and updated in place; the newest value is at `head - 1`, and the oldest at
+ * `head - length` (both modulo `data.length`).
+ *
+ * @typedef Ring
+ * @property {InstanceType<(typeof TYPED_ARRAYS)[keyof typeof TYPED_ARRAYS]>} data
+ * @property {number} head - The slot the next value is written to.
+ * @property {number} length - The number of slots written (up to `data.length`).
+ */
+
+/**
+ * @param {unknown} value
+ * @returns {value is RingUpdate}
+ */
+function is_ring_update(value) {
+	return typeof value === "object" && value !== null && RING_KEY in value;
+}
+
+/**
+ * Writes the slots of a ring update into `ring` (or a new ring, if `ring`
+ * doesn't match), returning the ring and the new values.
+ *
+ * @param {RingUpdate} update
+ * @param {unknown} [ring]
+ * @returns {[Ring, ArrayLike<number>]}
+ */
+function write_ring(update, ring) {
+	let TypedArray = TYPED_ARRAYS[update.dtype];
+	assert(TypedArray, `[anywidget] Unknown ring dtype: ${update.dtype}`);
+	let capacity = update[RING_KEY];
+	let view = ArrayBuffer.isView(update.buffer)
+		? update.buffer
+		: new DataView(update.buffer);
+	// copied, so the values are aligned (and don't hold on to the message)
+	let values = new TypedArray(
+		view.buffer.slice(view.byteOffset, view.byteOffset + view.byteLength),
+	);
+	let target = /** @type {Ring | undefined} */ (ring);
+	if (
+		!(target?.data instanceof TypedArray) ||
+		target.data.length !== capacity
+	) {
+		if (!update.full) {
+			console.warn("[anywidget] Ring update without the full ring.");
+		}
+		target = { data: new TypedArray(capacity), head: 0, length: 0 };
+	}
+	let first = Math.min(values.length, capacity - update.start);
+	target.data.set(values.subarray(0, first), update.start);
+	target.data.set(values.subarray(first), 0);
+	target.head = update.head;
+	target.length = update.length;
+	return [target, values];
+}
+
 /**
  * @typedef State
  * @property {string} _esm
@@ -349,12 +1108,105 @@ function observe(model, name, { signal }) {
  * @property {string | undefined} _css
  */
 
+/**
+ * @typedef {"esm_load" | "initialize" | "render" | "first_render"} TimingName
+ */
+
+/** @returns {Record<TimingName, Array<number>>} */
+function empty_timings() {
+	return { esm_load: [], initialize: [], render: [], first_render: [] };
+}
+
+/**
+ * Collects how long a model takes to load and render (in milliseconds), and
+ * reports the samples to the kernel when asked.
+ *
+ * The kernel sends an `anywidget-timings-request` to get the samples collected
+ * so far, optionally with `subscribe: true` to also receive new samples as they
+ * are recorded. Samples are sent at most once.
+ */
+class Timings {
+	/** @type {base.DOMWidgetModel} */
+	#model;
+	#created = performance.now();
+	#rendered = false;
+	#subscribed = false;
+	#flush_queued = false;
+	#pending = empty_timings();
+
+	/** @param {base.DOMWidgetModel} model */
+	constructor(model) {
+		this.#model = model;
+	}
+
+	/**
+	 * @template T
+	 * @param {TimingName} name
+	 * @param {() => Promise<T>} fn
+	 * @returns {Promise<T>}
+	 */
+	async time(name, fn) {
+		let start = performance.now();
+		let result = await fn();
+		let end = performance.now();
+		this.#record(name, end - start);
+		if (name === "render" && !this.#rendered) {
+			this.#rendered = true;
+			this.#record("first_render", end - this.#created);
+		}
+		return result;
+	}
+
+	/** @param {unknown} msg */
+	handle(msg) {
+		if (
+			typeof msg !== "object" ||
+			msg === null ||
+			!("kind" in msg) ||
+			msg.kind !== "anywidget-timings-request"
+		) {
+			return;
+		}
+		if ("subscribe" in msg) {
+			this.#subscribed = Boolean(msg.subscribe);
+		}
+		this.#flush();
+	}
+
+	/**
+	 * @param {TimingName} name
+	 * @param {number} ms
+	 */
+	#record(name, ms) {
+		this.#pending[name].push(ms);
+		if (this.#subscribed && !this.#flush_queued) {
+			// coalesce samples recorded together (e.g., render and first_render)
+			this.#flush_queued = true;
+			queueMicrotask(() => {
+				this.#flush_queued = false;
+				this.#flush();
+			});
+		}
+	}
+
+	#flush() {
+		let timings = this.#pending;
+		if (Object.values(timings).every((samples) => samples.length === 0)) {
+			return;
+		}
+		this.#pending = empty_timings();
+		this.#model.send({ kind: "anywidget-timings", timings });
+	}
+}
+
 class Runtime {
 	/** @type {solid.Accessor<Result<AnyWidget>>} */
 	// @ts-expect-error - Set synchronously in constructor.
 	#widget_result;
 	/** @type {AbortSignal} */
 	#signal;
+	/** @type {Timings} */
+	#timings;
 	/** @type {Promise<void>} */
 	ready;
 
@@ -369,6 +1221,13 @@ class Runtime {
 		this.#signal = options.signal;
 		this.#signal.throwIfAborted();
 		this.#signal.addEventListener("abort", () => dispose());
+		let timings = (this.#timings = new Timings(model));
+		/** @param {unknown} msg */
+		let on_timings_request = (msg) => timings.handle(msg);
+		model.on("msg:custom", on_timings_request);
+		this.#signal.addEventListener("abort", () => {
+			model.off("msg:custom", on_timings_request);
+		});
 		AbortSignal.timeout(2000).addEventListener("abort", () => {
 			resolvers.reject(new Error("[anywidget] Failed to initialize model."));
 		});
@@ -405,18 +1264,23 @@ class Runtime {
 				let controller = new AbortController();
 				solid.onCleanup(() => controller.abort());
 				model.off(null, null, INITIALIZE_MARKER);
-				load_widget(esm(), id)
+				timings
+					.time("esm_load", () => load_widget(esm(), id))
 					.then(async (widget) => {
 						if (controller.signal.aborted) {
 							return;
 						}
-						let cleanup = await widget.initialize?.({
-							model: model_proxy(model, INITIALIZE_MARKER),
-							experimental: {
-								// @ts-expect-error - bind isn't working
-								invoke: invoke.bind(null, model),
-							},
-						});
+						let cleanup = await timings.time("initialize", async () =>
+							widget.initialize?.({
+								model: model_proxy(model, INITIALIZE_MARKER),
+								experimental: {
+									// @ts-expect-error - bind isn't working
+									invoke: invoke.bind(null, model),
+									fetch_rows: fetch_rows.bind(null, model),
+									fetch_levels: fetch_levels.bind(null, model),
+								},
+							}),
+						);
 						if (controller.signal.aborted) {
 							safe_cleanup(cleanup, "esm update");
 							return;
@@ -461,14 +1325,18 @@ class Runtime {
 				solid.onCleanup(() => controller.abort());
 				Promise.resolve()
 					.then(async () => {
-						let cleanup = await result.data.render?.({
-							model: model_proxy(model, view),
-							el: view.el,
-							experimental: {
-								// @ts-expect-error - bind isn't working
-								invoke: invoke.bind(null, model),
-							},
-						});
+						let cleanup = await this.#timings.time("render", async () =>
+							result.data.render?.({
+								model: model_proxy(model, view),
+								el: view.el,
+								experimental: {
+									// @ts-expect-error - bind isn't working
+									invoke: invoke.bind(null, model),
+									fetch_rows: fetch_rows.bind(null, model),
+									fetch_levels: fetch_levels.bind(null, model),
+								},
+							}),
+						);
 						if (controller.signal.aborted) {
 							safe_cleanup(cleanup, "dispose view - already aborted");
 							return;
@@ -515,11 +1383,151 @@ export default function ({ DOMWidgetModel, DOMWidgetView }) {
 			RUNTIMES.set(this, new Runtime(this, { signal: controller.signal }));
 		}
 
+		/**
+		 * @param {Parameters<typeof DOMWidgetModel["_deserialize_state"]>} args
+		 *
+		 * We override to rehydrate numeric lists packed into binary buffers by the
+		 * kernel (and the full ring buffers it sends), before any custom
+		 * deserializers (or widget code) see the state.
+		 */
+		static async _deserialize_state(...args) {
+			let [state, manager] = args;
+			let unpacked = /** @type {typeof state} */ (unpack_numeric_lists(state));
+			for (let [key, value] of Object.entries(unpacked)) {
+				if (is_ring_update(value) && value.full) {
+					unpacked[key] = write_ring(value)[0];
+				}
+			}
+			return super._deserialize_state(unpacked, manager);
+		}
+
+		/**
+		 * @param {Record<string, unknown>} state
+		 *
+		 * We override to apply appends to append-only lists and ring buffers in
+		 * place (see `anywidget.experimental.AppendOnlyList` and `RingBuffer`),
+		 * firing `append:<name>` with the new items (and their offset, or start
+		 * slot), then `change:<name>`. An append that doesn't line up with the
+		 * list we have is dropped, and the whole state requested again instead.
+		 */
+		set_state(state) {
+			/** @type {Array<[string, Array<unknown>, Array<unknown>]>} */
+			let appends = [];
+			let resync = false;
+			/** @type {Array<[string, Ring, ArrayLike<number>, number]>} */
+			let writes = [];
+			for (let [key, value] of Object.entries(state)) {
+				if (is_ring_update(value)) {
+					let current = this.get(key);
+					let [ring, values] = write_ring(value, current);
+					if (ring === current) {
+						delete state[key];
+						writes.push([key, ring, values, value.start]);
+					} else {
+						state[key] = ring;
+					}
+					continue;
+				}
+				if (!is_append(value)) continue;
+				let current = this.get(key);
+				let items = Array.from(value.items);
+				delete state[key];
+				if (!Array.isArray(current) || value[APPEND_KEY] === 0) {
+					// nothing to append to (yet)
+					state[key] = items;
+					continue;
+				}
+				if (current.length !== value[APPEND_KEY]) {
+					console.warn(
+						`[anywidget] Append to '${key}' at ${value[APPEND_KEY]}, but it has ${current.length} items. Requesting the full state.`,
+					);
+					resync = true;
+					continue;
+				}
+				appends.push([key, current, items]);
+			}
+			if (resync && this.comm_live) {
+				// answered with an update of the whole state (with full lists)
+				/** @type {any} */ (this.comm).send({ method: "request_state" }, {});
+			}
+			super.set_state(state);
+			for (let [key, current, items] of appends) {
+				for (let item of items) current.push(item);
+				this.trigger(`append:${key}`, items, current.length - items.length);
+				this.trigger(`change:${key}`, this, current);
+			}
+			for (let [key, ring, values, start] of writes) {
+				this.trigger(`append:${key}`, values, start);
+				this.trigger(`change:${key}`, this, ring);
+			}
+		}
+
+		/**
+		 * @param {Record<string, unknown>} state
+		 * @param {any} [callbacks]
+		 *
+		 * We override to number our changes to each key, once the kernel sends
+		 * versioned updates (see `anywidget.experimental.versioned_updates`).
+		 */
+		send_sync_message(state, callbacks = {}) {
+			let latest = VERSIONS.get(this);
+			/** @type {any} */
+			let comm = this.comm;
+			if (!latest || !comm) {
+				return super.send_sync_message(state, callbacks);
+			}
+			/** @type {Record<string, number>} */
+			let versions = {};
+			for (let key of Object.keys(state)) {
+				versions[key] = (latest.get(key) ?? 0) + 1;
+				latest.set(key, versions[key]);
+			}
+			// the update message is built (and sent) by the base class
+			let own = Object.prototype.hasOwnProperty.call(comm, "send");
+			let send = comm.send;
+			comm.send = (/** @type {any} */ data, /** @type {any[]} */ ...rest) =>
+				send.call(comm, { ...data, versions }, ...rest);
+			try {
+				return super.send_sync_message(state, callbacks);
+			} finally {
+				if (own) comm.send = send;
+				else delete comm.send;
+			}
+		}
+
 		/** @param {Parameters<InstanceType<DOMWidgetModel>["_handle_comm_msg"]>} msg */
 		async _handle_comm_msg(...msg) {
 			let runtime = RUNTIMES.get(this);
 			await runtime?.ready;
-			return super._handle_comm_msg(...msg);
+			let { data } = msg[0].content;
+			if (
+				(data.method === "update" || data.method === "echo_update") &&
+				data.versions
+			) {
+				apply_versions(this, msg[0], data.method === "update");
+			}
+			if (data.method === "custom" && is_chunk(data.content)) {
+				// applied in order with the state updates (after the placeholder)
+				let chunk = data.content;
+				let buffers = msg[0].buffers ?? [];
+				this.state_change = this.state_change.then(() => {
+					receive_chunk(this, chunk, buffers);
+					// the kernel only sends a few windows ahead of these
+					if (this.comm_live) this.send({ kind: "anywidget-chunk-ack" });
+				});
+				return this.state_change;
+			}
+			let applied = super._handle_comm_msg(...msg);
+			if (data.method === "update" && typeof data.seq === "number") {
+				// flow control (see `anywidget.experimental.flow_control`)
+				let seq = data.seq;
+				applied
+					.then(() => next_frame())
+					.then(() => {
+						if (this.comm_live) this.send({ kind: "anywidget-ack", seq });
+					});
+			}
+			return applied;
 		}
 
 		/**
@@ -1,8 +1,9 @@
 import { describe, expectTypeOf, it } from "vitest";
-import type { AnyModel, AnyWidget } from "./index.js";
+import type { AnyModel, AnyWidget, Experimental } from "./index.js";
 
 declare let model: AnyModel;
 declare let typedModel: AnyModel<{ value: number; name: string }>;
+declare let experimental: Experimental;
 
 describe("AnyModel.get", () => {
 	it("uses strict types when model is provided", () => {
@@ -116,3 +117,17 @@ describe("Define AnyWidget", () => {
 		});
 	});
 });
+
+describe("Experimental.invoke", () => {
+	it("resolves a single response by default", () => {
+		expectTypeOf(experimental.invoke<number>("cmd", {})).toEqualTypeOf<
+			Promise<[number, DataView[]]>
+		>();
+	});
+
+	it("returns an async generator when streaming", () => {
+		expectTypeOf(
+			experimental.invoke<number>("cmd", {}, { stream: true }),
+		).toEqualTypeOf<AsyncGenerator<[number, DataView[]]>>();
+	});
+});
@@ -56,15 +56,67 @@ export interface AnyModel<T extends ObjectHash = ObjectHash> {
 }
 
 export type Experimental = {
-	invoke: <T>(
+	invoke: {
+		<T>(
+			name: string,
+			// biome-ignore lint/suspicious/noExplicitAny: could make default more strict with `unknown` but would be breaking
+			msg?: any,
+			options?: {
+				buffers?: DataView[];
+				signal?: AbortSignal;
+				stream?: false;
+			},
+		): Promise<[T, DataView[]]>;
+		/**
+		 * Stream the chunks yielded by a generator command. The kernel sends
+		 * at most `window` (default 8) chunks ahead of what has been consumed.
+		 */
+		<T>(
+			name: string,
+			// biome-ignore lint/suspicious/noExplicitAny: could make default more strict with `unknown` but would be breaking
+			msg: any,
+			options: {
+				buffers?: DataView[];
+				signal?: AbortSignal;
+				stream: true;
+				window?: number;
+			},
+		): AsyncGenerator<[T, DataView[]]>;
+	};
+	/**
+	 * Fetch rows `[start, stop)` of a `PagedData` in the model's state, getting
+	 * only the pages they are on from the kernel.
+	 */
+	fetch_rows(
+		name: string,
+		start: number,
+		stop: number,
+		options?: { signal?: AbortSignal },
+	): Promise<{
+		start: number;
+		stop: number;
+		data?: ArrayLike<unknown>;
+		columns?: Record<string, ArrayLike<unknown>>;
+	}>;
+	/**
+	 * Iterate over the levels of detail of a `PyramidData` in the model's
+	 * state, from the coarsest down to `level` (default: 0), optionally only
+	 * for a `region` (`[start, stop]` per axis, at full resolution).
+	 */
+	fetch_levels(
 		name: string,
-		// biome-ignore lint/suspicious/noExplicitAny: could make default more strict with `unknown` but would be breaking
-		msg?: any,
 		options?: {
-			buffers?: DataView[];
+			level?: number;
+			region?: Array<[number, number]>;
 			signal?: AbortSignal;
 		},
-	) => Promise<[T, DataView[]]>;
+	): AsyncGenerator<{
+		level: number;
+		version: number;
+		region: Array<[number, number]> | null;
+		shape: Array<number>;
+		data: ArrayLike<unknown>;
+	}>;
 };
 
 export interface RenderProps<T extends ObjectHash = ObjectHash> {
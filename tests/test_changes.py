@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+
+import anywidget
+import traitlets
+from anywidget._fake_comm import fake_comms
+from anywidget.experimental import Change, dataclass
+
+
+class Picker(anywidget.AnyWidget):
+    selection = traitlets.List([]).tag(sync=True)
+    x = traitlets.Int(0).tag(sync=True)
+    y = traitlets.Int(0).tag(sync=True)
+
+
+def _update(w: anywidget.AnyWidget, **state: object) -> None:
+    w.comm.receive({"method": "update", "state": state, "buffer_paths": []})
+
+
+def test_changed_waits_for_the_front_end() -> None:
+    async def main() -> None:
+        with fake_comms():
+            w = Picker()
+            task = asyncio.create_task(w.changed("selection"))
+            await asyncio.sleep(0)
+            _update(w, x=1)
+            await asyncio.sleep(0)
+            assert not task.done()
+            _update(w, selection=[1, 2])
+            assert await task == Change("selection", [1, 2])
+
+    asyncio.run(main())
+
+
+def test_python_side_changes_are_not_published() -> None:
+    async def main() -> None:
+        with fake_comms():
+            w = Picker()
+            task = asyncio.create_task(w.changed())
+            await asyncio.sleep(0)
+            w.x = 1
+            _update(w, y=2)
+            assert await task == Change("y", 2)
+
+    asyncio.run(main())
+
+
+def test_slow_consumers_get_the_latest_change_of_each_name() -> None:
+    async def main() -> None:
+        with fake_comms():
+            w = Picker()
+            changes = w.changes("x", "y")
+            first = asyncio.create_task(changes.__anext__())
+            await asyncio.sleep(0)
+            for i in range(1, 100):
+                _update(w, x=i)
+                _update(w, y=-i)
+            _update(w, x=100)
+            # in the order they last changed
+            received = [await first, await changes.__anext__()]
+            await changes.aclose()
+        assert received == [Change("y", -99), Change("x", 100)]
+
+    asyncio.run(main())
+
+
+@dataclass(esm="export default {}")
+class Point:
+    x: int = 0
+
+
+def test_descriptor_changes() -> None:
+    async def main() -> None:
+        with fake_comms() as comms:
+            point = Point()
+            point._repr_mimebundle_
+            [comm] = comms
+            task = asyncio.create_task(point._repr_mimebundle_.changed("x"))
+            await asyncio.sleep(0)
+            comm.receive({"method": "update", "state": {"x": 3}})
+            assert await task == Change("x", 3)
+            assert point.x == 3  # noqa: PLR2004
+
+    asyncio.run(main())
@@ -1,3 +1,4 @@
+import contextlib
 import pathlib
 import time
 import weakref
@@ -5,6 +6,7 @@ from dataclasses import dataclass
 from typing import TYPE_CHECKING, Callable, ClassVar, Generator, Set, Union
 from unittest.mock import MagicMock, patch
 
+import anywidget
 import anywidget._descriptor
 import pytest
 import watchfiles
@@ -13,9 +15,12 @@ from anywidget._descriptor import (
     MimeBundleDescriptor,
     ReprMimeBundle,
 )
+from anywidget._fake_comm import fake_comms
 from anywidget._file_contents import FileContents
+from anywidget._metrics import TraitStats
 from anywidget._protocols import AnywidgetProtocol
 from anywidget._util import _WIDGET_MIME_TYPE
+from anywidget.experimental import command
 from ipykernel.comm import Comm
 from watchfiles import Change
 
@@ -156,6 +161,49 @@ def test_state_setter_binary(mock_comm: MagicMock) -> None:
     mock.assert_called_once_with({"value": b"hello"})
 
 
+def test_descriptor_commands(mock_comm: MagicMock) -> None:
+    """Test that custom messages are dispatched to `@command` methods."""
+
+    @dataclass
+    class Foo:
+        value: int = 1
+        _repr_mimebundle_: ClassVar = MimeBundleDescriptor(autodetect_observer=False)
+
+        @command
+        def _echo(self, msg: int, buffers: list) -> tuple:
+            return msg + self.value, [bytes(b).upper() for b in buffers]
+
+    foo = Foo()
+    foo._repr_mimebundle_
+    mock_comm.handle_msg(
+        {
+            "content": {
+                "data": {
+                    "method": "custom",
+                    "content": {
+                        "id": "foo",
+                        "kind": "anywidget-command",
+                        "name": "_echo",
+                        "msg": 41,
+                    },
+                },
+            },
+            "buffers": [memoryview(b"hello")],
+        },
+    )
+    mock_comm.send.assert_called_with(
+        data={
+            "method": "custom",
+            "content": {
+                "id": "foo",
+                "kind": "anywidget-command-response",
+                "response": 42,
+            },
+        },
+        buffers=[b"HELLO"],
+    )
+
+
 def test_comm_cleanup() -> None:
     """Test that the comm is cleaned up when the object is deleted."""
     assert not _COMMS
@@ -214,6 +262,114 @@ def test_descriptor_on_slots() -> None:
     _COMMS.clear()
 
 
+def test_descriptor_stats(
+    mock_comm: MagicMock,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that traffic is counted per class and trait when metrics are enabled."""
+    monkeypatch.setattr(anywidget._metrics, "ENABLED", True)
+    anywidget.stats(reset=True)
+
+    class Foo:
+        _repr_mimebundle_ = MimeBundleDescriptor(autodetect_observer=False)
+
+        def _get_anywidget_state(self, include: Union[Set[str], None]):  # noqa: ANN202, ARG002
+            return {"value": 1, "data": memoryview(b"1234")}
+
+    foo = Foo()
+    foo._repr_mimebundle_.send_state({"data"})
+    mock_comm.handle_msg(
+        {
+            "content": {
+                "data": {"method": "update", "state": {}, "buffer_paths": [["data"]]},
+            },
+            "buffers": [memoryview(b"12")],
+        },
+    )
+
+    # one message when syncing with the view, and one for the explicit send_state
+    stats = anywidget.stats(reset=True)[f"{__name__}.Foo"]
+    assert (stats.messages_sent, stats.messages_received) == (2, 1)
+    assert stats.traits["value"].json_bytes_sent == 1
+    assert stats.traits["data"] == TraitStats(
+        messages_sent=2,
+        messages_received=1,
+        buffers_sent=2,
+        buffer_bytes_sent=8,
+        buffers_received=1,
+        buffer_bytes_received=2,
+    )
+    assert stats.timings["get_state"].calls == 2  # noqa: PLR2004
+    assert stats.timings["put_buffers"].calls == 1
+    assert not anywidget.stats()
+
+
+def test_descriptor_frontend_timings(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that timings reported by the front end are recorded."""
+    monkeypatch.setattr(anywidget._metrics, "ENABLED", True)
+    anywidget.stats(reset=True)
+
+    class Foo:
+        _repr_mimebundle_ = MimeBundleDescriptor(autodetect_observer=False)
+
+        def _get_anywidget_state(self, include: Union[Set[str], None]):  # noqa: ANN202, ARG002
+            return {"value": 1}
+
+    foo = Foo()
+    with fake_comms() as comms:
+        foo._repr_mimebundle_
+    [comm] = comms
+    request = {"kind": "anywidget-timings-request", "subscribe": True}
+    assert {"method": "custom", "content": request} in [m.data for m in comm.messages]
+
+    timings = {"initialize": [3.0]}
+    comm.receive(
+        {
+            "method": "custom",
+            "content": {"kind": "anywidget-timings", "timings": timings},
+        }
+    )
+    frontend = anywidget.stats(reset=True)[f"{__name__}.Foo"].frontend
+    assert frontend["initialize"].calls == 1
+    assert frontend["initialize"].seconds == pytest.approx(0.003)
+    del foo
+
+
+def test_descriptor_spans(
+    mock_comm: MagicMock,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that a registered span callback wraps the sync hot path."""
+    spans: list = []
+
+    @contextlib.contextmanager
+    def start_as_current_span(name: str, attributes: dict) -> Generator:
+        spans.append((name, attributes))
+        yield
+
+    monkeypatch.setattr(anywidget._tracing, "CALLBACK", None)
+    anywidget.set_span_callback(start_as_current_span)
+
+    @dataclass
+    class Foo:
+        value: int = 1
+        _repr_mimebundle_: ClassVar = MimeBundleDescriptor(autodetect_observer=False)
+
+    foo = Foo()
+    foo._repr_mimebundle_
+    spans.clear()
+    _send_value(mock_comm, 2)
+    foo._repr_mimebundle_.send_state("value")
+
+    widget = f"{__name__}.Foo"
+    assert spans == [
+        ("anywidget.set_state", {"widget": widget, "keys": 1}),
+        ("anywidget.get_state", {"widget": widget}),
+        ("anywidget.remove_buffers", {}),
+        ("anywidget.comm_send", {"widget": widget, "buffers": 0}),
+    ]
+
+
 def test_descriptor_with_psygnal(mock_comm: MagicMock) -> None:
     """Test that the observer pattern is found on psygnal.evented dataclasses."""
     psygnal = pytest.importorskip("psygnal")
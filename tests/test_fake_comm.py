@@ -0,0 +1,43 @@
+import anywidget
+import traitlets.traitlets as t
+from anywidget._fake_comm import fake_comms
+from anywidget.experimental import dataclass
+
+
+def test_fake_comms_anywidget() -> None:
+    class Widget(anywidget.AnyWidget):
+        value = t.Int(0).tag(sync=True)
+
+    with fake_comms() as comms:
+        w = Widget()
+        w.value = 1
+        assert w.comm in comms
+        assert w.comm.messages[0].msg_type == "comm_open"
+        assert w.comm.messages[-1].data == {
+            "method": "update",
+            "state": {"value": 1},
+            "buffer_paths": [],
+        }
+
+        w.comm.receive({"method": "update", "state": {"value": 2}, "buffer_paths": []})
+        assert w.value == 2  # noqa: PLR2004
+        w.close()
+
+
+def test_fake_comms_descriptor() -> None:
+    @dataclass(esm="export default {}")
+    class Foo:
+        value: int = 0
+
+    with fake_comms(record=False) as comms:
+        foo = Foo()
+        foo._repr_mimebundle_
+        foo.value = 1
+        (comm,) = comms
+        assert not comm.messages
+        # open, the initial sync, and the update
+        assert comm.message_count == 3  # noqa: PLR2004
+
+        comm.receive({"method": "update", "state": {"value": 2}})
+        assert foo.value == 2  # noqa: PLR2004
+        del foo
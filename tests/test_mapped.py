@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import mmap
+import typing
+from dataclasses import field
+
+import anywidget
+import pytest
+import traitlets
+from anywidget._fake_comm import fake_comms
+from anywidget._mapped import CHUNK_ACK_KIND, CHUNK_KIND, CHUNKED_KEY
+from anywidget._util import remove_buffers
+from anywidget.experimental import dataclass, mapped_buffer_window
+
+if typing.TYPE_CHECKING:
+    import pathlib
+    from collections.abc import Iterator
+
+PAGES = 3
+ACK = {"method": "custom", "content": {"kind": CHUNK_ACK_KIND}}
+
+
+@pytest.fixture
+def mapped(tmp_path: pathlib.Path) -> mmap.mmap:
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(256)) * (PAGES * mmap.PAGESIZE // 256))
+    with path.open("rb") as f:
+        # (left open, as the sent messages keep views of it)
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+@pytest.fixture
+def window() -> Iterator[None]:
+    mapped_buffer_window(mmap.PAGESIZE)
+    yield
+    mapped_buffer_window()
+
+
+def test_remove_buffers_accepts_mapped_values(mapped: mmap.mmap) -> None:
+    state, buffer_paths, buffers = remove_buffers({"data": {"bytes": mapped}})
+    assert state == {"data": {}}
+    assert buffer_paths == [["data", "bytes"]]
+    assert bytes(buffers[0]) == mapped[:]
+
+
+class Viewer(anywidget.AnyWidget):
+    data = traitlets.Any().tag(sync=True)
+
+
+@pytest.mark.usefixtures("window")
+def test_large_mapped_buffers_are_sent_in_windows(mapped: mmap.mmap) -> None:
+    with fake_comms():
+        w = Viewer(data={"bytes": mapped})
+        # at most two windows ahead of the front end's acknowledgements
+        assert len(w.comm.messages) == 3  # noqa: PLR2004
+        w.comm.receive(ACK)
+        w.comm.receive(ACK)
+    state = w.comm.messages[0].data["state"]
+    chunks = w.comm.messages[1:]
+    assert w.data["bytes"] is mapped
+
+    placeholder = state["data"]["bytes"]
+    assert placeholder["nbytes"] == len(mapped)
+    assert [c.data["content"]["offset"] for c in chunks] == [
+        i * mmap.PAGESIZE for i in range(PAGES)
+    ]
+    for chunk in chunks:
+        content = chunk.data["content"]
+        assert content["kind"] == CHUNK_KIND
+        assert content["id"] == placeholder[CHUNKED_KEY]
+        assert content["path"] == ["data", "bytes"]
+    assert b"".join(bytes(c.buffers[0]) for c in chunks) == mapped[:]
+
+
+def test_small_mapped_buffers_are_sent_whole(mapped: mmap.mmap) -> None:
+    with fake_comms():
+        w = Viewer()
+        w.data = {"bytes": mapped}
+    [_, update] = w.comm.messages
+    assert update.data["buffer_paths"] == [["data", "bytes"]]
+    assert bytes(update.buffers[0]) == mapped[:]
+
+
+def test_mapped_values_are_looked_for_where_assigned(mapped: mmap.mmap) -> None:
+    class Default(anywidget.AnyWidget):
+        data = traitlets.Any().tag(sync=True)
+
+        @traitlets.default("data")
+        def _default_data(self) -> mmap.mmap:
+            return mapped
+
+    with fake_comms():
+        w = Viewer()
+        assert not w._mapped._keys
+        w.data = {"bytes": mapped}
+        assert list(w._mapped._keys) == ["data"]
+
+        # defaults aren't assigned, so they are found in the whole state
+        default = Default()
+    [opened] = default.comm.messages
+    assert bytes(opened.buffers[0]) == mapped[:]
+
+
+@pytest.mark.usefixtures("window")
+def test_mapped_buffers_are_only_staged_when_sent(mapped: mmap.mmap) -> None:
+    with fake_comms():
+        w = Viewer()
+        # getting the state (e.g., to embed it) doesn't queue any windows
+        assert w.get_state("data") == {"data": None}
+        w.data = {"bytes": mapped}
+        assert w.get_state("data")["data"]["bytes"] is mapped
+        sent = len(w.comm.messages)
+        w.comm.receive(ACK)
+        w.comm.receive(ACK)
+        w.comm.receive(ACK)
+    chunks = [m for m in w.comm.messages if m.data.get("method") == "custom"]
+    assert len(chunks) == PAGES
+    # the comm open, the update, and two windows
+    assert sent == 4  # noqa: PLR2004
+
+
+@dataclass(esm="export default {}")
+class Image:
+    pixels: typing.Any = field(default=None)
+
+
+@pytest.mark.usefixtures("window")
+def test_descriptor_sends_mapped_buffers_in_windows(mapped: mmap.mmap) -> None:
+    with fake_comms() as comms:
+        image = Image(pixels=mapped)
+        image._repr_mimebundle_
+        [comm] = comms
+        for _ in range(PAGES):
+            comm.receive(ACK)
+    placeholder = comm.messages[0].data["state"]["pixels"]
+    chunks = [
+        m.buffers[0]
+        for m in comm.messages
+        if m.data.get("content", {}).get("id") == placeholder[CHUNKED_KEY]
+    ]
+    assert len(chunks) == PAGES
+    assert b"".join(bytes(c) for c in chunks) == mapped[:]
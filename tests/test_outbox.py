@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import typing
+
+import anywidget
+import pytest
+import traitlets
+from anywidget import _outbox
+from anywidget._fake_comm import fake_comms
+from anywidget._outbox import ACK_KIND
+from anywidget.experimental import dataclass, flow_control
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterator
+
+LAST = 99
+
+
+class Counter(anywidget.AnyWidget):
+    value = traitlets.Int(0).tag(sync=True)
+    label = traitlets.Unicode("").tag(sync=True)
+
+
+def _in_thread(func: typing.Callable[[], object]) -> None:
+    thread = threading.Thread(target=func)
+    thread.start()
+    thread.join()
+
+
+def _sent(w: anywidget.AnyWidget) -> list[dict]:
+    return [m.data for m in w.comm.messages[1:]]
+
+
+def _ack(w: anywidget.AnyWidget, seq: int) -> None:
+    w.comm.receive({"method": "custom", "content": {"kind": ACK_KIND, "seq": seq}})
+
+
+@pytest.fixture
+def flow() -> Iterator[None]:
+    flow_control(max_in_flight=2)
+    yield
+    flow_control(enabled=False)
+
+
+def test_sends_from_threads_are_merged_on_the_loop() -> None:
+    async def main() -> None:
+        with fake_comms():
+            w = Counter()
+
+            def update() -> None:
+                for i in range(LAST + 1):
+                    w.value = i
+
+            _in_thread(update)
+            assert _sent(w) == []  # queued, not sent from the thread
+            await asyncio.sleep(0)
+        assert [m["state"] for m in _sent(w)] == [{"value": LAST}]
+
+    asyncio.run(main())
+
+
+def test_sends_from_threads_keep_their_order() -> None:
+    async def main() -> None:
+        with fake_comms():
+            w = Counter()
+
+            def update() -> None:
+                w.value = 1
+                w.send({"step": 1})
+                w.value = 2
+                w.label = "two"
+
+            _in_thread(update)
+            w.value = 3  # sent after what's already queued
+        # (the values of queued updates are read when they're sent)
+        assert [m.get("state", m.get("content")) for m in _sent(w)] == [
+            {"value": 3},
+            {"step": 1},
+            {"label": "two", "value": 3},
+            {"value": 3},
+        ]
+
+    asyncio.run(main())
+
+
+def test_widgets_created_on_threads_send_on_the_loop() -> None:
+    async def main() -> None:
+        with fake_comms():
+            widgets: list[Counter] = []
+            _in_thread(lambda: widgets.append(Counter()))
+            [w] = widgets
+            w.value = 1  # sent from the loop
+            _in_thread(lambda: setattr(w, "value", 2))
+            assert [m["state"] for m in _sent(w)] == [{"value": 1}]
+            await asyncio.sleep(0)
+        assert [m["state"] for m in _sent(w)] == [{"value": 1}, {"value": 2}]
+
+    asyncio.run(main())
+
+
+def test_sends_use_the_kernel_loop(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def main() -> None:
+        # (as if in a kernel, whose loop is looked up when sending)
+        loop = asyncio.get_running_loop()
+        monkeypatch.setattr(_outbox, "_kernel_loop", lambda: loop)
+        with fake_comms():
+            widgets: list[Counter] = []
+
+            def update() -> None:
+                w = Counter()
+                widgets.append(w)
+                w.value = 1
+
+            _in_thread(update)
+            [w] = widgets
+            assert _sent(w) == []  # (including the updates made while created)
+            await asyncio.sleep(0)
+        assert [m["state"]["value"] for m in _sent(w)] == [1]
+
+    asyncio.run(main())
+
+
+def test_sends_on_the_loop_skip_looking_it_up(monkeypatch: pytest.MonkeyPatch) -> None:
+    lookups: list[None] = []
+    kernel_loop = _outbox._kernel_loop
+    monkeypatch.setattr(
+        _outbox, "_kernel_loop", lambda: lookups.append(None) or kernel_loop()
+    )
+
+    async def main() -> None:
+        with fake_comms():
+            w = Counter()
+            looked_up = len(lookups)
+            for i in range(1, LAST + 1):
+                w.value = i
+            assert len(lookups) == looked_up
+            assert len(_sent(w)) == LAST
+
+            # queued from a thread, so the next send looks it up (and flushes)
+            _in_thread(lambda: setattr(w, "label", "thread"))
+            w.value = 0
+            assert len(lookups) > looked_up
+        assert [m["state"] for m in _sent(w)][LAST:] == [
+            {"label": "thread"},
+            {"value": 0},
+        ]
+
+    asyncio.run(main())
+
+
+def test_sends_without_a_loop_are_immediate() -> None:
+    with fake_comms():
+        w = Counter()
+        _in_thread(lambda: setattr(w, "value", 1))
+    assert [m["state"] for m in _sent(w)] == [{"value": 1}]
+
+
+@dataclass(esm="export default {}")
+class Point:
+    x: int = 0
+
+
+def test_descriptor_sends_from_threads_on_the_loop() -> None:
+    async def main() -> None:
+        with fake_comms() as comms:
+            point = Point()
+            point._repr_mimebundle_
+            [comm] = comms
+            sent = len(comm.messages)
+
+            def update() -> None:
+                for i in range(LAST + 1):
+                    point.x = i
+
+            _in_thread(update)
+            assert len(comm.messages) == sent
+            await asyncio.sleep(0)
+        assert [m.data["state"] for m in comm.messages[sent:]] == [{"x": LAST}]
+
+    asyncio.run(main())
+
+
+@pytest.mark.usefixtures("flow")
+def test_flow_control_holds_back_unacknowledged_updates() -> None:
+    with fake_comms():
+        w = Counter()
+        for i in range(1, LAST + 1):
+            w.value = i
+        w.label = "last"
+        assert [(m["seq"], m["state"]) for m in _sent(w)] == [
+            (1, {"value": 1}),
+            (2, {"value": 2}),
+        ]
+        _ack(w, 1)  # one more can be sent: the latest of what's pending
+        assert [(m["seq"], m["state"]) for m in _sent(w)][2:] == [
+            (3, {"label": "last", "value": LAST}),
+        ]
+        _ack(w, 3)
+        w.value = 0
+    assert [(m["seq"], m["state"]) for m in _sent(w)][3:] == [(4, {"value": 0})]
+
+
+@pytest.mark.usefixtures("flow")
+def test_flow_control_resets_when_the_front_end_reloads() -> None:
+    with fake_comms():
+        w = Counter()
+        w.value, w.value, w.value = 1, 2, 3
+        assert len(_sent(w)) == 2  # noqa: PLR2004
+        # the old front end's unacknowledged updates no longer hold back sends
+        w.comm.receive({"method": "request_state"})
+    *updates, full = _sent(w)
+    assert [m["state"] for m in updates] == [{"value": 1}, {"value": 2}, {"value": 3}]
+    assert "label" in full["state"]
+
+
+@pytest.mark.usefixtures("flow")
+def test_descriptor_flow_control() -> None:
+    with fake_comms() as comms:
+        point = Point()
+        point._repr_mimebundle_
+        [comm] = comms
+        sent = len(comm.messages)
+        for i in range(1, LAST + 1):
+            point.x = i
+        updates = comm.messages[sent:]
+        assert [m.data["state"] for m in updates] == [{"x": 1}]  # (and the open's)
+        seq = updates[0].data["seq"]
+        comm.receive({"method": "custom", "content": {"kind": ACK_KIND, "seq": seq}})
+    assert [m.data["state"] for m in comm.messages[sent + 1 :]] == [{"x": LAST}]
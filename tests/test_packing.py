@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import array
+import struct
+import typing
+from dataclasses import field
+
+import anywidget
+import pytest
+import traitlets.traitlets as t
+from anywidget._fake_comm import fake_comms
+from anywidget._packing import PACKED_KEY, pack, trait_policies
+from anywidget.experimental import Quantize, dataclass, pack_numeric_lists
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+@pytest.fixture(autouse=True)
+def _reset_packing() -> Iterator[None]:
+    yield
+    pack_numeric_lists(enabled=False)
+
+
+def test_pack() -> None:
+    pack_numeric_lists(min_length=4)
+    nested = {"b": [1, 2, 3, 4]}
+    state = {
+        "floats": [0.5, 1, 2, 3],
+        "big": [0, 2**40, 0, 0],
+        "huge": [0, 2**60, 0, 0],
+        "short": [1.0, 2.0],
+        "mixed": [1, "a", 2, 3],
+        "bools": [True, False, True, False],
+        "nested": [nested, {"c": "d"}],
+        "tuple": (1, 2, 3, 4),
+    }
+    packed = pack(state)
+
+    assert packed["floats"][PACKED_KEY] == "float64"
+    assert packed["floats"]["typed_array"] is False
+    assert array.array("d", packed["floats"]["buffer"]).tolist() == [0.5, 1, 2, 3]
+    assert packed["big"][PACKED_KEY] == "float64"
+    assert packed["nested"][0]["b"][PACKED_KEY] == "int32"
+    assert packed["tuple"][PACKED_KEY] == "int32"
+    for key in ("huge", "short", "mixed", "bools"):
+        assert packed[key] is state[key]
+    # only containers on the path to a packed list are copied
+    assert packed["nested"][1] is state["nested"][1]
+    assert nested == {"b": [1, 2, 3, 4]}
+
+
+def test_pack_disabled() -> None:
+    state = {"values": list(range(2048))}
+    assert pack(state) is state
+
+
+@dataclass(esm="export default {}")
+class Series:
+    values: list = None  # type: ignore[assignment]
+
+
+class SeriesWidget(anywidget.AnyWidget):
+    values = t.List([]).tag(sync=True)
+
+
+def test_descriptor_packs_lists() -> None:
+    pack_numeric_lists(min_length=8, typed_arrays=True)
+    with fake_comms() as comms:
+        series = Series(values=[])
+        series._repr_mimebundle_
+        series.values = [float(i) for i in range(8)]
+
+    msg = comms[0].messages[-1]
+    assert msg.data["state"]["values"] == {PACKED_KEY: "float64", "typed_array": True}
+    assert msg.data["buffer_paths"] == [["values", "buffer"]]
+    assert array.array("d", msg.buffers[0]).tolist() == series.values
+
+
+def test_widget_packs_lists() -> None:
+    pack_numeric_lists(min_length=8)
+    with fake_comms():
+        widget = SeriesWidget()
+        widget.values = list(range(10))
+
+    msg = widget.comm.messages[-1]
+    assert msg.data["state"]["values"] == {PACKED_KEY: "int32", "typed_array": False}
+    assert array.array("i", msg.buffers[0]).tolist() == list(range(10))
+    # front-end updates still arrive as plain lists
+    widget.comm.receive({"method": "update", "state": {"values": [1, 2]}})
+    assert widget.values == [1, 2]
+
+
+def _frombytes(fmt: str, buffer: memoryview) -> list:
+    values = array.array(fmt)
+    values.frombytes(buffer)
+    return values.tolist()
+
+
+def _unpacked(marker: dict, fmt: str) -> list:
+    values = _frombytes(fmt, marker["buffer"])
+    if marker[PACKED_KEY] == "int16":
+        return [q * marker["scale"] + marker["offset"] for q in values]
+    return values
+
+
+def test_quantize() -> None:
+    values = [0.1, 1.5, -2.25, 1e10]
+    marker = Quantize("float32").encode(values)
+    assert marker[PACKED_KEY] == "float32"
+    assert _unpacked(marker, "f") == pytest.approx(values, rel=1e-6)
+    assert len(marker["buffer"].tobytes()) == 16  # noqa: PLR2004
+
+    marker = Quantize("float16", typed_array=True).encode(array.array("d", [1, 1e6]))
+    assert marker["typed_array"]
+    assert len(marker["buffer"].tobytes()) == 4  # noqa: PLR2004
+    assert struct.unpack("<2e", marker["buffer"]) == (1.0, 65504.0)
+
+    fixed = Quantize("int16", scale=0.5, offset=10)
+    marker = fixed.encode((9.0, 10.2, 1e9))
+    assert _unpacked(marker, "h") == [9.0, 10.0, 32767 * 0.5 + 10]
+
+    # non-numeric values are sent as-is
+    for value in ("abc", b"abc", [1, "a"], {"x": 1}):
+        assert Quantize().encode(value) is value
+    with pytest.raises(ValueError, match="NaN"):
+        fixed.encode([float("nan")])
+    with pytest.raises(ValueError, match="scale"):
+        Quantize("int16")
+
+
+class QuantizedWidget(anywidget.AnyWidget):
+    values = t.List([]).tag(sync=True, quantize=Quantize("float32"))
+    exact = t.List([]).tag(sync=True)
+
+
+def test_widget_quantizes_traits() -> None:
+    with fake_comms():
+        widget = QuantizedWidget(exact=[0.1])
+        widget.values = [0.1, 0.2]
+
+    msg = widget.comm.messages[-1]
+    assert msg.data["state"]["values"][PACKED_KEY] == "float32"
+    assert _frombytes("f", msg.buffers[0]) == pytest.approx([0.1, 0.2])
+    assert widget.get_state("exact") == {"exact": [0.1]}
+
+
+def test_quantize_policies_follow_added_traits() -> None:
+    with fake_comms():
+        widget = QuantizedWidget()
+        other = QuantizedWidget()
+        # `add_traits` gives the instance a new class, so its policies are rebuilt
+        widget.add_traits(extra=t.List([]).tag(sync=True, quantize=Quantize()))
+
+    assert set(trait_policies(widget)) == {"values", "extra"}
+    assert set(trait_policies(other)) == {"values"}
+    state = widget.get_state("extra")
+    assert state["extra"][PACKED_KEY] == "float32"
+
+
+@dataclass(esm="export default {}")
+class QuantizedSeries:
+    values: list = field(
+        default_factory=list,
+        metadata={"quantize": Quantize("int16", scale=0.1)},
+    )
+    labels: list = field(default_factory=list)
+
+
+def test_descriptor_quantizes_fields() -> None:
+    with fake_comms() as comms:
+        series = QuantizedSeries(values=[1.0, 2.0], labels=[0.5])
+        series._repr_mimebundle_
+        series.values = [3.0]
+
+    [initial, update] = [m for m in comms[0].messages if m.data.get("state")][-2:]
+    assert initial.data["state"]["labels"] == [0.5]
+    assert initial.data["state"]["values"][PACKED_KEY] == "int16"
+    assert update.data["state"]["values"]["scale"] == 0.1  # noqa: PLR2004
+    assert _frombytes("h", update.buffers[0]) == [30]
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import array
+import asyncio
+from dataclasses import field
+from unittest.mock import patch
+
+import anywidget
+import pytest
+from anywidget._fake_comm import fake_comms
+from anywidget._paging import LEVELS_COMMAND, PAGE_COMMAND, PAGED_KEY, PYRAMID_KEY
+from anywidget.experimental import LRU, Paged, PagedData, Pyramid, dataclass
+
+PAGE_SIZE = 4
+
+
+class Table(anywidget.AnyWidget):
+    rows = Paged(page_size=PAGE_SIZE).tag(sync=True)
+
+
+def _page(
+    w: anywidget.AnyWidget, page: int, prefetch: list[int] | None = None
+) -> tuple[dict, list]:
+    msg = {"key": "rows", "page": page, "prefetch": prefetch}
+    with patch.object(w, "send") as send:
+        w._handle_custom_msg(
+            {"id": "1", "kind": "anywidget-command", "name": PAGE_COMMAND, "msg": msg},
+            [],
+        )
+    [(content, buffers)] = [c.args for c in send.call_args_list]
+    return content["response"], buffers
+
+
+def test_paged_trait_sends_description() -> None:
+    w = Table(rows=[f"row {i}" for i in range(10)])
+    assert isinstance(w.rows, PagedData)
+    assert w.get_state("rows")["rows"] == {
+        PAGED_KEY: PAGE_SIZE,
+        "length": 10,
+        "pages": 3,
+        "columns": None,
+        "shape": None,
+    }
+
+
+def test_paged_trait_serves_pages() -> None:
+    w = Table(rows=[f"row {i}" for i in range(10)])
+    assert _page(w, 2) == (
+        {"page": 2, "start": 8, "stop": 10, "data": ["row 8", "row 9"]},
+        [],
+    )
+
+    w.rows = PagedData(array.array("d", range(10)), page_size=PAGE_SIZE)
+    response, buffers = _page(w, 1)
+    assert response["data"] == {"dtype": "float64", "shape": [4], "buffer": 0}
+    assert array.array("d", buffers[0]).tolist() == [4.0, 5.0, 6.0, 7.0]
+
+
+def test_paged_data_caches_and_prefetches_pages() -> None:
+    cache = LRU(maxsize=8)
+    w = Table(rows=PagedData(list(range(100)), page_size=PAGE_SIZE, cache=cache))
+
+    async def main() -> None:
+        _page(w, 0, prefetch=[1, -1])
+        # prefetched on a thread, after the response is sent
+        for _ in range(100):
+            if cache.cache_info().currsize == 2:  # noqa: PLR2004
+                break
+            await asyncio.sleep(0.01)
+        assert cache.cache_info().currsize == 2  # noqa: PLR2004
+
+    asyncio.run(main())
+    _page(w, 1)
+    assert cache.cache_info().hits == 1
+
+    w.rows.invalidate()
+    assert cache.cache_info().currsize == 0
+    with pytest.raises(IndexError):
+        w.rows.page(25)
+
+
+@dataclass(esm="export default {}")
+class Rows:
+    rows: PagedData = field(default_factory=lambda: PagedData(list(range(10))))
+
+
+def test_descriptor_serves_pages() -> None:
+    with fake_comms() as comms:
+        rows = Rows()
+        rows._repr_mimebundle_
+        [comm] = comms
+        assert comm.messages[0].data["state"]["rows"][PAGED_KEY] == 1000  # noqa: PLR2004
+        comm.receive(
+            {
+                "method": "custom",
+                "content": {
+                    "id": "1",
+                    "kind": "anywidget-command",
+                    "name": PAGE_COMMAND,
+                    "msg": {"key": "rows", "page": 0},
+                },
+            }
+        )
+    response = comm.messages[-1].data["content"]["response"]
+    assert response["data"] == list(range(10))
+
+
+@dataclass(esm="export default {}")
+class LaterRows:
+    rows: object = None
+
+
+def test_descriptor_serves_pages_assigned_later() -> None:
+    with fake_comms() as comms:
+        rows = LaterRows()
+        rows._repr_mimebundle_
+        assert rows._repr_mimebundle_._lazy_keys == set()
+        rows.rows = PagedData(["a", "b"])
+        [comm] = comms
+        # described once assigned
+        assert comm.messages[-1].data["state"]["rows"][PAGED_KEY] == 1000  # noqa: PLR2004
+        assert rows._repr_mimebundle_._lazy_keys == {"rows"}
+        comm.receive(
+            {
+                "method": "custom",
+                "content": {
+                    "id": "1",
+                    "kind": "anywidget-command",
+                    "name": PAGE_COMMAND,
+                    "msg": {"key": "rows", "page": 0},
+                },
+            }
+        )
+    assert comm.messages[-1].data["content"]["response"]["data"] == ["a", "b"]
+
+
+class Viewer(anywidget.AnyWidget):
+    series = Pyramid(max_size=4).tag(sync=True)
+
+
+def test_pyramid_sends_coarsest_level() -> None:
+    w = Viewer(series=array.array("d", range(16)))
+    assert w.series.shapes == [(16,), (8,), (4,)]
+    state = w.get_state("series")["series"]
+    assert state[PYRAMID_KEY] == 2  # noqa: PLR2004
+    assert state["shapes"] == [[16], [8], [4]]
+    coarsest = state["coarsest"]
+    assert coarsest["shape"] == [4]
+    # sampled, rather than averaged, so first paint doesn't read the whole array
+    assert array.array("d", bytes(coarsest["buffer"])).tolist() == [0, 4, 8, 12]
+
+
+def test_pyramid_streams_finer_levels() -> None:
+    w = Viewer(series=array.array("d", range(16)))
+    msg = {"key": "series", "level": 0, "region": [[4, 8]]}
+    with patch.object(w, "send") as send:
+        w._handle_custom_msg(
+            {
+                "id": "1",
+                "kind": "anywidget-command",
+                "name": LEVELS_COMMAND,
+                "msg": msg,
+            },
+            [],
+        )
+    chunks = [c.args for c in send.call_args_list]
+    assert [(c["response"] or {}).get("level") for c, _ in chunks] == [1, 0, None]
+    assert [c["response"]["region"] for c, _ in chunks[:2]] == [[[2, 4]], [[4, 8]]]
+    assert array.array("d", chunks[0][1][0]).tolist() == [4.5, 6.5]
+    assert array.array("d", chunks[1][1][0]).tolist() == [4.0, 5.0, 6.0, 7.0]
+
+
+def test_pyramid_levels_are_computed_per_region() -> None:
+    w = Viewer(series=array.array("h", range(16)))
+    response, buffers = w.series.region(2, [[8, 16]])
+    assert response["region"] == [[2, 4]]
+    # only the region's tiles (of levels 2 and 1) were computed
+    assert w.series.cache.cache_info().currsize == 2  # noqa: PLR2004
+    # averaged in the array's dtype (rounding integers)
+    assert response["data"]["dtype"] == "int16"
+    assert array.array("h", buffers[0]).tolist() == [9, 13]
+    assert w.series.level(1).typecode == "h"
+
+
+def test_pyramid_levels_are_cached_until_replaced() -> None:
+    w = Viewer(series=list(range(16)))
+    old = w.series
+    assert old.level(2) is old.level(2)
+    w.series = list(range(8))
+    assert old.version == 1
+    assert w.series.version == 0
+    with pytest.raises(IndexError):
+        w.series.level(3)
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import typing
+
+import anywidget
+import pytest
+import traitlets.traitlets as t
+from anywidget._fake_comm import fake_comms
+from anywidget.experimental import PayloadReport, check_payloads, dataclass
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterator
+
+IMAGE_BYTES = 4_000
+
+
+@pytest.fixture(autouse=True)
+def _reset_payload_checks() -> Iterator[None]:
+    yield
+    check_payloads(enabled=False)
+
+
+@dataclass(esm="export default {}")
+class Points:
+    xs: list = None  # type: ignore[assignment]
+    label: str = ""
+
+
+class PointsWidget(anywidget.AnyWidget):
+    xs = t.List([]).tag(sync=True)
+    meta = t.Dict({}).tag(sync=True)
+    data = t.Bytes(b"").tag(sync=True)
+
+
+def test_descriptor_oversized_message() -> None:
+    reports: list[PayloadReport] = []
+    check_payloads(json_bytes=1_000, callback=reports.append, warn=False)
+    with fake_comms():
+        points = Points(xs=[])
+        points._repr_mimebundle_
+        assert reports == []
+        points.xs = [i / 3 for i in range(500)]
+
+    [report] = reports
+    assert report.widget == f"{__name__}.Points"
+    assert report.buffer_bytes == 0
+    [xs] = report.paths
+    assert xs.path == ("xs",)
+    assert xs.binary_candidate
+    assert report.binary_candidates == [xs]
+    assert 0 < xs.json_bytes < report.json_bytes
+
+
+def test_widget_oversized_message_warns() -> None:
+    check_payloads(json_bytes=None, buffer_bytes=1_000)
+    with fake_comms():
+        widget = PointsWidget()
+        widget.xs = list(range(500))  # JSON only, below the buffer limit
+        with pytest.warns(UserWarning, match=r"PointsWidget sent a .* message") as w:
+            widget.data = b"\x00" * 2_000
+    assert "Consider sending" not in str(w[0].message)
+
+
+def test_nested_paths_and_buffers() -> None:
+    reports: list[PayloadReport] = []
+    check_payloads(json_bytes=1_000, callback=reports.append, warn=False)
+    with fake_comms():
+        widget = PointsWidget()
+        widget.meta = {
+            "small": 1,
+            "nested": {"values": list(range(300)), "image": b"\x00" * IMAGE_BYTES},
+        }
+
+    [report] = reports
+    sizes = {p.path: p for p in report.paths}
+    assert sizes[("meta",)].buffer_bytes == IMAGE_BYTES
+    assert sizes["meta", "nested"].buffer_bytes == IMAGE_BYTES
+    assert sizes["meta", "nested", "values"].binary_candidate
+    assert ("meta", "small") not in sizes
+    assert [p.name for p in report.binary_candidates] == ["meta.nested.values"]
+    assert report.summary().endswith(
+        "Consider sending meta.nested.values as binary buffers."
+    )
+
+
+def test_disabled() -> None:
+    reports: list[PayloadReport] = []
+    check_payloads(json_bytes=0, callback=reports.append, enabled=False)
+    with fake_comms():
+        widget = PointsWidget()
+        widget.xs = list(range(500))
+    assert reports == []
@@ -0,0 +1,125 @@
+import pathlib
+
+import anywidget
+import pytest
+import traitlets.traitlets as t
+from anywidget._fake_comm import fake_comms
+from anywidget._recording import read_traffic
+from anywidget.experimental import dataclass, record_traffic, replay_traffic
+
+
+@dataclass(esm="export default {}")
+class Counter:
+    value: int = 0
+
+
+class CounterWidget(anywidget.AnyWidget):
+    value = t.Int(0).tag(sync=True)
+    data = t.Bytes(b"").tag(sync=True)
+
+
+def _session() -> list:
+    counter = Counter()
+    counter._repr_mimebundle_
+    counter.value = 1
+    comm = counter._repr_mimebundle_._comm
+    comm.receive({"method": "update", "state": {"value": 5}})
+
+    widget = CounterWidget()
+    widget.data = b"abc"
+    widget.comm.receive(
+        {"method": "update", "state": {"value": 7}, "buffer_paths": []},
+    )
+    return [counter, widget]
+
+
+def test_record_traffic(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "session.jsonl.gz"
+    with fake_comms(), record_traffic(path):
+        _session()
+
+    header, entries = read_traffic(path)
+    assert not header["payloads"]
+    counter = [e for e in entries if e["widget"] == f"{__name__}.Counter"]
+    assert [(e["dir"], e["type"], e["method"]) for e in counter] == [
+        ("out", "open", None),
+        ("out", "msg", "update"),  # initial sync
+        ("out", "msg", "update"),  # value = 1
+        ("in", "msg", "update"),
+        ("out", "msg", "update"),  # echo of the inbound update
+    ]
+    assert "data" not in counter[0]
+
+    widget = [e for e in entries if e["widget"] == f"{__name__}.CounterWidget"]
+    update = [e for e in widget if e["method"] == "update" and e["dir"] == "out"][-1]
+    assert (update["buffer_paths"], update["buffer_bytes"]) == ([["data"]], [3])
+
+
+def test_replay_traffic(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "session.jsonl.gz"
+    with fake_comms(), record_traffic(path, payloads=True):
+        _session()
+
+    replayed = []
+
+    def factory(cls: type) -> object:
+        def create() -> object:
+            replayed.append(cls())
+            return replayed[-1]
+
+        return create
+
+    report = replay_traffic(
+        path,
+        {f"{__name__}.Counter": factory(Counter)},
+        speed=None,
+    )
+    assert report.messages_in == 1
+    assert report.skipped_widgets == {f"{__name__}.CounterWidget"}
+    assert report.messages_out == report.recorded_messages_out
+    (counter,) = replayed
+    assert counter.value == 5  # noqa: PLR2004
+
+    replayed.clear()
+    report = replay_traffic(
+        path,
+        {f"{__name__}.CounterWidget": factory(CounterWidget)},
+        speed=None,
+    )
+    (widget,) = replayed
+    assert (widget.value, widget.data) == (7, b"abc")
+    widget.close()
+
+
+def test_replay_requires_payloads(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "session.jsonl.gz"
+    with fake_comms(), record_traffic(path):
+        _session()
+
+    with pytest.raises(ValueError, match="payloads=True"):
+        replay_traffic(path, {})
+
+
+def test_record_open_records_the_sent_state(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    calls = []
+    get_state = CounterWidget.get_state
+
+    def counting_get_state(self: CounterWidget, key: object = None) -> dict:
+        calls.append(key)
+        return get_state(self, key)
+
+    monkeypatch.setattr(CounterWidget, "get_state", counting_get_state)
+    path = tmp_path / "session.jsonl.gz"
+    with fake_comms(), record_traffic(path, payloads=True):
+        widget = CounterWidget(value=3)
+    assert calls.count(None) == 1  # (not gotten again to be recorded)
+
+    _, entries = read_traffic(path)
+    [opened] = [e for e in entries if e["type"] == "open"]
+    sent = widget.comm.messages[0].data
+    assert opened["data"]["state"].keys() == sent["state"].keys()
+    assert opened["data"]["state"]["value"] == 3  # noqa: PLR2004
+    widget.close()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import gc
+import weakref
+
+import pytest
+from anywidget._fake_comm import fake_comms
+from anywidget.experimental import (
+    CommUsage,
+    MimeBundleDescriptor,
+    comm_registry,
+    dataclass,
+)
+
+COUNT = 3
+
+
+@dataclass(esm="export default {}")
+class Foo:
+    value: int = 0
+
+
+@dataclass(esm="export default {}")
+class Bar:
+    value: int = 0
+
+
+@pytest.fixture(autouse=True)
+def _empty_registry() -> None:
+    comm_registry.close_all()
+
+
+def test_registry_counts_comms_per_class() -> None:
+    with fake_comms():
+        foos = [Foo() for _ in range(COUNT)]
+        for foo in foos:
+            foo._repr_mimebundle_
+        bar = Bar()
+        bar._repr_mimebundle_
+
+    assert len(comm_registry) == COUNT + 1
+    assert foos[0] in comm_registry
+    assert Foo() not in comm_registry
+    usage = comm_registry.usage()
+    assert usage[f"{__name__}.Foo"].comms == COUNT
+    assert usage[f"{__name__}.Bar"] == CommUsage(1, usage[f"{__name__}.Bar"].nbytes)
+    assert usage[f"{__name__}.Bar"].nbytes > 0
+
+    del foos, foo
+    gc.collect()
+    assert list(comm_registry.usage()) == [f"{__name__}.Bar"]
+
+
+def test_close_all_by_class() -> None:
+    with fake_comms() as comms:
+        foo, bar = Foo(), Bar()
+        foo._repr_mimebundle_
+        bar._repr_mimebundle_
+        foo_comm, bar_comm = comms
+        sent = len(foo_comm.messages)
+
+        assert comm_registry.close_all(cls=Foo) == 1
+        assert foo not in comm_registry
+        assert bar in comm_registry
+        foo.value = 1  # no longer synced
+    assert [m.msg_type for m in foo_comm.messages[sent:]] == ["comm_close"]
+    assert "comm_close" not in [m.msg_type for m in bar_comm.messages]
+
+
+def test_objects_can_be_displayed_again_after_close_all() -> None:
+    with fake_comms() as comms:
+        foo = Foo()
+        foo._repr_mimebundle_
+        assert comm_registry.close_all() == 1
+        foo.value = 1
+        foo._repr_mimebundle_
+        [old_comm, new_comm] = comms
+    assert foo in comm_registry
+    assert new_comm.comm_id != old_comm.comm_id
+    assert new_comm.messages[0].msg_type == "comm_open"
+    assert new_comm.messages[0].data["state"]["value"] == 1
+
+
+class Slotted:
+    __slots__ = ()
+
+    _repr_mimebundle_ = MimeBundleDescriptor(autodetect_observer=False)
+
+    def _get_anywidget_state(self, include: object) -> dict:  # noqa: ARG002
+        return {}
+
+
+def test_close_all_releases_objects_that_are_not_weakrefable() -> None:
+    obj = Slotted()
+    with fake_comms(), pytest.warns(UserWarning, match="not weakrefable"):
+        obj._repr_mimebundle_
+    assert obj in comm_registry
+    assert comm_registry.close_all() == 1
+    assert not comm_registry
+
+
+def test_warns_when_too_many_comms_are_open() -> None:
+    comm_registry.warn_above(COUNT)
+    try:
+        with fake_comms():
+            foos = [Foo() for _ in range(COUNT)]
+            for foo in foos:
+                foo._repr_mimebundle_
+            with pytest.warns(UserWarning, match=f"{COUNT + 1} anywidget comms"):
+                Foo()._repr_mimebundle_
+    finally:
+        comm_registry.warn_above(None)
+
+
+def test_registry_holds_objects_weakly() -> None:
+    with fake_comms():
+        foo = Foo()
+        foo._repr_mimebundle_
+    ref = weakref.ref(foo)
+    del foo
+    gc.collect()
+    assert ref() is None
+    assert not comm_registry
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import array
+import copy
+from dataclasses import field
+
+import anywidget
+import pytest
+import traitlets.traitlets as t
+from anywidget._fake_comm import fake_comms
+from anywidget._streams import APPEND_KEY, RING_KEY, AppendTracker
+from anywidget.experimental import (
+    AppendOnly,
+    AppendOnlyList,
+    Ring,
+    RingBuffer,
+    dataclass,
+)
+
+
+def test_append_only_list() -> None:
+    items = AppendOnlyList([1, 2])
+    offsets: list[int] = []
+    items.appended.connect(offsets.append)
+    items.append(3)
+    items.extend([4, 5])
+    items.extend([])
+    assert offsets == [2, 3]
+    assert items == [1, 2, 3, 4, 5]
+    assert items[1:3] == [2, 3]
+    assert copy.deepcopy(items) is items
+
+
+class LogWidget(anywidget.AnyWidget):
+    lines = AppendOnly(["start"]).tag(sync=True)
+    level = t.Unicode("info").tag(sync=True)
+
+
+def _states(comm: object) -> list[dict]:
+    return [m.data["state"] for m in comm.messages if m.data.get("method") == "update"]
+
+
+def test_widget_sends_only_appended_items() -> None:
+    with fake_comms() as comms:
+        widget = LogWidget()
+        widget.lines.append("a")
+        widget.lines.extend(["b", "c"])
+        widget.level = "debug"
+
+    [comm] = [c for c in comms if c is widget.comm]
+    assert comm.messages[0].data["state"]["lines"] == ["start"]
+    assert _states(comm) == [
+        {"lines": {APPEND_KEY: 1, "items": ["a"]}},
+        {"lines": {APPEND_KEY: 2, "items": ["b", "c"]}},
+        {"level": "debug"},
+    ]
+
+    # a new front end asks for the whole state
+    comm.receive({"method": "request_state"})
+    assert _states(comm)[-1]["lines"] == ["start", "a", "b", "c"]
+
+    # replacing the list sends it in full, and appends to the old one are ignored
+    old = widget.lines
+    widget.lines = ["x"]
+    old.append("ignored")
+    widget.lines.append("y")
+    assert _states(comm)[-2:] == [
+        {"lines": ["x"]},
+        {"lines": {APPEND_KEY: 1, "items": ["y"]}},
+    ]
+
+
+def test_widget_appends_count_only_sent_state() -> None:
+    with fake_comms() as comms:
+        widget = LogWidget()
+        widget.lines.append("a")
+        # getting the state (e.g., to embed it) doesn't mark anything as sent
+        assert widget.get_state()["lines"] == ["start", "a"]
+        widget.lines.append("b")
+
+        # nor does a send that doesn't reach the front end
+        [comm] = [c for c in comms if c is widget.comm]
+        comm.kernel = None
+        widget.lines.append("c")
+        comm.kernel = True
+        widget.lines.append("d")
+
+    assert [s["lines"] for s in _states(comm)] == [
+        {APPEND_KEY: 1, "items": ["a"]},
+        {APPEND_KEY: 2, "items": ["b"]},
+        {APPEND_KEY: 3, "items": ["c", "d"]},
+    ]
+
+
+def test_widget_tracks_appends_only_when_holding_a_list() -> None:
+    class Widget(anywidget.AnyWidget):
+        value = t.Any(None).tag(sync=True)
+
+    with fake_comms() as comms:
+        widget = Widget()
+        assert widget._appends is None
+        assert LogWidget()._appends is not None
+
+        # a list assigned to any trait is tracked from then on
+        widget.value = AppendOnlyList(["a"])
+        assert widget._appends is not None
+        widget.value.append("b")
+
+    [comm] = [c for c in comms if c is widget.comm]
+    assert _states(comm) == [
+        {"value": ["a"]},
+        {"value": {APPEND_KEY: 1, "items": ["b"]}},
+    ]
+
+
+def test_append_tracker_looks_only_at_tracked_keys() -> None:
+    tracker = AppendTracker(lambda _key: None)
+    state = {"items": AppendOnlyList([1]), "other": 1}
+    assert tracker.encode(state, full=True) is state
+    tracker.track("items")
+    assert tracker.encode(state, full=True) == {"items": [1], "other": 1}
+    assert tracker.encode_full({"other": 2}) == {"other": 2}
+
+
+def test_widget_append_only_from_front_end() -> None:
+    with fake_comms():
+        widget = LogWidget()
+    widget.comm.receive({"method": "update", "state": {"lines": ["z"]}})
+    assert isinstance(widget.lines, AppendOnlyList)
+    assert widget.lines == ["z"]
+    with pytest.raises(t.TraitError):
+        widget.lines = "not a list"
+
+
+@dataclass(esm="export default {}")
+class Series:
+    values: AppendOnlyList[float] = field(default_factory=AppendOnlyList)
+    name: str = ""
+
+
+def test_descriptor_sends_only_appended_items() -> None:
+    with fake_comms() as comms:
+        series = Series(values=AppendOnlyList([0.0]))
+        series._repr_mimebundle_
+        series.values.append(1.0)
+        series.values.extend([2.0, 3.0])
+
+    [comm] = comms
+    assert comm.messages[0].data["state"]["values"] == [0.0]
+    assert [s["values"] for s in _states(comm)] == [
+        [0.0],  # initial sync
+        {APPEND_KEY: 1, "items": [1.0]},
+        {APPEND_KEY: 2, "items": [2.0, 3.0]},
+    ]
+
+
+def test_ring_buffer() -> None:
+    ring = RingBuffer(4, "i", [1, 2, 3])
+    offsets: list[int] = []
+    ring.appended.connect(offsets.append)
+    assert list(ring) == [1, 2, 3]
+    ring.extend([4, 5])
+    assert list(ring) == [2, 3, 4, 5]
+    assert ring.head == 1
+    assert (ring[0], ring[-1], ring[1:3]) == (2, 5, [3, 4])
+    ring.extend(range(10))
+    assert list(ring) == [6, 7, 8, 9]
+    assert offsets == [3, 5]
+    with pytest.raises(IndexError):
+        ring[4]
+    with pytest.raises(ValueError, match="typecode"):
+        RingBuffer(4, "q")
+
+
+CAPACITY = 4
+
+
+class Monitor(anywidget.AnyWidget):
+    cpu = Ring(CAPACITY).tag(sync=True)
+
+
+def _ring(marker: dict) -> tuple[int, int, int, list[float]]:
+    values = array.array("d", marker["buffer"]).tolist()
+    return marker["start"], marker["head"], marker["length"], values
+
+
+def test_widget_sends_only_written_slots() -> None:
+    with fake_comms() as comms:
+        widget = Monitor()
+        widget.cpu.extend([1.0, 2.0, 3.0])
+        widget.cpu.extend([4.0, 5.0])  # wraps around
+        widget.cpu.extend([0.0] * 5)  # more than the capacity
+
+    [comm] = [c for c in comms if c is widget.comm]
+    initial = comm.messages[0].data
+    assert initial["state"]["cpu"][RING_KEY] == CAPACITY
+    assert initial["state"]["cpu"]["full"] is True
+    assert ["cpu", "buffer"] in initial["buffer_paths"]
+
+    updates = [
+        m
+        for m in comm.messages
+        if m.data.get("method") == "update" and "cpu" in m.data["state"]
+    ]
+    markers = [{**m.data["state"]["cpu"], "buffer": m.buffers[0]} for m in updates]
+    assert [m["full"] for m in markers] == [False, False, True]
+    assert _ring(markers[0]) == (0, 3, 3, [1.0, 2.0, 3.0])
+    assert _ring(markers[1]) == (3, 1, 4, [4.0, 5.0])
+    assert _ring(markers[2]) == (0, 0, 4, [0.0] * 4)
+
+
+def test_ring_trait_validation() -> None:
+    with fake_comms():
+        widget = Monitor(cpu=[1.0, 2.0])
+    assert isinstance(widget.cpu, RingBuffer)
+    assert widget.cpu.capacity == CAPACITY
+    assert list(widget.cpu) == [1.0, 2.0]
+    with pytest.raises(t.TraitError):
+        widget.cpu = ["not a number"]
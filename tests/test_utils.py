@@ -1,5 +1,8 @@
+import contextlib
+import os
 import pathlib
 import sys
+import typing
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -9,6 +12,8 @@ from anywidget._util import (
     put_buffers,
     remove_buffers,
     try_file_contents,
+    try_file_contents_many,
+    try_file_path,
 )
 from anywidget._version import get_semver_version
 
@@ -167,6 +172,42 @@ def test_try_file_contents_warns(
         assert file_contents._background_thread is None
 
 
+def test_try_file_path_follows_changed_symlinks(tmp_path: pathlib.Path) -> None:
+    foo = tmp_path / "foo.js"
+    foo.write_text("foo")
+    bar = tmp_path / "bar.js"
+    bar.write_text("bar")
+    link = tmp_path / "link.js"
+    link.symlink_to(foo)
+    contents = try_file_contents(str(link))
+    assert isinstance(contents, FileContents)
+    assert try_file_path(str(link)) == foo
+
+    link.unlink()
+    link.symlink_to(bar)
+    # resolutions are cached until a watched file changes
+    assert try_file_path(str(link)) == foo
+    contents.changed.emit("bar")
+    assert try_file_path(str(link)) == bar
+
+
+def test_try_file_contents_many(tmp_path: pathlib.Path) -> None:
+    esm = tmp_path / "index.js"
+    esm.write_text("export default {}")
+    css = tmp_path / "styles.css"
+    css.write_text(".foo {}")
+
+    contents = try_file_contents_many(
+        {"_esm": str(esm), "_css": css, "_raw": "export default {}"},
+    )
+    assert set(contents) == {"_esm", "_css"}
+    assert str(contents["_esm"]) == "export default {}"
+    assert str(contents["_css"]) == ".foo {}"
+
+    with pytest.raises(FileNotFoundError):
+        try_file_contents_many({"_esm": esm, "_css": tmp_path / "missing.css"})
+
+
 @pytest.mark.parametrize(
     ("version", "expected"),
     [
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import typing
+
+import anywidget
+import pytest
+import traitlets
+from anywidget._fake_comm import fake_comms
+from anywidget.experimental import dataclass, versioned_updates
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+@pytest.fixture(autouse=True)
+def versions() -> Iterator[None]:
+    versioned_updates()
+    yield
+    versioned_updates(enabled=False)
+
+
+class Slider(anywidget.AnyWidget):
+    x = traitlets.Int(0).tag(sync=True)
+    y = traitlets.Int(0).tag(sync=True)
+
+
+def test_updates_carry_per_key_versions() -> None:
+    with fake_comms():
+        w = Slider()
+        w.x = 1
+        w.x = 2
+        w.y = 1
+    assert [m.data["versions"] for m in w.comm.messages[1:]] == [
+        {"x": 1},
+        {"x": 2},
+        {"y": 1},
+    ]
+
+
+def test_stale_updates_from_the_front_end_are_dropped() -> None:
+    with fake_comms():
+        w = Slider()
+        w.x, w.x = 1, 2
+        # sent before the front end saw version 2, and older than it
+        w.comm.receive(
+            {"method": "update", "state": {"x": 10, "y": 10}, "versions": {"x": 1}}
+        )
+        assert (w.x, w.y) == (2, 10)
+
+
+def test_crossing_updates_resolve_to_the_front_end() -> None:
+    with fake_comms():
+        w = Slider()
+        w.x = 1
+        w.x = 2  # version 2, crossing the front end's version 2
+        w.comm.receive({"method": "update", "state": {"x": 5}, "versions": {"x": 2}})
+        assert w.x == 5  # noqa: PLR2004
+        w.x = 6
+    assert w.comm.messages[-1].data["versions"] == {"x": 3}
+
+
+@dataclass(esm="export default {}")
+class Point:
+    x: int = 0
+
+
+def test_descriptor_versions() -> None:
+    with fake_comms() as comms:
+        point = Point()
+        point._repr_mimebundle_
+        [comm] = comms
+        point.x = 1
+        latest = comm.messages[-1].data["versions"]["x"]
+        comm.receive(
+            {"method": "update", "state": {"x": 7}, "versions": {"x": latest - 1}}
+        )
+        assert point.x == 1
+        comm.receive({"method": "update", "state": {"x": 7}, "versions": {"x": latest}})
+        assert point.x == 7  # noqa: PLR2004
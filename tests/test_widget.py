@@ -1,19 +1,23 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import json
 import pathlib
 import sys
+import threading
 import time
-from typing import Generator, NoReturn
+from typing import AsyncGenerator, Generator, NoReturn
 from unittest.mock import MagicMock, patch
 
 import anywidget
 import pytest
 import traitlets.traitlets as t
 import watchfiles
+from anywidget._fake_comm import fake_comms
 from anywidget._file_contents import FileContents
 from anywidget._util import _DEFAULT_ESM, _WIDGET_MIME_TYPE
-from anywidget.experimental import command
+from anywidget.experimental import LRU, CacheInfo, command, command_cancelled
 from traitlets import traitlets
 from watchfiles import Change
 
@@ -385,3 +389,544 @@ def test_repr_mimebundle_uses_repr() -> None:
     bundle = w._repr_mimebundle_()
     assert bundle is not None
     assert bundle[0]["text/plain"] == "MyCustomRepr"
+
+
+def test_async_command_without_running_loop() -> None:
+    class Widget(anywidget.AnyWidget):
+        @command
+        async def _echo(
+            self,
+            msg: object,
+            buffers: list[bytes],
+        ) -> tuple[object, list[bytes]]:
+            await asyncio.sleep(0)
+            return msg, buffers
+
+    w = Widget()
+    with patch.object(w, "send") as send:
+        w._handle_custom_msg(
+            {"id": "1", "kind": "anywidget-command", "name": "_echo", "msg": "hi"},
+            [],
+        )
+    send.assert_called_once_with(
+        {"id": "1", "kind": "anywidget-command-response", "response": "hi"},
+        [],
+    )
+
+
+def test_async_commands_run_concurrently() -> None:
+    class Widget(anywidget.AnyWidget):
+        @command
+        async def _wait(
+            self,
+            msg: object,
+            buffers: list[bytes],
+        ) -> tuple[object, list[bytes]]:
+            await self.event.wait()
+            return msg, buffers
+
+    async def main() -> None:
+        w = Widget()
+        w.event = asyncio.Event()
+        with patch.object(w, "send") as send:
+            for i in range(2):
+                w._handle_custom_msg(
+                    {
+                        "id": str(i),
+                        "kind": "anywidget-command",
+                        "name": "_wait",
+                        "msg": i,
+                    },
+                    [],
+                )
+            await asyncio.sleep(0)
+            send.assert_not_called()  # neither blocks the handler
+            w.event.set()
+            await asyncio.sleep(0.01)
+        assert [c.args[0]["id"] for c in send.call_args_list] == ["0", "1"]
+
+    asyncio.run(main())
+
+
+def _invoke(w: anywidget.AnyWidget, name: str, msg_id: str, msg: object = None) -> None:
+    w._handle_custom_msg(
+        {"id": msg_id, "kind": "anywidget-command", "name": name, "msg": msg}, []
+    )
+
+
+def _cancel(w: anywidget.AnyWidget, msg_id: str) -> None:
+    w._handle_custom_msg({"id": msg_id, "kind": "anywidget-command-cancel"}, [])
+
+
+def test_thread_command_with_max_concurrency() -> None:
+    started = threading.Event()
+    release = threading.Event()
+    seen_cancelled = []
+
+    class Widget(anywidget.AnyWidget):
+        @command(executor="thread", max_concurrency=1)
+        def _work(
+            self,
+            msg: object,
+            buffers: list[bytes],
+        ) -> tuple[object, list[bytes]]:
+            started.set()
+            release.wait(timeout=5)
+            seen_cancelled.append(command_cancelled())
+            return msg, buffers
+
+    w = Widget()
+    with patch.object(w, "send") as send:
+        _invoke(w, "_work", "running", 1)
+        assert started.wait(timeout=5)
+        _invoke(w, "_work", "queued", 2)
+        _invoke(w, "_work", "next", 3)
+        _cancel(w, "queued")  # dropped before it starts
+        _cancel(w, "running")  # signalled to stop
+        release.set()
+
+        deadline = time.monotonic() + 5
+        while send.call_count < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+
+    # the cancelled (running) invocation doesn't respond, the queued one never ran
+    send.assert_called_once_with(
+        {"id": "next", "kind": "anywidget-command-response", "response": 3}, []
+    )
+    assert seen_cancelled == [True, False]
+
+
+class CancellableWidget(anywidget.AnyWidget):
+    @command(executor="process")
+    @staticmethod
+    def _wait(msg: str, _buffers: list[bytes]) -> tuple[object, list]:
+        path = pathlib.Path(msg)
+        (path / "started").touch()
+        deadline = time.monotonic() + 5
+        while not command_cancelled() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        (path / "stopped").write_text(str(command_cancelled()))
+        return None, []
+
+
+def test_process_command_observes_cancellation(tmp_path: pathlib.Path) -> None:
+    def wait_for(path: pathlib.Path) -> None:
+        deadline = time.monotonic() + 10
+        while not path.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    w = CancellableWidget()
+    with patch.object(w, "send") as send:
+        _invoke(w, "_wait", "1", str(tmp_path))
+        wait_for(tmp_path / "started")
+        _cancel(w, "1")
+        wait_for(tmp_path / "stopped")
+        time.sleep(0.05)
+
+    # the worker saw the cancellation, and its result was discarded
+    assert (tmp_path / "stopped").read_text() == "True"
+    send.assert_not_called()
+    anywidget._commands._EXECUTORS.pop("process").shutdown()
+
+
+def test_process_command_must_be_staticmethod() -> None:
+    with pytest.raises(TypeError, match="staticmethod"):
+
+        class Widget(anywidget.AnyWidget):
+            @command(executor="process")
+            def _work(
+                self,
+                msg: object,
+                buffers: list[bytes],
+            ) -> tuple[object, list[bytes]]:
+                return msg, buffers
+
+    with pytest.raises(ValueError, match="requires an executor"):
+        command(max_concurrency=2)
+
+
+def test_generator_command_streams_chunks() -> None:
+    class Widget(anywidget.AnyWidget):
+        @command
+        def _count(
+            self,
+            msg: int,
+            buffers: list[bytes],
+        ) -> Generator[tuple[object, list[bytes]]]:
+            for i in range(msg):
+                yield i, buffers
+
+    w = Widget()
+    with patch.object(w, "send") as send:
+        _invoke(w, "_count", "1", 2)
+    assert [c.args[0] for c in send.call_args_list] == [
+        {"id": "1", "kind": "anywidget-command-chunk", "seq": 0, "response": 0},
+        {"id": "1", "kind": "anywidget-command-chunk", "seq": 1, "response": 1},
+        {"id": "1", "kind": "anywidget-command-response", "response": None},
+    ]
+
+
+def test_async_generator_command_backpressure() -> None:
+    closed = []
+
+    class Widget(anywidget.AnyWidget):
+        @command
+        async def _count(
+            self,
+            msg: object,  # noqa: ARG002
+            buffers: list[bytes],
+        ) -> AsyncGenerator[tuple[object, list[bytes]]]:
+            try:
+                for i in range(100):
+                    yield i, buffers
+            finally:
+                closed.append(True)
+
+    async def main() -> None:
+        w = Widget()
+        with patch.object(w, "send") as send:
+            w._handle_custom_msg(
+                {
+                    "id": "1",
+                    "kind": "anywidget-command",
+                    "name": "_count",
+                    "msg": None,
+                    "stream": {"window": 2},
+                },
+                [],
+            )
+            await asyncio.sleep(0.01)
+            assert send.call_count == 2  # waiting for the front end  # noqa: PLR2004
+            w._handle_custom_msg(
+                {"id": "1", "kind": "anywidget-command-ack", "seq": 0}, []
+            )
+            await asyncio.sleep(0.01)
+            assert send.call_count == 3  # noqa: PLR2004
+            _cancel(w, "1")
+            await asyncio.sleep(0.01)
+            assert send.call_count == 3  # noqa: PLR2004
+        assert closed == [True]
+
+    asyncio.run(main())
+
+
+def test_cached_command() -> None:
+    cache = LRU(maxsize=2)
+    calls = []
+
+    class Widget(anywidget.AnyWidget):
+        value = t.Int(0).tag(sync=True)
+
+        @command(cache=cache)
+        def _square(
+            self,
+            msg: int,
+            buffers: list[bytes],
+        ) -> tuple[object, list[bytes]]:
+            calls.append(msg)
+            return msg * msg + self.value, buffers
+
+    w = Widget()
+    with patch.object(w, "send") as send:
+        for msg in (2, 2, 3, 2):
+            _invoke(w, "_square", "id", msg)
+        assert [c.args[0]["response"] for c in send.call_args_list] == [4, 4, 9, 4]
+        assert calls == [2, 3]
+        assert cache.cache_info() == CacheInfo(
+            hits=2, misses=2, evictions=0, maxsize=2, currsize=2
+        )
+
+        # different buffers are a different key
+        w._handle_custom_msg(
+            {"id": "id", "kind": "anywidget-command", "name": "_square", "msg": 2},
+            [memoryview(b"foo")],
+        )
+        assert calls == [2, 3, 2]
+        assert cache.cache_info().evictions == 1
+
+        # changing synced state invalidates the entries for this widget
+        w.value = 1
+        assert cache.cache_info().currsize == 0
+        _invoke(w, "_square", "id", 2)
+        assert send.call_args.args[0]["response"] == 5  # noqa: PLR2004
+
+    cache.cache_clear()
+    assert cache.cache_info() == CacheInfo(0, 0, 0, 2, 0)
+
+
+def test_cached_command_must_not_stream() -> None:
+    with pytest.raises(TypeError, match="can't be cached"):
+
+        @command(cache=LRU())
+        def _count(
+            msg: int,
+            buffers: list[bytes],
+        ) -> Generator[tuple[object, list[bytes]]]:
+            yield msg, buffers
+
+
+def test_batched_commands() -> None:
+    class Widget(anywidget.AnyWidget):
+        @command
+        def _echo(
+            self,
+            msg: object,
+            buffers: list[bytes],
+        ) -> tuple[object, list[bytes]]:
+            return msg, buffers
+
+        @command
+        async def _async_echo(
+            self,
+            msg: object,
+            buffers: list[bytes],
+        ) -> tuple[object, list[bytes]]:
+            return msg, buffers
+
+    a, b, c = memoryview(b"a"), memoryview(b"b"), memoryview(b"c")
+
+    async def main() -> None:
+        w = Widget()
+        with patch.object(w, "send") as send:
+            w._handle_custom_msg(
+                {
+                    "kind": "anywidget-command-batch",
+                    "calls": [
+                        {"id": "1", "name": "_echo", "msg": 1, "buffer_count": 2},
+                        {"id": "2", "name": "_async_echo", "msg": 2, "buffer_count": 0},
+                        {"id": "3", "name": "_echo", "msg": 3, "buffer_count": 1},
+                    ],
+                },
+                [a, b, c],
+            )
+            # synchronous responses are combined into one message
+            send.assert_called_once_with(
+                {
+                    "kind": "anywidget-command-batch-response",
+                    "messages": [
+                        {
+                            "id": "1",
+                            "kind": "anywidget-command-response",
+                            "response": 1,
+                            "buffer_offset": 0,
+                            "buffer_count": 2,
+                        },
+                        {
+                            "id": "3",
+                            "kind": "anywidget-command-response",
+                            "response": 3,
+                            "buffer_offset": 2,
+                            "buffer_count": 1,
+                        },
+                    ],
+                },
+                [a, b, c],
+            )
+            # the rest respond individually
+            await asyncio.sleep(0.01)
+            send.assert_called_with(
+                {"id": "2", "kind": "anywidget-command-response", "response": 2}, []
+            )
+
+    asyncio.run(main())
+
+
+def test_stats(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(anywidget._metrics, "ENABLED", True)
+    anywidget.stats(reset=True)
+
+    class Widget(anywidget.AnyWidget):
+        value = t.Int(0).tag(sync=True)
+
+        @command
+        def _echo(self, msg: object, buffers: list[bytes]) -> tuple[object, list]:
+            return msg, buffers
+
+    w = Widget()
+    w.comm = MagicMock()
+    w.value = 1
+    _invoke(w, "_echo", "id", 1)
+
+    stats = anywidget.stats(reset=True)[f"{__name__}.Widget"]
+    assert stats.messages_sent == 2  # noqa: PLR2004
+    assert stats.traits["value"].messages_sent == 1
+    assert stats.timings["command"].calls == 1
+
+
+def test_command_timing_and_spans_last_until_completion(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(anywidget._metrics, "ENABLED", True)
+    monkeypatch.setattr(anywidget._tracing, "CALLBACK", None)
+    anywidget.stats(reset=True)
+    spans: list[dict] = []
+
+    @contextlib.contextmanager
+    def start_as_current_span(name: str, attributes: dict) -> Generator:
+        span = {"name": name, "command": attributes.get("command"), "open": True}
+        spans.append(span)
+        yield span
+        span["open"] = False
+
+    anywidget.set_span_callback(start_as_current_span)
+    current = {}
+
+    class Widget(anywidget.AnyWidget):
+        @command
+        async def _async(self, msg: object, _buffers: list) -> tuple[object, list]:
+            await asyncio.sleep(0.05)
+            current["async"] = anywidget.current_span()
+            return msg, []
+
+        @command(executor="thread")
+        def _thread(self, msg: object, _buffers: list) -> tuple[object, list]:
+            current["thread"] = anywidget.current_span()
+            return msg, []
+
+    async def main() -> None:
+        w = Widget()
+        spans.clear()
+        responses: asyncio.Queue = asyncio.Queue()
+        with patch.object(w, "send", side_effect=lambda *_: responses.put_nowait(1)):
+            _invoke(w, "_async", "1")
+            _invoke(w, "_thread", "2")
+            assert [span["open"] for span in spans] == [True, True]
+            for _ in range(2):
+                await asyncio.wait_for(responses.get(), timeout=5)
+
+    asyncio.run(main())
+    assert [(span["name"], span["command"], span["open"]) for span in spans] == [
+        ("anywidget.command", "_async", False),
+        ("anywidget.command", "_thread", False),
+    ]
+    # the spans are current in the task and in the pool
+    assert current == {"async": spans[0], "thread": spans[1]}
+    timing = anywidget.stats(reset=True)[f"{__name__}.Widget"].timings["command"]
+    assert timing.calls == 2  # noqa: PLR2004
+    assert timing.seconds >= 0.05  # noqa: PLR2004
+
+
+def test_frontend_timings(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(anywidget._metrics, "ENABLED", True)
+    anywidget.stats(reset=True)
+
+    class Widget(anywidget.AnyWidget):
+        pass
+
+    with fake_comms():
+        w = Widget()
+    received = []
+    w.on_msg(lambda _, content, _buffers: received.append(content))
+
+    comm = w.comm
+    request = comm.messages[-1].data
+    assert request["content"] == {
+        "kind": "anywidget-timings-request",
+        "subscribe": True,
+    }
+
+    timings = {"esm_load": [20.0], "render": [4.0, 6.0], "first_render": [50.0]}
+    comm.receive(
+        {
+            "method": "custom",
+            "content": {"kind": "anywidget-timings", "timings": timings},
+        }
+    )
+    frontend = anywidget.stats(reset=True)[f"{__name__}.Widget"].frontend
+    assert frontend["render"].calls == 2  # noqa: PLR2004
+    assert frontend["render"].seconds == pytest.approx(0.01)
+    assert frontend["first_render"].seconds == pytest.approx(0.05)
+    assert "initialize" not in frontend
+    assert received == []
+
+
+def _error_response(msg_id: str, message: str) -> dict:
+    return {
+        "id": msg_id,
+        "kind": "anywidget-command-response",
+        "response": None,
+        "error": {"name": "ValueError", "message": message},
+    }
+
+
+class FailingWidget(anywidget.AnyWidget):
+    @command
+    def _fail(self, msg: object, _buffers: list[bytes]) -> tuple[object, list]:
+        raise ValueError(msg)
+
+    @command
+    async def _async_fail(
+        self, msg: object, _buffers: list[bytes]
+    ) -> tuple[object, list]:
+        await asyncio.sleep(0)
+        raise ValueError(msg)
+
+    @command
+    def _stream_fail(
+        self,
+        msg: object,
+        _buffers: list[bytes],
+    ) -> Generator[tuple[object, list], None, None]:
+        yield 0, []
+        raise ValueError(msg)
+
+    @command(executor="thread")
+    def _thread_fail(self, msg: object, _buffers: list[bytes]) -> tuple[object, list]:
+        raise ValueError(msg)
+
+    @command(executor="process")
+    @staticmethod
+    def _process_fail(msg: object, _buffers: list[bytes]) -> tuple[object, list]:
+        raise ValueError(msg)
+
+
+@pytest.mark.parametrize(
+    "name", ["_fail", "_async_fail", "_thread_fail", "_process_fail"]
+)
+def test_failing_command_responds_with_error(name: str) -> None:
+    async def main() -> None:
+        w = FailingWidget()
+        responded = asyncio.Event()
+        with patch.object(w, "send", side_effect=lambda *_: responded.set()) as send:
+            _invoke(w, name, "1", "oops")
+            await asyncio.wait_for(responded.wait(), timeout=10)
+        send.assert_called_once_with(_error_response("1", "oops"), [])
+
+    asyncio.run(main())
+    if name == "_process_fail":
+        anywidget._commands._EXECUTORS.pop("process").shutdown()
+
+
+def test_failing_stream_command_responds_with_error() -> None:
+    w = FailingWidget()
+    with patch.object(w, "send") as send:
+        _invoke(w, "_stream_fail", "1", "oops")
+    assert [c.args[0]["kind"] for c in send.call_args_list] == [
+        "anywidget-command-chunk",
+        "anywidget-command-response",
+    ]
+    assert send.call_args_list[-1].args[0] == _error_response("1", "oops")
+
+
+def test_failing_batched_command_responds_with_error() -> None:
+    w = FailingWidget()
+    with patch.object(w, "send") as send:
+        w._handle_custom_msg(
+            {
+                "kind": "anywidget-command-batch",
+                "calls": [
+                    {"id": "1", "name": "_fail", "msg": "oops"},
+                    {"id": "2", "name": "_missing", "msg": None},
+                ],
+            },
+            [],
+        )
+    (messages,) = [c.args[0]["messages"] for c in send.call_args_list]
+    assert messages[0] == {
+        **_error_response("1", "oops"),
+        "buffer_offset": 0,
+        "buffer_count": 0,
+    }
+    assert messages[1]["id"] == "2"
+    assert messages[1]["error"]["name"] == "KeyError"